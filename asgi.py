@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Async (ASGI) deployment mode for the auth API
+
+Serves exactly the same Flask routes as server.py, but under an ASGI server:
+
+    uvicorn asgi:app --port 5000
+
+The event loop owns the sockets, so thousands of idle keep-alive clients
+polling /api/auth/user cost no threads. Only the request handlers themselves
+run on threads, taken from two bounded executors:
+
+- ASGI_VERIFY_WORKERS threads for /api/auth/google, whose Google token
+  verification may wait on a certificate fetch
+- ASGI_DB_WORKERS threads for everything else (SQLite access)
+
+so a slow certificate fetch can never starve the database-backed routes.
+Responses are produced by the Flask app itself and are byte-for-byte the same.
+"""
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import server
+
+# Routes whose handlers may block on the network rather than the database
+VERIFY_PATHS = {'/api/auth/google'}
+
+MAX_BODY_SIZE = 1024 * 1024
+
+
+def build_environ(scope, body):
+    """Translate an ASGI HTTP scope and request body into a WSGI environ"""
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    # WSGI wants the raw path bytes decoded as latin-1 (PEP 3333)
+    path = scope.get('raw_path') or scope['path'].encode('utf-8')
+    if isinstance(path, bytes):
+        path = path.split(b'?', 1)[0].decode('latin-1')
+    root_path = scope.get('root_path', '')
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path,
+        'PATH_INFO': path,
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+            continue
+        if name == 'CONTENT_LENGTH':
+            continue
+        key = f'HTTP_{name}'
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def call_wsgi(wsgi_app, environ):
+    """Run a WSGI app to completion and return (status, headers, body)"""
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+        return lambda data: None
+
+    result = wsgi_app(environ, start_response)
+    try:
+        body = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return response['status'], response['headers'], body
+
+
+class AsgiApp:
+    """ASGI application that runs Flask request handlers on bounded thread pools"""
+
+    def __init__(self, flask_app, db_workers=8, verify_workers=4, max_body_size=MAX_BODY_SIZE):
+        self.flask_app = flask_app
+        self.max_body_size = max_body_size
+        self.db_executor = ThreadPoolExecutor(max_workers=db_workers, thread_name_prefix='asgi-db')
+        self.verify_executor = ThreadPoolExecutor(max_workers=verify_workers, thread_name_prefix='asgi-verify')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        else:
+            raise RuntimeError(f"Unsupported ASGI scope type: {scope['type']}")
+
+    async def lifespan(self, receive, send):
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await loop.run_in_executor(self.db_executor, server.init_db)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await loop.run_in_executor(self.db_executor, server.close_db_pool)
+                self.db_executor.shutdown(wait=False)
+                self.verify_executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def read_body(self, receive):
+        """Collect the request body, or return None if it is too large"""
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return b''.join(chunks)
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > self.max_body_size:
+                return None
+            chunks.append(chunk)
+            if not message.get('more_body', False):
+                return b''.join(chunks)
+
+    async def http(self, scope, receive, send):
+        body = await self.read_body(receive)
+        if body is None:
+            await send({'type': 'http.response.start', 'status': 413, 'headers': [(b'content-length', b'0')]})
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+
+        environ = build_environ(scope, body)
+        executor = self.verify_executor if scope['path'] in VERIFY_PATHS else self.db_executor
+        loop = asyncio.get_running_loop()
+        status, headers, response_body = await loop.run_in_executor(
+            executor, call_wsgi, self.flask_app, environ
+        )
+
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': response_body})
+
+
+app = AsgiApp(
+    server.app,
+    db_workers=int(os.environ.get('ASGI_DB_WORKERS', 8)),
+    verify_workers=int(os.environ.get('ASGI_VERIFY_WORKERS', 4)),
+)
+
+if __name__ == '__main__':
+    try:
+        import uvicorn
+    except ModuleNotFoundError:
+        print("Error: the ASGI mode needs an ASGI server:")
+        print("  pip install uvicorn")
+        sys.exit(1)
+    uvicorn.run(app, host=os.environ.get('HOST', '127.0.0.1'), port=int(os.environ.get('PORT', 5000)))
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the server.py request handlers
+
+Each benchmark drives one handler through the Flask test client against its
+own temporary database:
+
+- login_new_user / login_existing_user: POST /api/auth/mock-google
+- get_user_with_prefs / get_user_without_prefs: GET /api/auth/user with the
+  response cache emptied first, so the database path is measured
+- get_user_cached: GET /api/auth/user served from the response cache
+- complete_onboarding_large: POST /api/user/complete-onboarding with
+  `--interests` interests
+- init_db_empty / init_db_large: init_db() from a fresh connection against an
+  empty database and against one with `--rows` users (a worker start)
+
+Results are written to benchmarks/results/<commit>.json (<commit>-dirty.json
+when the tree has uncommitted changes, so they never replace the clean run)
+and compared with the clean results of the nearest ancestor commit that were
+taken with the same options (--number, --repeat, --rows, --interests); any
+benchmark more than `--threshold` slower is reported and makes the script
+exit with status 1. An explicit --baseline run with other options isn't
+compared.
+
+Usage: python benchmarks/bench_handlers.py [--quick] [--baseline SHA|FILE]
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(ROOT)
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+DEFAULT_THRESHOLD = 0.10
+
+import server
+from server import app
+
+
+def git(*args):
+    """Run a git command in the repository and return its output, or None if git fails"""
+    try:
+        return subprocess.run(['git', *args], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def time_calls(fn, number, repeat, setup=None):
+    """Return the per-call seconds of each of `repeat` runs of `number` calls"""
+    timings = []
+    for _ in range(repeat):
+        elapsed = 0.0
+        for _ in range(number):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            fn()
+            elapsed += time.perf_counter() - start
+        timings.append(elapsed / number)
+    return timings
+
+
+def create_users(count, batch_size=50000):
+    """Insert `count` users into the configured database with executemany"""
+    with server.get_db_pool().connection() as conn:
+        for start in range(0, count, batch_size):
+            rows = [(str(uuid.uuid4()), f'bench{i}@example.com', f'Bench {i}', None, 0, 1)
+                    for i in range(start, min(count, start + batch_size))]
+            conn.executemany('INSERT INTO users (id, email, name, picture, is_new_user, onboarding_completed) '
+                             'VALUES (?, ?, ?, ?, ?, ?)', rows)
+            conn.commit()
+
+
+def use_database(db_path):
+    """Point the app at a fresh database and bring its schema up to date"""
+    server.close_db_pool()
+    server.user_cache.clear()
+    app.config['DATABASE'] = db_path
+    server.init_db()
+
+
+def login(client, email, is_signup=False):
+    response = client.post('/api/auth/mock-google', json={'email': email, 'isNewUser': is_signup})
+    assert response.status_code == 200, response.data
+    return response
+
+
+def run(tmpdir, number=200, repeat=5, rows=1000000, interest_count=1000):
+    """Run every benchmark and return {name: {best_us, median_us, number, repeat}}"""
+    app.config['TESTING'] = True
+    results = {}
+
+    def record(name, timings, calls):
+        results[name] = {
+            'best_us': min(timings) * 1e6,
+            'median_us': statistics.median(timings) * 1e6,
+            'number': calls,
+            'repeat': repeat,
+        }
+
+    use_database(os.path.join(tmpdir, 'handlers.db'))
+    client = app.test_client()
+
+    # Logins
+    record('login_new_user', time_calls(lambda: login(client, f'{uuid.uuid4().hex}@example.com', True),
+                                        number, repeat), number)
+    existing = f'existing-{uuid.uuid4().hex}@example.com'
+    login(client, existing, True)
+    record('login_existing_user', time_calls(lambda: login(client, existing), number, repeat), number)
+
+    # get_user, without and with preferences
+    def get_user():
+        response = client.get('/api/auth/user')
+        assert response.status_code == 200, response.data
+
+    login(client, f'noprefs-{uuid.uuid4().hex}@example.com', True)
+    record('get_user_without_prefs', time_calls(get_user, number, repeat, setup=server.user_cache.clear), number)
+
+    login(client, f'prefs-{uuid.uuid4().hex}@example.com', True)
+    response = client.post('/api/user/complete-onboarding', json={
+        'interests': ['space', 'animals', 'sports'], 'age': 8, 'skillLevel': 'beginner', 'character': 'owl'
+    })
+    assert response.status_code == 200, response.data
+    record('get_user_with_prefs', time_calls(get_user, number, repeat, setup=server.user_cache.clear), number)
+    record('get_user_cached', time_calls(get_user, number, repeat), number)
+
+    # Onboarding with a large interest list
+    payload = {
+        'interests': [f'interest-{i}' for i in range(interest_count)],
+        'age': 8, 'skillLevel': 'advanced', 'character': 'fox'
+    }
+
+    def complete_onboarding():
+        response = client.post('/api/user/complete-onboarding', json=payload)
+        assert response.status_code == 200, response.data
+
+    record('complete_onboarding_large', time_calls(complete_onboarding, number, repeat), number)
+
+    # init_db as paid by a starting worker: new pool, schema already current
+    init_calls = max(1, number // 10)
+    for name, db_name, user_count in (('init_db_empty', 'empty.db', 0), ('init_db_large', 'large.db', rows)):
+        use_database(os.path.join(tmpdir, db_name))
+        if user_count:
+            create_users(user_count)
+        record(name, time_calls(server.init_db, init_calls, repeat, setup=server.close_db_pool), init_calls)
+
+    server.close_db_pool()
+    return results
+
+
+def results_path(commit, dirty=False):
+    return os.path.join(RESULTS_DIR, f"{commit}{'-dirty' if dirty else ''}.json")
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def find_baseline(commit, config):
+    """Return the clean results file of the nearest ancestor commit run with the same config"""
+    ancestors = git('rev-list', '--max-count=100', f'{commit}~1') if commit else None
+    for sha in (ancestors or '').split():
+        path = results_path(sha)
+        if os.path.exists(path) and load_results(path).get('config') == config:
+            return path
+    return None
+
+
+def compare_results(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """Return [(name, baseline_us, current_us, change)] for benchmarks slower by more than threshold"""
+    regressions = []
+    for name, result in current.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        change = result['best_us'] / previous['best_us'] - 1
+        if change > threshold:
+            regressions.append((name, previous['best_us'], result['best_us'], change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the server.py request handlers')
+    parser.add_argument('--number', type=int, default=200, help='Calls per timing run')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timing runs (best is compared)')
+    parser.add_argument('--rows', type=int, default=1000000, help='Users in the large init_db database')
+    parser.add_argument('--interests', type=int, default=1000, help='Interests sent to complete_onboarding')
+    parser.add_argument('--quick', action='store_true', help='Small run for a smoke test (not stored)')
+    parser.add_argument('--baseline', help='Commit or results file to compare with (default: nearest ancestor)')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Slowdown that counts as a regression (default: 0.10 = 10%%)')
+    parser.add_argument('--no-save', action='store_true', help="Don't write the results file")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.number, args.repeat, args.rows = 20, 2, 10000
+
+    with tempfile.TemporaryDirectory() as tmpdir, contextlib.redirect_stdout(io.StringIO()):
+        results = run(tmpdir, args.number, args.repeat, args.rows, args.interests)
+
+    commit = git('rev-parse', 'HEAD')
+    dirty = bool(git('status', '--porcelain', '--untracked-files=no'))
+    config = {'number': args.number, 'repeat': args.repeat, 'rows': args.rows, 'interests': args.interests}
+    report = {
+        'commit': commit,
+        'dirty': dirty,
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'config': config,
+        'benchmarks': results,
+    }
+
+    for name, result in results.items():
+        print(f"{name:>28}: {result['best_us']:10.1f} us/call (median {result['median_us']:.1f})")
+
+    if commit and not args.quick and not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        with open(results_path(commit, dirty), 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {os.path.relpath(results_path(commit, dirty))}")
+
+    baseline_file = args.baseline
+    if baseline_file and not os.path.exists(baseline_file):
+        baseline_file = results_path(git('rev-parse', baseline_file) or baseline_file)
+    elif baseline_file is None:
+        baseline_file = find_baseline(commit, config)
+    if not baseline_file or not os.path.exists(baseline_file):
+        print("No baseline results with the same options to compare with.")
+        return
+
+    baseline = load_results(baseline_file)
+    if baseline.get('config') != config:
+        print(f"Not comparing with {baseline.get('commit', baseline_file)}: it was run with "
+              f"{baseline.get('config')}, this run with {config}. Re-run with the same options.")
+        return
+    dirty_note = " (uncommitted changes)" if baseline.get('dirty') else ""
+    print(f"Compared with {baseline.get('commit', baseline_file)}{dirty_note}:")
+    regressions = compare_results(results, baseline['benchmarks'], args.threshold)
+    for name, before, after, change in regressions:
+        print(f"  REGRESSION {name}: {before:.1f} -> {after:.1f} us/call (+{change * 100:.0f}%)")
+    if regressions:
+        sys.exit(1)
+    print(f"  no benchmark slower by more than {args.threshold * 100:.0f}%")
+
+
+if __name__ == '__main__':
+    main()
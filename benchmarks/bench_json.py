@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: serializing the /api/auth/user payload with Flask's default
+JSON provider (the old jsonify path) versus FastJSONProvider, plus parsing the
+stored interests with json.loads versus fast_json.loads
+
+Usage: python benchmarks/bench_json.py [--interests N] [--repeat N] [--number N]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+import fast_json
+from fast_json import FastJSONProvider
+
+
+def user_payload(interest_count):
+    return {
+        'status': 'success',
+        'user': {
+            'id': '6f1c1c0e-3d1b-5b8e-9a55-2f0c2c4f7d11',
+            'email': 'young.reader@example.com',
+            'name': 'Young Reader',
+            'picture': 'https://ui-avatars.com/api/?name=Y&background=random',
+            'isNewUser': False,
+            'onboardingCompleted': True
+        },
+        'userPreferences': {
+            'interests': [f'interest-{i}' for i in range(interest_count)],
+            'age': 8,
+            'skill_level': 'beginner',
+            'character': 'owl'
+        }
+    }
+
+
+def run(interest_count=5, repeat=5, number=20000):
+    """Time both providers and return {name: best seconds per call}"""
+    app = Flask(__name__)
+    default_provider = DefaultJSONProvider(app)
+    fast_provider = FastJSONProvider(app)
+    payload = user_payload(interest_count)
+    stored_interests = json.dumps(payload['userPreferences']['interests'])
+
+    # Same document either way (the fast provider just doesn't sort keys)
+    with app.app_context():
+        assert json.loads(default_provider.response(payload).get_data()) == json.loads(fast_provider.serialize(payload))
+
+    cases = {
+        'default_jsonify': lambda: default_provider.response(payload).get_data(),
+        'fast_serialize': lambda: fast_provider.serialize(payload),
+        'json_loads_interests': lambda: json.loads(stored_interests),
+        'fast_loads_interests': lambda: fast_json.loads(stored_interests),
+    }
+    results = {}
+    with app.app_context():
+        for name, fn in cases.items():
+            results[name] = min(timeit.repeat(fn, repeat=repeat, number=number)) / number
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark JSON serialization of the user payload')
+    parser.add_argument('--interests', type=int, default=5, help='Interests in the payload')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timing runs (best is reported)')
+    parser.add_argument('--number', type=int, default=20000, help='Calls per timing run')
+    args = parser.parse_args()
+
+    print(f"JSON backend: {fast_json.BACKEND}")
+    results = run(args.interests, args.repeat, args.number)
+    for baseline, name in (('default_jsonify', 'fast_serialize'), ('json_loads_interests', 'fast_loads_interests')):
+        for label in (baseline, name):
+            seconds = results[label]
+            print(f"{label:>22}: {seconds * 1e6:8.2f} us/call  ({results[baseline] / seconds:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: two-query user fetch + positional dict building + json.loads
+of the interests (the old get_user code) versus the single LEFT JOIN query with
+interests read from user_interests and the shared row mapper
+
+Usage: python benchmarks/bench_user_profile.py [--users N] [--repeat N]
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import timeit
+import uuid
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from migrations import migrate
+from queries import fetch_user_profile, save_interests
+
+
+def create_db(user_count):
+    """Create an in-memory database with user_count users, half with preferences"""
+    conn = sqlite3.connect(':memory:')
+    migrate(conn, progress=None)
+    user_ids = []
+    for i in range(user_count):
+        user_id = str(uuid.uuid4())
+        user_ids.append(user_id)
+        conn.execute('INSERT INTO users (id, email, name, picture, is_new_user, onboarding_completed) VALUES (?, ?, ?, ?, ?, ?)',
+                     (user_id, f'user{i}@example.com', f'User {i}', 'https://ui-avatars.com/api/?name=U', i % 2 == 0, i % 2 == 1))
+        if i % 2:
+            conn.execute('INSERT INTO user_preferences VALUES (?, ?, ?, ?, ?)',
+                         (user_id, json.dumps(['space', 'animals', 'sports']), 10, 'beginner', 'owl'))
+            save_interests(conn, user_id, ['space', 'animals', 'sports'])
+    conn.commit()
+    return conn, user_ids
+
+
+def two_query_fetch(conn, user_id):
+    """The get_user implementation before the LEFT JOIN rewrite"""
+    cursor = conn.cursor()
+    cursor.execute('SELECT id, email, name, picture, is_new_user, onboarding_completed FROM users WHERE id = ?', (user_id,))
+    user = cursor.fetchone()
+    cursor.execute('SELECT interests, age, skill_level, character FROM user_preferences WHERE user_id = ?', (user_id,))
+    preferences = cursor.fetchone()
+    if not user:
+        return None
+    response_data = {
+        'status': 'success',
+        'user': {
+            'id': user[0],
+            'email': user[1],
+            'name': user[2],
+            'picture': user[3],
+            'isNewUser': bool(user[4]) if user[4] is not None else True,
+            'onboardingCompleted': bool(user[5]) if user[5] is not None else False
+        }
+    }
+    if preferences:
+        response_data['userPreferences'] = {
+            'interests': json.loads(preferences[0]) if preferences[0] else [],
+            'age': preferences[1],
+            'skill_level': preferences[2],
+            'character': preferences[3]
+        }
+    return response_data
+
+
+def run(user_count=10000, repeat=5, number=20000):
+    """Time both implementations and return {name: best seconds per call}"""
+    conn, user_ids = create_db(user_count)
+    lookups = [random.choice(user_ids) for _ in range(number)]
+
+    # Both implementations must produce the same payload
+    for user_id in lookups[:100]:
+        assert two_query_fetch(conn, user_id) == fetch_user_profile(conn, user_id)
+
+    results = {}
+    for name, fn in (('two_query_fetch', two_query_fetch), ('fetch_user_profile', fetch_user_profile)):
+        timings = timeit.repeat(lambda: [fn(conn, user_id) for user_id in lookups], repeat=repeat, number=1)
+        results[name] = min(timings) / number
+    conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the user profile fetch')
+    parser.add_argument('--users', type=int, default=10000, help='Number of users in the benchmark database')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timing runs (best is reported)')
+    parser.add_argument('--number', type=int, default=20000, help='Lookups per timing run')
+    args = parser.parse_args()
+
+    results = run(args.users, args.repeat, args.number)
+    baseline = results['two_query_fetch']
+    for name, seconds in results.items():
+        print(f"{name:>20}: {seconds * 1e6:8.2f} us/call  ({baseline / seconds:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
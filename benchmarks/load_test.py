@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Load generator for the auth API
+
+Replays a mix of sign-ups, logins, /api/auth/user polls and onboarding
+completions against a running server (python server.py, ./start.sh prod, ...)
+from `--concurrency` simulated users, each with its own keep-alive session
+and cookie jar. Reports throughput and p50/p95/p99/p999 latency per route,
+and writes the same numbers to a JSON file for comparing runs.
+
+Usage:
+    python benchmarks/load_test.py --url http://127.0.0.1:5000 \\
+        --concurrency 32 --duration 30 --output load_results.json
+"""
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+import uuid
+
+import requests
+
+# Relative weight of each operation in the traffic mix
+DEFAULT_MIX = {'signup': 1, 'login': 4, 'get_user': 20, 'onboarding': 1}
+
+INTERESTS = ['space', 'animals', 'sports', 'music', 'dinosaurs', 'ocean', 'robots', 'magic']
+
+
+def parse_mix(text):
+    """Parse 'signup=1,login=4,...' into a weights dict"""
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown operation '{name}' (expected one of {', '.join(DEFAULT_MIX)})")
+        mix[name] = float(weight)
+    return mix
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class LoadStats:
+    """Per-route latencies and status counts collected by one worker"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.statuses = {}
+        self.errors = {}
+
+    def record(self, route, seconds, status):
+        self.latencies.setdefault(route, []).append(seconds)
+        counts = self.statuses.setdefault(route, {})
+        counts[status] = counts.get(status, 0) + 1
+
+    def record_error(self, route, error):
+        counts = self.errors.setdefault(route, {})
+        name = type(error).__name__
+        counts[name] = counts.get(name, 0) + 1
+
+    def merge(self, other):
+        for route, values in other.latencies.items():
+            self.latencies.setdefault(route, []).extend(values)
+        for source, target in ((other.statuses, self.statuses), (other.errors, self.errors)):
+            for route, counts in source.items():
+                merged = target.setdefault(route, {})
+                for key, count in counts.items():
+                    merged[key] = merged.get(key, 0) + count
+
+
+class VirtualUser:
+    """One simulated browser: a cookie jar, a keep-alive connection and a current account"""
+
+    def __init__(self, base_url, known_emails, known_lock, rng, conditional=False, interest_count=3,
+                 timeout=10.0):
+        self.base_url = base_url.rstrip('/')
+        self.http = requests.Session()
+        self.known_emails = known_emails
+        self.known_lock = known_lock
+        self.rng = rng
+        self.conditional = conditional
+        self.interest_count = interest_count
+        self.timeout = timeout
+        self.logged_in = False
+        self.etag = None
+
+    def request(self, stats, route, method, path, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.http.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+        except requests.RequestException as e:
+            stats.record_error(route, e)
+            return None
+        stats.record(route, time.perf_counter() - start, response.status_code)
+        return response
+
+    def signup(self, stats):
+        email = f'load-{uuid.uuid4().hex[:12]}@example.com'
+        response = self.request(stats, 'signup', 'POST', '/api/auth/mock-google',
+                                json={'email': email, 'isNewUser': True})
+        if response is not None and response.status_code == 200:
+            with self.known_lock:
+                self.known_emails.append(email)
+            self.logged_in = True
+            self.etag = None
+
+    def login(self, stats):
+        with self.known_lock:
+            email = self.rng.choice(self.known_emails) if self.known_emails else None
+        if email is None:
+            self.signup(stats)
+            return
+        response = self.request(stats, 'login', 'POST', '/api/auth/mock-google',
+                                json={'email': email, 'isNewUser': False})
+        self.logged_in = response is not None and response.status_code == 200
+        self.etag = None
+
+    def get_user(self, stats):
+        if not self.logged_in:
+            self.login(stats)
+        headers = {'If-None-Match': self.etag} if self.conditional and self.etag else {}
+        response = self.request(stats, 'get_user', 'GET', '/api/auth/user', headers=headers)
+        if response is not None:
+            self.etag = response.headers.get('ETag', self.etag)
+            if response.status_code == 401:
+                self.logged_in = False
+
+    def onboarding(self, stats):
+        if not self.logged_in:
+            self.login(stats)
+        payload = {
+            'interests': self.rng.sample(INTERESTS * (self.interest_count // len(INTERESTS) + 1), self.interest_count),
+            'age': self.rng.randint(5, 12),
+            'skillLevel': self.rng.choice(['beginner', 'intermediate', 'advanced']),
+            'character': self.rng.choice(['owl', 'fox', 'robot']),
+        }
+        self.request(stats, 'onboarding', 'POST', '/api/user/complete-onboarding', json=payload)
+
+    def close(self):
+        self.http.close()
+
+
+def summarize(stats, elapsed):
+    """Turn merged LoadStats into the report dict"""
+    routes = {}
+    total = 0
+    for route in sorted(set(stats.latencies) | set(stats.errors)):
+        values = sorted(stats.latencies.get(route, []))
+        errors = sum(stats.errors.get(route, {}).values())
+        total += len(values)
+        routes[route] = {
+            'requests': len(values),
+            'errors': errors,
+            'error_types': stats.errors.get(route, {}),
+            'statuses': {str(status): count for status, count in sorted(stats.statuses.get(route, {}).items())},
+            'throughput_rps': len(values) / elapsed if elapsed else 0.0,
+            'mean_ms': (sum(values) / len(values) * 1000) if values else 0.0,
+            'p50_ms': percentile(values, 0.50) * 1000,
+            'p95_ms': percentile(values, 0.95) * 1000,
+            'p99_ms': percentile(values, 0.99) * 1000,
+            'p999_ms': percentile(values, 0.999) * 1000,
+            'max_ms': (values[-1] * 1000) if values else 0.0,
+        }
+    return {
+        'elapsed_seconds': elapsed,
+        'requests': total,
+        'throughput_rps': total / elapsed if elapsed else 0.0,
+        'routes': routes,
+    }
+
+
+def run_load_test(base_url, concurrency=16, duration=30.0, max_requests=None, mix=None, warmup=0.0,
+                  conditional=False, interest_count=3, seed=None):
+    """Drive the server from `concurrency` threads and return the report dict
+
+    Runs for `duration` seconds, or until `max_requests` operations were issued
+    if that is given. Requests made during the first `warmup` seconds are not
+    counted.
+    """
+    mix = mix or DEFAULT_MIX
+    operations = [name for name, weight in mix.items() if weight > 0]
+    weights = [mix[name] for name in operations]
+
+    known_emails = []
+    known_lock = threading.Lock()
+    issued = [0]
+    issued_lock = threading.Lock()
+    worker_stats = [LoadStats() for _ in range(concurrency)]
+    start_barrier = threading.Barrier(concurrency + 1)
+    timing = {}
+
+    def next_operation():
+        with issued_lock:
+            if max_requests is not None and issued[0] >= max_requests:
+                return False
+            issued[0] += 1
+            return True
+
+    def worker(index):
+        rng = random.Random(None if seed is None else seed + index)
+        user = VirtualUser(base_url, known_emails, known_lock, rng, conditional, interest_count)
+        warmup_stats = LoadStats()
+        start_barrier.wait()
+        try:
+            while time.perf_counter() < timing['deadline'] and next_operation():
+                stats = warmup_stats if time.perf_counter() < timing['measure_from'] else worker_stats[index]
+                getattr(user, rng.choices(operations, weights)[0])(stats)
+        finally:
+            user.close()
+
+    threads = [threading.Thread(target=worker, args=(i,), name=f'load-{i}', daemon=True)
+               for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    now = time.perf_counter()
+    timing['measure_from'] = now + warmup
+    timing['deadline'] = now + warmup + duration
+    start_barrier.wait()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - timing['measure_from']
+
+    merged = LoadStats()
+    for stats in worker_stats:
+        merged.merge(stats)
+    report = summarize(merged, elapsed)
+    report['config'] = {
+        'url': base_url,
+        'concurrency': concurrency,
+        'duration_seconds': duration,
+        'max_requests': max_requests,
+        'warmup_seconds': warmup,
+        'mix': mix,
+        'conditional': conditional,
+        'interests': interest_count,
+    }
+    return report
+
+
+def print_report(report):
+    print(f"{report['requests']} requests in {report['elapsed_seconds']:.1f}s "
+          f"({report['throughput_rps']:.1f} req/s)")
+    print(f"{'route':>12} {'reqs':>7} {'err':>5} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'p999':>8}  (ms)")
+    for route, r in report['routes'].items():
+        print(f"{route:>12} {r['requests']:>7} {r['errors']:>5} {r['throughput_rps']:>8.1f} "
+              f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['p999_ms']:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the auth API')
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='Base URL of the running server')
+    parser.add_argument('--concurrency', type=int, default=16, help='Number of simulated users')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to measure for')
+    parser.add_argument('--requests', type=int, help='Stop after this many operations instead')
+    parser.add_argument('--warmup', type=float, default=0, help='Seconds of unmeasured traffic first')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help='Operation weights, e.g. signup=1,login=4,get_user=20,onboarding=1')
+    parser.add_argument('--conditional', action='store_true', help='Poll /api/auth/user with If-None-Match')
+    parser.add_argument('--interests', type=int, default=3, help='Interests sent per onboarding')
+    parser.add_argument('--seed', type=int, help='Random seed for a repeatable traffic mix')
+    parser.add_argument('--output', default='load_results.json', help='Where to write the JSON report')
+    args = parser.parse_args()
+
+    try:
+        requests.get(args.url.rstrip('/') + '/api/health', timeout=5).raise_for_status()
+    except requests.RequestException as e:
+        print(f"Error: server at {args.url} is not healthy: {e}")
+        sys.exit(1)
+
+    report = run_load_test(args.url, args.concurrency, args.duration, args.requests, args.mix,
+                           args.warmup, args.conditional, args.interests, args.seed)
+    print_report(report)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
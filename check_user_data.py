@@ -1,13 +1,27 @@
 #!/usr/bin/env python3
 import sqlite3
+import contextlib
+import csv
+import gzip
 import json
+import os
 import sys
+import time
 import argparse
+import concurrent.futures
+import queue
+import shutil
+import tempfile
 import uuid
 import datetime
 import requests
 
+import queries
+from migrations import migrate
+
 # Database utilities
+DEFAULT_DUMP_CHUNK_SIZE = 1000
+
 def connect_db(db_name='users.db'):
     """Connect to the SQLite database"""
     conn = sqlite3.connect(db_name)
@@ -32,13 +46,31 @@ def get_user_preferences(conn, user_id):
     cursor.execute("SELECT * FROM user_preferences WHERE user_id = ?", (user_id,))
     return cursor.fetchone()
 
-def dump_database(conn, output_file=None):
-    """Dump the entire database contents in a readable format"""
+def _decode_value(value):
+    """Return a JSON column's parsed value, any other value as is"""
+    if isinstance(value, str) and (value.startswith('[') or value.startswith('{')):
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            pass
+    return value
+
+
+def list_tables(conn):
+    """Names of the user tables in the database"""
+    cursor = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name")
+    return [table[0] for table in cursor.fetchall()]
+
+
+def dump_database(conn, output_file=None, quiet=False):
+    """Dump the entire database contents in a readable format
+
+    Builds the whole dump in memory; use stream_dump for large databases.
+    """
     cursor = conn.cursor()
     
     # Get all tables
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
-    tables = [table[0] for table in cursor.fetchall()]
+    tables = list_tables(conn)
     
     output = {}
     
@@ -63,23 +95,12 @@ def dump_database(conn, output_file=None):
         
         # Display each record
         for i, row in enumerate(rows):
-            record = {}
-            for j, value in enumerate(row):
-                column_name = column_names[j]
-                
-                # Try to parse JSON strings
-                if isinstance(value, str) and (value.startswith('[') or value.startswith('{')):
-                    try:
-                        parsed_value = json.loads(value)
-                        record[column_name] = parsed_value
-                    except json.JSONDecodeError:
-                        record[column_name] = value
-                else:
-                    record[column_name] = value
+            record = {column_names[j]: _decode_value(value) for j, value in enumerate(row)}
             
             # Print record
-            print(f"\nRecord #{i+1}:")
-            print(json.dumps(record, indent=2, default=str))
+            if not quiet:
+                print(f"\nRecord #{i+1}:")
+                print(json.dumps(record, indent=2, default=str))
             
             # Add to table data
             table_data.append(record)
@@ -95,6 +116,268 @@ def dump_database(conn, output_file=None):
     
     return output
 
+def _rowid_clause(rowid_range):
+    """WHERE clause and parameters limiting a query to a (start, end] rowid range"""
+    if rowid_range is None:
+        return '', ()
+    return ' WHERE rowid > ? AND rowid <= ?', tuple(rowid_range)
+
+def iter_table_records(conn, table_name, chunk_size=DEFAULT_DUMP_CHUNK_SIZE, rowid_range=None):
+    """Yield a table's rows as dicts, fetching chunk_size rows at a time
+
+    With rowid_range=(start, end), only rows with start < rowid <= end, in
+    rowid order.
+    """
+    where, params = _rowid_clause(rowid_range)
+    order = ' ORDER BY rowid' if rowid_range else ''
+    cursor = conn.execute(f'SELECT * FROM "{table_name}"{where}{order}', params)
+    column_names = [description[0] for description in cursor.description]
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        for row in rows:
+            yield {column: _decode_value(value) for column, value in zip(column_names, row)}
+
+def open_dump_output(output_file=None, compress=False):
+    """Open a text stream for an NDJSON dump: the file (gzip-compressed if asked or
+    if it ends in .gz), or stdout when no file is given"""
+    if output_file is None:
+        return contextlib.nullcontext(sys.stdout)
+    if compress or output_file.endswith('.gz'):
+        return gzip.open(output_file, 'wt', encoding='utf-8')
+    return open(output_file, 'w', encoding='utf-8')
+
+def stream_dump(conn, output_file=None, compress=False, quiet=False, chunk_size=DEFAULT_DUMP_CHUNK_SIZE):
+    """Dump every table as newline-delimited JSON without holding it in memory
+
+    Each line is {"table": name, "row": {...}}. Rows are read chunk_size at a
+    time and written as they are read, so memory use doesn't depend on table
+    size. Per-record output goes to the console unless quiet; when writing to
+    stdout, the console messages go to stderr instead.
+    Returns {table: rows dumped}.
+    """
+    console = sys.stderr if output_file is None else sys.stdout
+    counts = {}
+    with open_dump_output(output_file, compress) as out:
+        for table_name in list_tables(conn):
+            if not quiet:
+                print(f"\n=== TABLE: {table_name} ===", file=console)
+            count = 0
+            for record in iter_table_records(conn, table_name, chunk_size):
+                out.write(json.dumps({'table': table_name, 'row': record}, default=str, ensure_ascii=False))
+                out.write('\n')
+                count += 1
+                if not quiet:
+                    print(f"\nRecord #{count}:", file=console)
+                    print(json.dumps(record, indent=2, default=str), file=console)
+            counts[table_name] = count
+            print(f"{table_name}: {count} records", file=console)
+    if output_file:
+        print(f"\nDatabase dump written to {output_file}", file=console)
+    return counts
+
+# Parallel dump/verify over one consistent snapshot
+DEFAULT_RANGE_SIZE = 100000
+
+# How long the multi-reader snapshot setup waits for a writer to finish
+DEFAULT_SNAPSHOT_LOCK_TIMEOUT = 30.0
+
+@contextlib.contextmanager
+def snapshot_connections(db_name, count, lock_timeout=DEFAULT_SNAPSHOT_LOCK_TIMEOUT):
+    """Open `count` read-only connections that all see the same snapshot
+
+    A single reader just starts a read transaction and takes no lock. For
+    several, a write lock is held while the readers start their read
+    transactions, so no commit can land in between them; once they have all
+    started it is released. Taking it waits up to lock_timeout seconds for a
+    writer to finish, then raises sqlite3.OperationalError. Under WAL,
+    writers carry on while the readers keep seeing the snapshot until they're
+    closed (in rollback-journal mode, writers wait for the readers to finish
+    instead).
+    """
+    lock_conn = None
+    readers = []
+    try:
+        if count > 1:
+            lock_conn = sqlite3.connect(db_name, isolation_level=None, timeout=lock_timeout)
+            lock_conn.execute('BEGIN IMMEDIATE')
+        try:
+            for _ in range(count):
+                reader = sqlite3.connect(db_name, isolation_level=None, check_same_thread=False)
+                readers.append(reader)
+                reader.execute('BEGIN')
+                # The snapshot is taken by the first read, not by BEGIN
+                reader.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+        finally:
+            if lock_conn is not None:
+                lock_conn.execute('ROLLBACK')
+        yield readers
+    finally:
+        for reader in readers:
+            reader.close()
+        if lock_conn is not None:
+            lock_conn.close()
+
+def plan_ranges(conn, table_name, range_size=DEFAULT_RANGE_SIZE):
+    """Split a table into (start, end] rowid ranges of at most range_size rowids
+
+    Returns [None] (the whole table as one task) for WITHOUT ROWID tables.
+    """
+    try:
+        low, high = conn.execute(f'SELECT MIN(rowid), MAX(rowid) FROM "{table_name}"').fetchone()
+    except sqlite3.OperationalError:
+        return [None]
+    if high is None:
+        return [None]
+    ranges = []
+    start = low - 1
+    while start < high:
+        end = min(start + range_size, high)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+def run_on_snapshot(readers, function, tasks):
+    """Run function(conn, task) for every task on a pool of snapshot readers
+
+    Each reader is used by one thread at a time. Results come back in task
+    order, whatever order the tasks finish in.
+    """
+    idle = queue.Queue()
+    for reader in readers:
+        idle.put(reader)
+
+    def run(task):
+        conn = idle.get()
+        try:
+            return function(conn, task)
+        finally:
+            idle.put(conn)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(readers)) as executor:
+        return list(executor.map(run, tasks))
+
+def _dump_part(conn, task, chunk_size, compress):
+    """Write one (table, rowid range) task to its part file, return its row count"""
+    table_name, rowid_range, part_path = task
+    count = 0
+    # Each part is a complete gzip member; concatenated they're one valid .gz
+    opener = gzip.open if compress else open
+    with opener(part_path, 'wt', encoding='utf-8') as out:
+        for record in iter_table_records(conn, table_name, chunk_size, rowid_range):
+            out.write(json.dumps({'table': table_name, 'row': record}, default=str, ensure_ascii=False))
+            out.write('\n')
+            count += 1
+    return count
+
+def parallel_dump(db_name, output_file=None, compress=False, workers=4,
+                  chunk_size=DEFAULT_DUMP_CHUNK_SIZE, range_size=DEFAULT_RANGE_SIZE):
+    """Dump every table as NDJSON from one snapshot, tables and rowid ranges in parallel
+
+    Produces the same lines as stream_dump, in the same order: each task
+    writes a part file, and the parts are concatenated in (table, rowid)
+    order once they're all done. Returns {table: rows dumped}.
+    """
+    console = sys.stderr if output_file is None else sys.stdout
+    compress = bool(output_file) and (compress or output_file.endswith('.gz'))
+    part_dir = os.path.dirname(os.path.abspath(output_file)) if output_file else None
+
+    with snapshot_connections(db_name, workers) as readers, \
+            tempfile.TemporaryDirectory(dir=part_dir) as temp_dir:
+        tasks = []
+        for table_name in list_tables(readers[0]):
+            for rowid_range in plan_ranges(readers[0], table_name, range_size):
+                tasks.append((table_name, rowid_range, os.path.join(temp_dir, f'part-{len(tasks):06d}')))
+        started = time.perf_counter()
+        part_counts = run_on_snapshot(readers, lambda conn, task: _dump_part(conn, task, chunk_size, compress), tasks)
+
+        counts = {}
+        for (table_name, _, _), count in zip(tasks, part_counts):
+            counts[table_name] = counts.get(table_name, 0) + count
+        if output_file:
+            with open(output_file, 'wb') as out:
+                for _, _, part_path in tasks:
+                    with open(part_path, 'rb') as part:
+                        shutil.copyfileobj(part, out)
+        else:
+            for _, _, part_path in tasks:
+                with open(part_path, encoding='utf-8') as part:
+                    shutil.copyfileobj(part, sys.stdout)
+
+    for table_name, count in counts.items():
+        print(f"{table_name}: {count} records", file=console)
+    print(f"\nDumped {len(tasks)} parts on {workers} workers in {time.perf_counter() - started:.2f}s", file=console)
+    if output_file:
+        print(f"Database dump written to {output_file}", file=console)
+    return counts
+
+def _verify_task(conn, task):
+    """Run one verification query, return its numbers as a dict"""
+    check, table_name, rowid_range = task
+    where, params = _rowid_clause(rowid_range)
+    if check == 'count':
+        return {'rows': conn.execute(f'SELECT COUNT(*) FROM "{table_name}"{where}', params).fetchone()[0]}
+    if check == 'users':
+        rows, with_preferences = conn.execute(
+            'SELECT COUNT(*), SUM(EXISTS (SELECT 1 FROM user_preferences p WHERE p.user_id = u.id)) '
+            f'FROM users u{where}', params
+        ).fetchone()
+        return {'rows': rows, 'users_with_preferences': with_preferences or 0}
+    if check == 'user_preferences':
+        rows, orphaned, invalid = conn.execute(
+            'SELECT COUNT(*), SUM(NOT EXISTS (SELECT 1 FROM users u WHERE u.id = p.user_id)), '
+            "SUM(p.interests IS NOT NULL AND NOT json_valid(p.interests)) "
+            f'FROM user_preferences p{where}', params
+        ).fetchone()
+        return {'rows': rows, 'orphaned_preferences': orphaned or 0, 'invalid_interests': invalid or 0}
+    if check == 'user_interests':
+        rows, orphaned = conn.execute(
+            'SELECT COUNT(*), SUM(NOT EXISTS (SELECT 1 FROM users u WHERE u.id = i.user_id)) '
+            f'FROM user_interests i{where}', params
+        ).fetchone()
+        return {'rows': rows, 'orphaned_interests': orphaned or 0}
+    if check == 'quick_check':
+        problems = [row[0] for row in conn.execute(f'PRAGMA quick_check("{table_name}")').fetchall()]
+        return {'integrity_errors': [] if problems == ['ok'] else problems}
+    raise ValueError(f"Unknown check: {check}")
+
+def verify_database(db_name, workers=4, integrity=False, range_size=DEFAULT_RANGE_SIZE):
+    """Count rows and check consistency of every table from one snapshot, in parallel
+
+    Returns {'tables': {table: rows}, 'users_with_preferences': n, ...}; with
+    integrity=True it also runs PRAGMA quick_check on every table and the
+    counts of orphaned preference/interest rows and unparsable interests.
+    """
+    with snapshot_connections(db_name, workers) as readers:
+        tables = list_tables(readers[0])
+        # Table-specific checks, where the other table they look at exists
+        checks = {}
+        if 'user_preferences' in tables:
+            checks['users'] = 'users'
+        if integrity and 'users' in tables:
+            checks['user_preferences'] = 'user_preferences'
+            checks['user_interests'] = 'user_interests'
+        tasks = []
+        for table_name in tables:
+            check = checks.get(table_name, 'count')
+            for rowid_range in plan_ranges(readers[0], table_name, range_size):
+                tasks.append((check, table_name, rowid_range))
+            if integrity:
+                tasks.append(('quick_check', table_name, None))
+        results = run_on_snapshot(readers, _verify_task, tasks)
+
+    report = {'tables': {}, 'users_with_preferences': 0}
+    if integrity:
+        report.update(orphaned_preferences=0, orphaned_interests=0, invalid_interests=0, integrity_errors=[])
+    for (_, table_name, _), result in zip(tasks, results):
+        for key, value in result.items():
+            if key == 'rows':
+                report['tables'][table_name] = report['tables'].get(table_name, 0) + value
+            else:
+                report[key] += value
+    return report
+
 def clear_database(conn, force=False):
     """Clear all data from the database while preserving the schema"""
     if not force:
@@ -177,6 +460,300 @@ def add_user_preferences(conn, user_id, interests=None, age=None, skill_level=No
     print(f"  Character: {character}")
     return True
 
+# Bulk import/export
+USER_FIELDS = ['id', 'email', 'name', 'picture', 'is_new_user', 'onboarding_completed', 'created_at', 'last_login']
+PREFERENCE_FIELDS = ['interests', 'age', 'skill_level', 'character']
+DEFAULT_BULK_BATCH_SIZE = 50000
+# Page cache for bulk imports (negative = KiB): the user indexes are written in
+# random order, so most of their pages should stay in memory
+IMPORT_CACHE_KIB = 262144
+
+IMPORT_USER_SQL = '''
+INSERT INTO users (id, email, name, picture, is_new_user, onboarding_completed, created_at, last_login)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET
+    email = excluded.email, name = excluded.name, picture = excluded.picture,
+    is_new_user = excluded.is_new_user, onboarding_completed = excluded.onboarding_completed,
+    created_at = excluded.created_at, last_login = excluded.last_login,
+    profile_version = users.profile_version + 1
+'''
+
+IMPORT_PREFERENCES_SQL = '''
+INSERT OR REPLACE INTO user_preferences (user_id, interests, age, skill_level, character)
+VALUES (?, ?, ?, ?, ?)
+'''
+
+# Users in insertion order, with interests read from user_interests (falling
+# back to the JSON column for rows written before it existed)
+EXPORT_USERS_SQL = '''
+SELECT u.id, u.email, u.name, u.picture, u.is_new_user, u.onboarding_completed, u.created_at, u.last_login,
+       p.user_id, p.interests, p.age, p.skill_level, p.character,
+       (SELECT group_concat(interest, char(31))
+        FROM (SELECT i.interest FROM user_interests i WHERE i.user_id = u.id ORDER BY i.position))
+FROM users u
+LEFT JOIN user_preferences p ON p.user_id = u.id
+ORDER BY u.rowid
+'''
+
+
+def detect_format(path, file_format=None):
+    """Return 'csv' or 'jsonl', from file_format or else the file extension"""
+    if file_format:
+        return file_format
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+
+def _parse_bool(value, default):
+    if value is None or value == '':
+        return default
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes')
+    return bool(value)
+
+
+def _parse_interests(value):
+    if value is None or value == '':
+        return []
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            # Plain comma-separated list
+            return [part.strip() for part in value.split(',') if part.strip()]
+    return [str(interest) for interest in value] if isinstance(value, list) else [str(value)]
+
+
+def read_records(f, file_format):
+    """Yield one dict per user from a JSONL or CSV file
+
+    JSONL records nest the preferences under "preferences" (null when the user
+    hasn't completed onboarding), CSV rows have the preference columns inline
+    with interests as a JSON array.
+    """
+    if file_format == 'csv':
+        for row in csv.DictReader(f):
+            preferences = None
+            if any(row.get(field) for field in PREFERENCE_FIELDS):
+                preferences = {field: row.get(field) for field in PREFERENCE_FIELDS}
+            record = {field: row.get(field) or None for field in USER_FIELDS}
+            record['preferences'] = preferences
+            yield record
+    else:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _record_params(record, timestamp):
+    """Return (user row, preferences row or None, interests) for one imported record"""
+    email = record.get('email')
+    if not email:
+        raise ValueError(f"Record without an email: {record}")
+    user_id = record.get('id') or str(uuid.uuid5(uuid.NAMESPACE_DNS, email))
+    name = record.get('name') or email.split('@')[0]
+    preferences = record.get('preferences')
+    has_preferences = bool(preferences)
+
+    user_row = (
+        user_id, email, name,
+        record.get('picture') or "https://ui-avatars.com/api/?name=" + name.replace(' ', '+'),
+        _parse_bool(record.get('is_new_user'), not has_preferences),
+        _parse_bool(record.get('onboarding_completed'), has_preferences),
+        record.get('created_at') or timestamp,
+        record.get('last_login') or timestamp,
+    )
+    if not has_preferences:
+        return user_row, None, []
+
+    interests = _parse_interests(preferences.get('interests'))
+    age = preferences.get('age')
+    preferences_row = (
+        user_id, json.dumps(interests),
+        int(age) if age not in (None, '') else None,
+        preferences.get('skill_level') or None,
+        preferences.get('character') or None,
+    )
+    return user_row, preferences_row, interests
+
+
+def _write_batch(conn, batch, timestamp):
+    """Upsert a batch of records in one transaction"""
+    user_rows = []
+    preference_rows = []
+    interest_owners = []
+    interest_rows = []
+    for record in batch:
+        user_row, preferences_row, interests = _record_params(record, timestamp)
+        user_rows.append(user_row)
+        if preferences_row:
+            preference_rows.append(preferences_row)
+            interest_owners.append((user_row[0],))
+            interest_rows.extend(
+                (user_row[0], position, interest.replace(queries.INTEREST_SEPARATOR, ''))
+                for position, interest in enumerate(interests)
+            )
+    try:
+        conn.executemany(IMPORT_USER_SQL, user_rows)
+        conn.executemany(IMPORT_PREFERENCES_SQL, preference_rows)
+        # Same as queries.save_interests, for the whole batch at once
+        conn.executemany(queries.DELETE_INTERESTS_SQL, interest_owners)
+        conn.executemany(queries.INSERT_INTEREST_SQL, interest_rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def checkpoint_path(input_file):
+    return input_file + '.checkpoint'
+
+
+def _read_checkpoint(path):
+    try:
+        with open(path) as f:
+            return int(json.load(f)['records'])
+    except FileNotFoundError:
+        return 0
+
+
+def _write_checkpoint(path, records):
+    # Write then rename, so a crash never leaves a half-written checkpoint
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump({'records': records}, f)
+    os.replace(temp_path, path)
+
+
+def import_users(conn, input_file, file_format=None, batch_size=DEFAULT_BULK_BATCH_SIZE,
+                 resume=True, progress=print):
+    """Import users (and their preferences) from a JSONL or CSV file
+
+    Records are upserted by id in batches of `batch_size`, one transaction and
+    one executemany per table each. After every committed batch the number of
+    records done is written to <input_file>.checkpoint; if an import is
+    interrupted, running it again resumes after the last committed batch (pass
+    resume=False to start over). Re-importing records is harmless either way.
+    Returns the number of records imported by this run.
+    """
+    file_format = detect_format(input_file, file_format)
+    migrate(conn, progress=progress)
+    # Durable at each commit under WAL, without an fsync per transaction
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA cache_size=-{IMPORT_CACHE_KIB}')
+
+    checkpoint = checkpoint_path(input_file)
+    skip = _read_checkpoint(checkpoint) if resume else 0
+    if skip and progress:
+        progress(f"Resuming {input_file} after {skip} records")
+
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    started = time.perf_counter()
+    done = skip
+    imported = 0
+    batch = []
+    with open(input_file, newline='' if file_format == 'csv' else None, encoding='utf-8') as f:
+        records = read_records(f, file_format)
+        for _ in zip(range(skip), records):
+            pass
+        for record in records:
+            batch.append(record)
+            if len(batch) < batch_size:
+                continue
+            _write_batch(conn, batch, timestamp)
+            done += len(batch)
+            imported += len(batch)
+            batch = []
+            _write_checkpoint(checkpoint, done)
+            if progress:
+                rate = imported / max(time.perf_counter() - started, 1e-9)
+                progress(f"  {done} records imported ({rate:,.0f}/s)")
+        if batch:
+            _write_batch(conn, batch, timestamp)
+            done += len(batch)
+            imported += len(batch)
+
+    # Finished: the next import of this file starts from the beginning
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    if progress:
+        elapsed = time.perf_counter() - started
+        progress(f"Imported {imported} records from {input_file} in {elapsed:.2f}s")
+    return imported
+
+
+def _export_record(row):
+    """Turn an EXPORT_USERS_SQL row into an export record"""
+    (user_id, email, name, picture, is_new_user, onboarding_completed, created_at, last_login,
+     preferences_user_id, interests_json, age, skill_level, character, interest_list) = row
+    record = {
+        'id': user_id,
+        'email': email,
+        'name': name,
+        'picture': picture,
+        'is_new_user': bool(is_new_user),
+        'onboarding_completed': bool(onboarding_completed),
+        'created_at': created_at,
+        'last_login': last_login,
+        'preferences': None,
+    }
+    if preferences_user_id is not None:
+        if interest_list:
+            interests = interest_list.split(queries.INTEREST_SEPARATOR)
+        else:
+            interests = _parse_interests(interests_json)
+        record['preferences'] = {
+            'interests': interests,
+            'age': age,
+            'skill_level': skill_level,
+            'character': character,
+        }
+    return record
+
+
+def export_users(conn, output_file, file_format=None, batch_size=DEFAULT_BULK_BATCH_SIZE, progress=print):
+    """Export every user (and their preferences) to a JSONL or CSV file
+
+    Rows are streamed with fetchmany(batch_size), so memory use doesn't grow
+    with the number of users. The output can be read back with import_users.
+    Returns the number of records written.
+    """
+    file_format = detect_format(output_file, file_format)
+    total = conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+    started = time.perf_counter()
+    written = 0
+
+    with open(output_file, 'w', newline='' if file_format == 'csv' else None, encoding='utf-8') as f:
+        writer = None
+        if file_format == 'csv':
+            writer = csv.DictWriter(f, fieldnames=USER_FIELDS + PREFERENCE_FIELDS)
+            writer.writeheader()
+
+        cursor = conn.execute(EXPORT_USERS_SQL)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                record = _export_record(tuple(row))
+                if writer:
+                    preferences = record.pop('preferences') or {}
+                    record['is_new_user'] = int(record['is_new_user'])
+                    record['onboarding_completed'] = int(record['onboarding_completed'])
+                    if preferences:
+                        record.update(preferences, interests=json.dumps(preferences['interests']))
+                    writer.writerow(record)
+                else:
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            written += len(rows)
+            if progress:
+                progress(f"  {written}/{total} users exported")
+
+    if progress:
+        elapsed = time.perf_counter() - started
+        progress(f"Exported {written} users to {output_file} in {elapsed:.2f}s")
+    return written
+
 def display_user(user, include_all=False):
     """Pretty print a user"""
     if not user:
@@ -396,6 +973,9 @@ def main():
     verify_parser.add_argument('--db', default='users.db', help='Database file to use')
     verify_parser.add_argument('--min-users', type=int, default=1, help='Minimum number of users expected')
     verify_parser.add_argument('--check-preferences', action='store_true', help='Check if users have preferences')
+    verify_parser.add_argument('--integrity', action='store_true',
+                               help='Also run quick_check and look for orphaned rows and invalid interests')
+    verify_parser.add_argument('--workers', type=int, default=1, help='Tables/row ranges checked concurrently')
     
     # Clear database command
     clear_parser = subparsers.add_parser('clear', help='Clear all data from the database')
@@ -405,7 +985,29 @@ def main():
     # Dump database command
     dump_parser = subparsers.add_parser('dump', help='Dump the entire database contents')
     dump_parser.add_argument('--db', default='users.db', help='Database file to dump')
-    dump_parser.add_argument('--output', help='Output file to write the dump to (JSON format)')
+    dump_parser.add_argument('--output', help='Output file to write the dump to (default: stdout with --stream)')
+    dump_parser.add_argument('--stream', action='store_true',
+                             help='Write newline-delimited JSON as rows are read, in constant memory')
+    dump_parser.add_argument('--gzip', action='store_true', help='Gzip-compress a streamed dump (implied by a .gz output)')
+    dump_parser.add_argument('--chunk-size', type=int, default=DEFAULT_DUMP_CHUNK_SIZE, help='Rows fetched at a time when streaming')
+    dump_parser.add_argument('--quiet', action='store_true', help="Don't print every record")
+    dump_parser.add_argument('--workers', type=int, default=1,
+                             help='Dump tables/row ranges concurrently from one snapshot (implies --stream --quiet)')
+    
+    # Bulk import command
+    import_parser = subparsers.add_parser('import', help='Import users and preferences from a JSONL or CSV file')
+    import_parser.add_argument('input', help='File to import (.csv, otherwise JSONL)')
+    import_parser.add_argument('--db', default='users.db', help='Database file to import into')
+    import_parser.add_argument('--format', choices=['jsonl', 'csv'], help='File format (default: from the extension)')
+    import_parser.add_argument('--batch-size', type=int, default=DEFAULT_BULK_BATCH_SIZE, help='Records per transaction')
+    import_parser.add_argument('--restart', action='store_true', help='Ignore a checkpoint left by an interrupted import')
+    
+    # Bulk export command
+    export_parser = subparsers.add_parser('export', help='Export users and preferences to a JSONL or CSV file')
+    export_parser.add_argument('output', help='File to write (.csv, otherwise JSONL)')
+    export_parser.add_argument('--db', default='users.db', help='Database file to export')
+    export_parser.add_argument('--format', choices=['jsonl', 'csv'], help='File format (default: from the extension)')
+    export_parser.add_argument('--batch-size', type=int, default=DEFAULT_BULK_BATCH_SIZE, help='Rows fetched at a time')
     
     args = parser.parse_args()
     
@@ -468,21 +1070,23 @@ def main():
             print("API test could not be completed due to signup failure.")
     
     elif args.command == 'verify':
-        conn = connect_db(args.db)
-        users = get_all_users(conn)
+        try:
+            report = verify_database(args.db, max(1, args.workers), args.integrity)
+        except sqlite3.OperationalError as e:
+            print(f"VERIFICATION FAILED: Could not read a snapshot of {args.db}: {e}")
+            print("If another process is holding a write transaction, try again later or use --workers 1, which takes no lock.")
+            sys.exit(1)
+        users_count = report['tables'].get('users', 0)
+        failed = False
         
-        if len(users) < args.min_users:
-            print(f"VERIFICATION FAILED: Expected at least {args.min_users} users, but found {len(users)}")
+        if users_count < args.min_users:
+            print(f"VERIFICATION FAILED: Expected at least {args.min_users} users, but found {users_count}")
             sys.exit(1)
         else:
-            print(f"VERIFICATION PASSED: Found {len(users)} users (expected at least {args.min_users})")
+            print(f"VERIFICATION PASSED: Found {users_count} users (expected at least {args.min_users})")
         
         if args.check_preferences:
-            preferences_count = 0
-            for user in users:
-                pref = get_user_preferences(conn, user['id'])
-                if pref:
-                    preferences_count += 1
+            preferences_count = report['users_with_preferences']
             
             if preferences_count < args.min_users:
                 print(f"VERIFICATION FAILED: Expected at least {args.min_users} users with preferences, but found {preferences_count}")
@@ -490,7 +1094,17 @@ def main():
             else:
                 print(f"VERIFICATION PASSED: Found {preferences_count} users with preferences (expected at least {args.min_users})")
         
-        conn.close()
+        if args.integrity:
+            for key in ('orphaned_preferences', 'orphaned_interests', 'invalid_interests'):
+                if report[key]:
+                    print(f"VERIFICATION FAILED: {report[key]} {key.replace('_', ' ')}")
+                    failed = True
+            for problem in report['integrity_errors']:
+                print(f"VERIFICATION FAILED: {problem}")
+                failed = True
+            if failed:
+                sys.exit(1)
+            print(f"VERIFICATION PASSED: Integrity checks on {len(report['tables'])} tables")
     
     elif args.command == 'clear':
         conn = connect_db(args.db)
@@ -499,7 +1113,34 @@ def main():
     
     elif args.command == 'dump':
         conn = connect_db(args.db)
-        dump_database(conn, args.output)
+        if args.workers > 1:
+            try:
+                parallel_dump(args.db, args.output, args.gzip, args.workers, args.chunk_size)
+            except sqlite3.OperationalError as e:
+                print(f"Dump failed: could not take a snapshot of {args.db}: {e}")
+                print("If another process is holding a write transaction, try again later or use --stream without --workers.")
+                conn.close()
+                sys.exit(1)
+        elif args.stream or args.gzip:
+            stream_dump(conn, args.output, args.gzip, args.quiet, args.chunk_size)
+        else:
+            dump_database(conn, args.output, args.quiet)
+        conn.close()
+    
+    elif args.command == 'import':
+        conn = connect_db(args.db)
+        try:
+            import_users(conn, args.input, args.format, args.batch_size, resume=not args.restart)
+        except (ValueError, sqlite3.Error) as e:
+            print(f"Import failed: {e}")
+            print("Fix the input and run the same command again to resume from the last committed batch.")
+            sys.exit(1)
+        finally:
+            conn.close()
+    
+    elif args.command == 'export':
+        conn = connect_db(args.db)
+        export_users(conn, args.output, args.format, args.batch_size)
         conn.close()
     
     else:
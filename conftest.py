@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Shared test fixtures
+
+BackendTestCase serves a stand-in for the story backend on a free local port
+for the tests in a class. It's a unittest base class so the tests run the same
+under pytest and run_tests.py.
+"""
+import os
+import sys
+import threading
+import unittest
+
+from werkzeug.serving import make_server
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'src'))
+
+
+class BackendTestCase(unittest.TestCase):
+    """Runs the Flask app from make_backend() in a thread; cls.backend is the app, cls.url its base URL"""
+
+    @classmethod
+    def make_backend(cls):
+        raise NotImplementedError
+
+    @classmethod
+    def setUpClass(cls):
+        cls.backend = cls.make_backend()
+        cls.http_server = make_server('127.0.0.1', 0, cls.backend, threaded=True)
+        threading.Thread(target=cls.http_server.serve_forever, daemon=True).start()
+        cls.url = f'http://127.0.0.1:{cls.http_server.server_port}/'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.http_server.shutdown()
+        cls.http_server.server_close()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+SQLite connection pool used by server.py
+
+Connections are opened once, tuned (WAL journal, synchronous=NORMAL) and then
+handed out again and again instead of being opened and closed per request.
+"""
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_DB_PATH = 'users.db'
+
+
+class ConnectionPool:
+    """A bounded pool of warm SQLite connections for a single database file"""
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, max_size=8, timeout=10.0, factory=sqlite3.Connection):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        # sqlite3.Connection subclass to open, e.g. one that records timings
+        self.factory = factory
+        # LIFO so the most recently used (hottest) connection is reused first
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.wait_time = 0.0
+
+    def _connect(self):
+        """Open and configure a new connection"""
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False,
+                               factory=self.factory)
+        if self.db_path != ':memory:':
+            conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def acquire(self):
+        """Take a connection from the pool, opening a new one if allowed"""
+        if self._closed:
+            raise RuntimeError('Connection pool is closed')
+
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self.hits += 1
+            return conn
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._created < self.max_size
+            if can_create:
+                self._created += 1
+                self.misses += 1
+
+        if can_create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        # Pool is exhausted - wait for another request to hand a connection back
+        start = time.perf_counter()
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise RuntimeError(f'Timed out waiting for a database connection after {self.timeout}s')
+        finally:
+            with self._lock:
+                self.waits += 1
+                self.wait_time += time.perf_counter() - start
+        with self._lock:
+            self.hits += 1
+        return conn
+
+    def release(self, conn):
+        """Return a connection to the pool"""
+        # Never hand out a connection with a half-finished transaction
+        if conn.in_transaction:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                # Rollback failed, so the connection is in an unknown state
+                self.discard(conn)
+                raise
+        if self._closed:
+            self.discard(conn)
+            return
+        self._idle.put(conn)
+
+    def discard(self, conn):
+        """Drop a broken connection instead of returning it to the pool"""
+        try:
+            conn.close()
+        finally:
+            with self._lock:
+                self._created -= 1
+
+    @contextmanager
+    def connection(self):
+        """Context manager that borrows a connection for the duration of a block"""
+        conn = self.acquire()
+        try:
+            yield conn
+        except BaseException:
+            try:
+                self.release(conn)
+            except sqlite3.Error:
+                pass  # already discarded; the original error is the one to report
+            raise
+        else:
+            self.release(conn)
+
+    def close(self):
+        """Close every idle connection and refuse further checkouts"""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+    def stats(self):
+        """Return a snapshot of the pool counters"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'db_path': self.db_path,
+                'size': self._created,
+                'idle': self._idle.qsize(),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': (self.hits / total) if total else 0.0,
+                'waits': self.waits,
+                'wait_time_seconds': self.wait_time,
+            }
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+JSON encoding for server.py: orjson when it's installed, the stdlib otherwise
+
+Both paths produce the same compact, UTF-8, insertion-ordered output, so
+responses don't change shape depending on which one a machine has. (Flask's
+default provider sorts keys and escapes non-ASCII; neither is needed by the
+frontend and both cost time.)
+"""
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ModuleNotFoundError:  # optional dependency
+    orjson = None
+
+BACKEND = 'orjson' if orjson is not None else 'json'
+
+# Let Flask's default() keep handling dates and dataclasses, as jsonify did
+_ORJSON_OPTIONS = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS) if orjson else 0
+
+
+def dumps_bytes(obj, default=None):
+    """Serialize obj to compact UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=default, option=_ORJSON_OPTIONS)
+    return json.dumps(obj, default=default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def dumps(obj, default=None):
+    """Serialize obj to a compact JSON string"""
+    return dumps_bytes(obj, default).decode('utf-8')
+
+
+def loads(data):
+    """Parse JSON from str or bytes"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes with dumps_bytes()"""
+
+    sort_keys = False
+    ensure_ascii = False
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            # e.g. indent for pretty printing in debug mode
+            kwargs.setdefault('default', self.default)
+            kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+            kwargs.setdefault('sort_keys', self.sort_keys)
+            return json.dumps(obj, **kwargs)
+        return dumps(obj, self.default)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return json.loads(s, **kwargs)
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(obj)
+        # Skip the str round trip: bytes straight into the response
+        body = self.serialize(obj)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+    def serialize(self, obj):
+        """Return the exact response body jsonify() would send for obj"""
+        return dumps_bytes(obj, self.default) + b'\n'
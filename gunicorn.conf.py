@@ -0,0 +1,74 @@
+"""
+gunicorn settings for running server.py in production
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The app is imported once in the master (preload_app) and the schema migrated
+there before any worker is forked. Workers are sized to the machine's cores
+and each serves several requests concurrently on threads. The session key is
+read from SECRET_KEY or SECRET_KEY_FILE, so sessions stay valid across
+workers and restarts.
+
+Every worker has its own /api/auth/user cache; keep USER_CACHE_VERIFY on (the
+default) so a hit is checked against users.profile_version and a profile
+changed through another worker is never served stale.
+
+Deploying new code: because the app is preloaded, SIGHUP only replaces the
+workers with new forks of the same master - it neither loads new code nor
+runs init_db. Send SIGUSR2 to start a new master with the new code (and its
+migrations) alongside the old one, then SIGTERM the old master once the new
+workers are up; or stop and start the service.
+
+All settings can be overridden with environment variables (see below) or on
+the gunicorn command line.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', f"0.0.0.0:{os.environ.get('PORT', 5000)}")
+
+# Workers: one process per core plus one by default
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() + 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Import the app (and run init_db) once, before forking
+preload_app = True
+
+# Let in-flight requests finish on restart/shutdown, and recycle workers
+# periodically (with jitter so they don't all restart at once)
+graceful_timeout = int(os.environ.get('GRACEFUL_TIMEOUT', 30))
+timeout = int(os.environ.get('WORKER_TIMEOUT', 30))
+keepalive = 5
+max_requests = int(os.environ.get('MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.environ.get('MAX_REQUESTS_JITTER', 1000))
+
+accesslog = os.environ.get('ACCESS_LOG', '-')
+
+# Structured logs for the log collector
+os.environ.setdefault('LOG_FORMAT', 'json')
+
+# One session key shared by every worker and surviving restarts
+os.environ.setdefault('SECRET_KEY_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'secret_key'))
+
+
+def when_ready(server):
+    """Runs in the master after the app was preloaded, before workers are forked"""
+    import server as app_server
+    app_server.init_db()
+    # Workers must not share the master's SQLite connections
+    app_server.close_db_pool()
+
+
+def post_fork(server, worker):
+    """Make sure a freshly forked worker starts without inherited connections"""
+    import server as app_server
+    app_server.close_db_pool()
+
+
+def worker_exit(server, worker):
+    """Write buffered last_login updates and log records before a worker goes away"""
+    import server as app_server
+    app_server.last_login_writer.stop()
+    app_server.close_db_pool()
+    app_server.log_handler.stop()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Bounded in-process LRU cache with a per-entry TTL, and the cached-response
+type stored in it
+
+Used for assembled API responses (user_cache for /api/auth/user,
+story_catalog for /api/stories). ETags are a hash of the serialized body by
+default, so every worker gives the same ETag for the same content.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+def body_etag(body):
+    """Strong ETag for a serialized response body"""
+    return hashlib.blake2b(body, digest_size=12).hexdigest()
+
+
+class CachedResponse:
+    """An assembled response together with its serialized body and ETag"""
+
+    __slots__ = ('data', 'body', 'etag', 'version')
+
+    def __init__(self, data, body, version=None, etag=None):
+        self.data = data
+        self.body = body
+        # Hashed from the body unless the caller has a cheaper one that
+        # changes whenever the body does
+        self.etag = body_etag(body) if etag is None else etag
+        # The database version the data was read at (users.profile_version)
+        self.version = version
+
+
+class LRUCache:
+    """Bounded LRU cache with per-entry TTL"""
+
+    def __init__(self, max_size=10000, ttl=60.0, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        # key -> (value, expires_at), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """Return the cached value for a key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """Store a value for a key, evicting the least recently used entries if full"""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, self.clock() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """Forget the cached value for a key"""
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return a snapshot of the cache counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': (self.hits / lookups) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Per-request timing for server.py, exposed in Prometheus text format
+
+Every request records its wall time per route, split into phases:
+
+- db_connect / db_query / db_commit: time inside sqlite3 (via TimedConnection)
+- verify: Google ID-token verification
+- json: JSON encoding and decoding (via TimedJSONProvider)
+
+Histograms are kept per thread and only ever written by their own thread, so
+recording takes no locks; a scrape merges them. Threads that have exited are
+folded into a single retired set so short-lived threads (the development
+server starts one per request) don't pile up. With several worker processes
+each one reports its own numbers.
+"""
+import bisect
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from fast_json import FastJSONProvider
+
+# Histogram bucket upper bounds, in seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# environ key the route template is stored under for the middleware
+ROUTE_ENVIRON_KEY = 'metrics.route'
+
+
+class _ThreadMetrics:
+    """Counters owned and written by a single thread"""
+
+    def __init__(self, thread):
+        self.thread = thread
+        # (route, method) -> [bucket counts..., sum, count]
+        self.durations = {}
+        # (route, phase) -> [bucket counts..., sum, count]
+        self.phases = {}
+        # (route, method, status) -> count
+        self.requests = {}
+        # phase -> seconds for the request in progress, or None outside a request
+        self.current = None
+        self.start = 0.0
+
+
+def _observe(histograms, key, seconds, buckets):
+    histogram = histograms.get(key)
+    if histogram is None:
+        histogram = histograms[key] = [0] * (len(buckets) + 3)
+    histogram[bisect.bisect_left(buckets, seconds)] += 1
+    histogram[-2] += seconds
+    histogram[-1] += 1
+
+
+def _merge_histograms(target, source):
+    # list() so a thread adding a new key mid-scrape can't break the iteration
+    for key, histogram in list(source.items()):
+        merged = target.get(key)
+        if merged is None:
+            target[key] = list(histogram)
+        else:
+            for i, value in enumerate(histogram):
+                merged[i] += value
+
+
+def _merge_counts(target, source):
+    for key, count in list(source.items()):
+        target[key] = target.get(key, 0) + count
+
+
+class RequestMetrics:
+    """Request duration and phase histograms for one worker process"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, max_threads=64):
+        self.buckets = tuple(buckets)
+        self.max_threads = max_threads
+        self._local = threading.local()
+        # Registration happens once per thread, so this lock is off the hot path
+        self._lock = threading.Lock()
+        self._threads = []
+        self._retired = _ThreadMetrics(None)
+        self._pid = os.getpid()
+
+    def _thread_metrics(self):
+        metrics = getattr(self._local, 'metrics', None)
+        if metrics is None:
+            metrics = self._register()
+        return metrics
+
+    def _register(self):
+        metrics = _ThreadMetrics(threading.current_thread())
+        with self._lock:
+            if os.getpid() != self._pid:
+                # Forked worker: the parent's numbers aren't ours
+                self._threads = []
+                self._retired = _ThreadMetrics(None)
+                self._pid = os.getpid()
+            self._threads.append(metrics)
+            if len(self._threads) > self.max_threads:
+                self._retire_dead_threads()
+        self._local.metrics = metrics
+        return metrics
+
+    def _retire_dead_threads(self):
+        """Fold the counters of exited threads into the retired set (call with _lock held)"""
+        alive = []
+        for metrics in self._threads:
+            if metrics.thread.is_alive():
+                alive.append(metrics)
+            else:
+                self._merge_into(self._retired, metrics)
+        self._threads = alive
+
+    @staticmethod
+    def _merge_into(target, source):
+        _merge_histograms(target.durations, source.durations)
+        _merge_histograms(target.phases, source.phases)
+        _merge_counts(target.requests, source.requests)
+
+    def start_request(self):
+        """Start timing a request on the current thread"""
+        metrics = self._thread_metrics()
+        metrics.current = {}
+        metrics.start = time.perf_counter()
+
+    def add_time(self, phase, seconds):
+        """Attribute `seconds` to a phase of the current request (ignored outside requests)"""
+        current = getattr(self._local, 'metrics', None)
+        if current is None or current.current is None:
+            return
+        current.current[phase] = current.current.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def timed(self, phase):
+        """Context manager attributing the time spent in its block to a phase"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(phase, time.perf_counter() - start)
+
+    def finish_request(self, route, method, status):
+        """Record the current request's wall time and phases"""
+        metrics = self._thread_metrics()
+        if metrics.current is None:
+            return
+        elapsed = time.perf_counter() - metrics.start
+        route = route or 'unmatched'
+        _observe(metrics.durations, (route, method), elapsed, self.buckets)
+        for phase, seconds in metrics.current.items():
+            _observe(metrics.phases, (route, phase), seconds, self.buckets)
+        key = (route, method, status)
+        metrics.requests[key] = metrics.requests.get(key, 0) + 1
+        metrics.current = None
+
+    def snapshot(self):
+        """Merge every thread's counters into one _ThreadMetrics"""
+        merged = _ThreadMetrics(None)
+        with self._lock:
+            self._retire_dead_threads()
+            self._merge_into(merged, self._retired)
+            threads = list(self._threads)
+        for metrics in threads:
+            self._merge_into(merged, metrics)
+        return merged
+
+    def render_prometheus(self, component_stats=None):
+        """Return the metrics (plus numeric component stats) in Prometheus text format"""
+        snapshot = self.snapshot()
+        lines = [
+            '# HELP http_requests_total Requests handled, by route, method and status.',
+            '# TYPE http_requests_total counter',
+        ]
+        for (route, method, status), count in sorted(snapshot.requests.items()):
+            lines.append(f'http_requests_total{{route="{route}",method="{method}",status="{status}"}} {count}')
+
+        lines += [
+            '# HELP http_request_duration_seconds Request wall time, by route and method.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        for (route, method), histogram in sorted(snapshot.durations.items()):
+            lines += self._histogram_lines('http_request_duration_seconds',
+                                           f'route="{route}",method="{method}"', histogram)
+
+        lines += [
+            '# HELP http_request_phase_seconds Time spent per request in DB, token verification and JSON phases.',
+            '# TYPE http_request_phase_seconds histogram',
+        ]
+        for (route, phase), histogram in sorted(snapshot.phases.items()):
+            lines += self._histogram_lines('http_request_phase_seconds',
+                                           f'route="{route}",phase="{phase}"', histogram)
+
+        for component, stats in (component_stats or {}).items():
+            for key, value in stats.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f'{component}_{key}'
+                lines.append(f'# TYPE {name} gauge')
+                lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def _histogram_lines(self, name, labels, histogram):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, histogram):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram[-1]}')
+        lines.append(f'{name}_sum{{{labels}}} {histogram[-2]}')
+        lines.append(f'{name}_count{{{labels}}} {histogram[-1]}')
+        return lines
+
+
+class MetricsMiddleware:
+    """WSGI middleware timing each request, including session loading and saving"""
+
+    def __init__(self, wsgi_app, metrics):
+        self.wsgi_app = wsgi_app
+        self.metrics = metrics
+
+    def __call__(self, environ, start_response):
+        self.metrics.start_request()
+        status = []
+
+        def timed_start_response(status_line, headers, exc_info=None):
+            status.append(status_line.split(' ', 1)[0])
+            return start_response(status_line, headers, exc_info)
+
+        try:
+            return self.wsgi_app(environ, timed_start_response)
+        finally:
+            self.metrics.finish_request(environ.get(ROUTE_ENVIRON_KEY), environ['REQUEST_METHOD'],
+                                        status[0] if status else '500')
+
+
+def make_timed_connection(metrics):
+    """Return a sqlite3.Connection subclass that reports its time to `metrics`"""
+
+    class TimedCursor(sqlite3.Cursor):
+        def execute(self, *args):
+            start = time.perf_counter()
+            try:
+                return super().execute(*args)
+            finally:
+                metrics.add_time('db_query', time.perf_counter() - start)
+
+        def executemany(self, *args):
+            start = time.perf_counter()
+            try:
+                return super().executemany(*args)
+            finally:
+                metrics.add_time('db_query', time.perf_counter() - start)
+
+    class TimedConnection(sqlite3.Connection):
+        def __init__(self, *args, **kwargs):
+            start = time.perf_counter()
+            super().__init__(*args, **kwargs)
+            metrics.add_time('db_connect', time.perf_counter() - start)
+
+        def cursor(self, factory=TimedCursor):
+            return super().cursor(factory)
+
+        def execute(self, *args):
+            return self.cursor().execute(*args)
+
+        def executemany(self, *args):
+            return self.cursor().executemany(*args)
+
+        def commit(self):
+            start = time.perf_counter()
+            try:
+                super().commit()
+            finally:
+                metrics.add_time('db_commit', time.perf_counter() - start)
+
+    return TimedConnection
+
+
+class TimedJSONProvider(FastJSONProvider):
+    """The app's JSON provider, reporting encode/decode time as the `json` phase"""
+
+    def __init__(self, app, metrics=None):
+        super().__init__(app)
+        self.metrics = metrics
+
+    def dumps(self, obj, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            if self.metrics is not None:
+                self.metrics.add_time('json', time.perf_counter() - start)
+
+    def loads(self, s, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().loads(s, **kwargs)
+        finally:
+            if self.metrics is not None:
+                self.metrics.add_time('json', time.perf_counter() - start)
+
+    def serialize(self, obj):
+        start = time.perf_counter()
+        try:
+            return super().serialize(obj)
+        finally:
+            if self.metrics is not None:
+                self.metrics.add_time('json', time.perf_counter() - start)
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Versioned schema migrations for users.db
+
+The schema version is stored in `PRAGMA user_version`, so a worker starting
+against an up-to-date database only reads that one value. Each migration runs
+once, in order; data backfills are done in rowid-ranged batches that commit
+as they go, so they never rewrite a large table in one giant transaction and
+can be resumed if interrupted (they only touch rows that still need fixing).
+"""
+import json
+import time
+
+DEFAULT_BATCH_SIZE = 10000
+
+
+def get_schema_version(conn):
+    """Return the schema version recorded in the database"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def set_schema_version(conn, version):
+    """Record the schema version (PRAGMA doesn't accept bound parameters)"""
+    conn.execute(f'PRAGMA user_version = {int(version)}')
+
+
+def table_columns(conn, table):
+    """Return the column names of a table, or an empty list if it doesn't exist"""
+    return [column[1] for column in conn.execute(f'PRAGMA table_info({table})').fetchall()]
+
+
+def backfill(conn, table, assignment, condition, batch_size=DEFAULT_BATCH_SIZE, progress=print):
+    """Run `UPDATE table SET assignment WHERE condition` in committed rowid batches"""
+    max_rowid = conn.execute(f'SELECT MAX(rowid) FROM {table}').fetchone()[0]
+    if max_rowid is None:
+        return 0
+
+    updated = 0
+    start = 0
+    while start < max_rowid:
+        end = start + batch_size
+        cursor = conn.execute(
+            f'UPDATE {table} SET {assignment} WHERE rowid > ? AND rowid <= ? AND ({condition})',
+            (start, end)
+        )
+        conn.commit()
+        updated += cursor.rowcount
+        if progress:
+            done = min(end, max_rowid)
+            progress(f"  {table}: SET {assignment} - {done}/{max_rowid} rows scanned ({done * 100 // max_rowid}%), {updated} updated")
+        start = end
+    return updated
+
+
+def _initial_schema(conn, batch_size, progress):
+    """Create users/user_preferences, or bring an older users table up to date"""
+    existing_columns = table_columns(conn, 'users')
+
+    if not existing_columns:
+        conn.execute('''
+        CREATE TABLE users (
+            id TEXT PRIMARY KEY,
+            email TEXT UNIQUE,
+            name TEXT,
+            picture TEXT,
+            is_new_user BOOLEAN DEFAULT 1,
+            onboarding_completed BOOLEAN DEFAULT 0,
+            last_login TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+    else:
+        # SQLite doesn't allow adding columns with non-constant default values,
+        # so we add them without defaults and backfill existing rows
+        for column, column_type in (('is_new_user', 'BOOLEAN'),
+                                    ('onboarding_completed', 'BOOLEAN'),
+                                    ('created_at', 'TIMESTAMP')):
+            if column not in existing_columns:
+                if progress:
+                    progress(f"Adding {column} column...")
+                conn.execute(f'ALTER TABLE users ADD COLUMN {column} {column_type}')
+        conn.commit()
+
+        backfill(conn, 'users', 'is_new_user = 0', 'is_new_user IS NULL', batch_size, progress)
+        backfill(conn, 'users', 'onboarding_completed = 0', 'onboarding_completed IS NULL', batch_size, progress)
+        backfill(conn, 'users', 'created_at = CURRENT_TIMESTAMP', 'created_at IS NULL', batch_size, progress)
+
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS user_preferences (
+        user_id TEXT PRIMARY KEY,
+        interests TEXT,
+        age INTEGER,
+        skill_level TEXT,
+        character TEXT,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    ''')
+
+
+def _login_covering_index(conn, batch_size, progress):
+    """Let the login lookup by email be answered from the index alone"""
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_users_email_login
+    ON users (email, id, name, is_new_user, onboarding_completed)
+    ''')
+
+
+def _sessions_table(conn, batch_size, progress):
+    """Server-side session storage shared by every worker (see session_store.py)"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS sessions (
+        id TEXT PRIMARY KEY,
+        data TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at)')
+
+
+def _user_interests_table(conn, batch_size, progress):
+    """One row per (user, interest), indexed by interest, copied from the JSON column"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS user_interests (
+        user_id TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        interest TEXT NOT NULL,
+        PRIMARY KEY (user_id, position),
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_user_interests_interest ON user_interests (interest, user_id)')
+    conn.commit()
+
+    max_rowid = conn.execute('SELECT MAX(rowid) FROM user_preferences').fetchone()[0]
+    if max_rowid is None:
+        return
+
+    copied = 0
+    start = 0
+    while start < max_rowid:
+        end = start + batch_size
+        rows = conn.execute(
+            'SELECT user_id, interests FROM user_preferences WHERE rowid > ? AND rowid <= ?', (start, end)
+        ).fetchall()
+        params = []
+        for user_id, interests in rows:
+            try:
+                values = json.loads(interests) if interests else []
+            except ValueError:
+                continue
+            if isinstance(values, list):
+                params.extend((user_id, position, str(value)) for position, value in enumerate(values))
+        # OR IGNORE so an interrupted copy can simply be run again
+        conn.executemany('INSERT OR IGNORE INTO user_interests (user_id, position, interest) VALUES (?, ?, ?)', params)
+        conn.commit()
+        copied += len(params)
+        if progress:
+            done = min(end, max_rowid)
+            progress(f"  user_interests: {done}/{max_rowid} preference rows scanned ({done * 100 // max_rowid}%), {copied} interests copied")
+        start = end
+
+
+# The stories the frontend used to bundle, as they stood when migration 5 was
+# written. Kept here (not imported) so the migration never changes after the fact.
+_STORY_CATALOG_SEED = [
+    {
+        'id': 1,
+        'title': 'Zari and The Giganto-Pop',
+        'category': 'animals',
+        'difficulty': 'beginner',
+        'imageUrl': '',
+        'color': '#8BC34A',
+        'pages': [
+            {
+                'type': 'intro',
+                'imageUrl': '/stories/zari_cover.png',
+                'title': 'Zari and The Giganto-Pop',
+            },
+            {
+                'type': 'reading',
+                'imageUrl': '/stories/candy_store.png',
+                'text': 'Lily is looking at the black and purple gummy hearts.',
+            },
+            {
+                'type': 'fillBlank',
+                'imageUrl': '/stories/bathroom.png',
+                'text': 'First, Oscar ___ water and a little shampoo.',
+                'options': ['mix', 'mixed'],
+                'correctAnswer': 'mixed',
+            },
+            {
+                'type': 'comprehension',
+                'imageUrl': '/stories/question.png',
+                'question': 'What color are the gummy hearts?',
+                'options': ['Red and blue', 'Black and purple', 'Green and yellow'],
+                'correctAnswer': 'Black and purple',
+            },
+            {
+                'type': 'reading',
+                'imageUrl': '/stories/zari_happy.png',
+                'text': 'Zari is very happy with her new candy!',
+            },
+        ],
+    },
+    {'id': 2, 'title': 'Rymdresan', 'category': 'space', 'difficulty': 'intermediate',
+     'imageUrl': '', 'color': '#3F51B5', 'pages': []},
+    {'id': 3, 'title': 'Fotbollsmatchen', 'category': 'sports', 'difficulty': 'beginner',
+     'imageUrl': '', 'color': '#FF5722', 'pages': []},
+    {'id': 4, 'title': 'Musikskolan', 'category': 'music', 'difficulty': 'advanced',
+     'imageUrl': '', 'color': '#9C27B0', 'pages': []},
+    {'id': 5, 'title': 'Skogsäventyret', 'category': 'nature', 'difficulty': 'intermediate',
+     'imageUrl': '', 'color': '#4CAF50', 'pages': []},
+    {'id': 6, 'title': 'Vikingaresan', 'category': 'history', 'difficulty': 'advanced',
+     'imageUrl': '', 'color': '#795548', 'pages': []},
+]
+
+
+def _compact_json(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def _story_catalog_tables(conn, batch_size, progress):
+    """Stories and their pages, served by /api/stories; seeded with the stories the frontend used to bundle"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS stories (
+        id INTEGER PRIMARY KEY,
+        title TEXT NOT NULL,
+        category TEXT NOT NULL,
+        difficulty TEXT NOT NULL,
+        page_count INTEGER NOT NULL DEFAULT 0,
+        summary TEXT NOT NULL,
+        updated_at REAL NOT NULL
+    )
+    ''')
+    # Ends in the rowid, so listing one category by id is a range seek
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_stories_category ON stories (category)')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS story_pages (
+        story_id INTEGER NOT NULL,
+        position INTEGER NOT NULL,
+        data TEXT NOT NULL,
+        PRIMARY KEY (story_id, position),
+        FOREIGN KEY (story_id) REFERENCES stories (id)
+    ) WITHOUT ROWID
+    ''')
+    now = time.time()
+    for story in _STORY_CATALOG_SEED:
+        pages = story['pages']
+        summary = {
+            'id': story['id'],
+            'title': story['title'],
+            'category': story['category'],
+            'difficulty': story['difficulty'],
+            'imageUrl': story['imageUrl'],
+            'color': story['color'],
+            'pageCount': len(pages),
+            'questionCount': sum(1 for page in pages if page['type'] in ('fillBlank', 'comprehension')),
+        }
+        # OR IGNORE keeps stories that are already there (and any edits made to them)
+        inserted = conn.execute(
+            'INSERT OR IGNORE INTO stories (id, title, category, difficulty, page_count, summary, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (story['id'], story['title'], story['category'], story['difficulty'], len(pages),
+             _compact_json(summary), now)
+        ).rowcount
+        if inserted:
+            conn.executemany('INSERT OR REPLACE INTO story_pages (story_id, position, data) VALUES (?, ?, ?)', [
+                (story['id'], position, _compact_json(page)) for position, page in enumerate(pages)
+            ])
+
+
+def _profile_version_column(conn, batch_size, progress):
+    """Counter bumped on profile writes, checked by every worker's cached /api/auth/user response"""
+    if 'profile_version' not in table_columns(conn, 'users'):
+        # A constant default, so SQLite adds it without rewriting the table
+        conn.execute('ALTER TABLE users ADD COLUMN profile_version INTEGER NOT NULL DEFAULT 0')
+
+
+# (version, description, function) - append new migrations, never edit old ones
+MIGRATIONS = [
+    (1, 'initial users/user_preferences schema', _initial_schema),
+    (2, 'covering index for the login lookup by email', _login_covering_index),
+    (3, 'server-side sessions table', _sessions_table),
+    (4, 'normalized user_interests table', _user_interests_table),
+    (5, 'story catalog tables', _story_catalog_tables),
+    (6, 'users.profile_version for cross-worker cache checks', _profile_version_column),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def migrate(conn, batch_size=DEFAULT_BATCH_SIZE, progress=print):
+    """Apply every migration newer than the database's schema version
+
+    Returns the list of versions that were applied (empty when the schema was
+    already current, which costs a single PRAGMA read).
+    """
+    current = get_schema_version(conn)
+    if current >= LATEST_VERSION:
+        return []
+
+    applied = []
+    for version, description, function in MIGRATIONS:
+        if version <= current:
+            continue
+        if progress:
+            progress(f"Applying migration {version}: {description}")
+        function(conn, batch_size, progress)
+        set_schema_version(conn, version)
+        conn.commit()
+        applied.append(version)
+    return applied
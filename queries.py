@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+SQL statements used by server.py and the row mappers that turn their results
+into API payloads
+"""
+import logging
+import time
+
+import fast_json
+
+logger = logging.getLogger(__name__)
+
+# Login: only needs columns held in idx_users_email_login, so SQLite answers it
+# from the covering index without reading the table row. INDEXED BY is needed
+# because the planner always prefers the UNIQUE(email) index for email = ?.
+LOGIN_LOOKUP_SQL = '''
+SELECT id, name, is_new_user, onboarding_completed
+FROM users INDEXED BY idx_users_email_login
+WHERE email = ?
+'''
+
+INSERT_USER_SQL = '''
+INSERT INTO users (id, email, name, picture, is_new_user, onboarding_completed, created_at, last_login)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+# REPLACE deletes the old row, so its profile_version is carried over explicitly
+UPSERT_GOOGLE_USER_SQL = '''
+INSERT OR REPLACE INTO users (id, email, name, picture, last_login, profile_version)
+VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP, COALESCE((SELECT profile_version FROM users WHERE id = ?), 0) + 1)
+'''
+
+# Used by the last_login write-behind queue, which may run after a newer
+# timestamp was written directly
+COALESCED_LAST_LOGIN_SQL = 'UPDATE users SET last_login = ? WHERE id = ? AND (last_login IS NULL OR last_login < ?)'
+
+# Sign-up attempt for an existing user sends them through onboarding again
+RESET_ONBOARDING_SQL = '''
+UPDATE users SET is_new_user = 1, onboarding_completed = 0, last_login = ?, profile_version = profile_version + 1
+WHERE id = ?
+'''
+
+UPSERT_PREFERENCES_SQL = '''
+INSERT OR REPLACE INTO user_preferences (user_id, interests, age, skill_level, character)
+VALUES (?, ?, ?, ?, ?)
+'''
+
+COMPLETE_ONBOARDING_SQL = '''
+UPDATE users SET is_new_user = 0, onboarding_completed = 1, profile_version = profile_version + 1
+WHERE id = ?
+'''
+
+# Bumped by every write that changes what /api/auth/user returns, so a worker
+# can tell whether its cached copy of a profile is still current
+PROFILE_VERSION_SQL = 'SELECT profile_version FROM users WHERE id = ?'
+
+# Interests are stored one row each in user_interests (and, for older readers,
+# still as JSON in user_preferences.interests)
+DELETE_INTERESTS_SQL = 'DELETE FROM user_interests WHERE user_id = ?'
+INSERT_INTEREST_SQL = 'INSERT INTO user_interests (user_id, position, interest) VALUES (?, ?, ?)'
+
+# Interests are joined with this (ASCII unit separator) instead of being JSON-encoded
+INTEREST_SEPARATOR = '\x1f'
+
+# One round trip for everything /api/auth/user returns. The preference columns
+# are NULL when the user hasn't completed onboarding yet. group_concat's order
+# is unspecified (and SQLite before 3.44 has no ORDER BY inside it), so the
+# interests are concatenated from a subquery ordered by position.
+USER_PROFILE_SQL = '''
+SELECT u.id, u.email, u.name, u.picture, u.is_new_user, u.onboarding_completed,
+       p.user_id, p.interests, p.age, p.skill_level, p.character,
+       (SELECT group_concat(interest, char(31))
+        FROM (SELECT i.interest FROM user_interests i WHERE i.user_id = u.id ORDER BY i.position))
+FROM users u
+LEFT JOIN user_preferences p ON p.user_id = u.id
+WHERE u.id = ?
+'''
+
+# Recommendations/analytics: users with a given interest, straight from the index
+USERS_BY_INTEREST_SQL = '''
+SELECT user_id FROM user_interests
+WHERE interest = ? AND user_id > ?
+ORDER BY user_id
+LIMIT ?
+'''
+
+# Server-side sessions (session_store.py)
+SESSION_GET_SQL = 'SELECT data, expires_at FROM sessions WHERE id = ?'
+SESSION_SET_SQL = 'INSERT OR REPLACE INTO sessions (id, data, expires_at) VALUES (?, ?, ?)'
+SESSION_DELETE_SQL = 'DELETE FROM sessions WHERE id = ?'
+# Bounded so a large backlog of expired sessions is deleted a batch at a time
+SESSION_PURGE_SQL = '''
+DELETE FROM sessions WHERE id IN (
+    SELECT id FROM sessions WHERE expires_at <= ? ORDER BY expires_at LIMIT ?
+)
+'''
+
+# Story catalog (story_catalog.py). Each story's summary and each page are
+# stored already serialized, so responses are assembled by joining strings.
+# Listing pages by id walks the primary key (or, for one category, the
+# category index, which ends in the rowid) and stops after `limit` rows.
+STORY_LIST_SQL = 'SELECT id, summary FROM stories WHERE id > ? ORDER BY id LIMIT ?'
+STORY_LIST_BY_CATEGORY_SQL = '''
+SELECT id, summary FROM stories
+WHERE category = ? AND id > ?
+ORDER BY id
+LIMIT ?
+'''
+STORY_SUMMARY_SQL = 'SELECT summary, page_count FROM stories WHERE id = ?'
+STORY_PAGES_SQL = '''
+SELECT data FROM story_pages
+WHERE story_id = ? AND position >= ? AND position < ?
+ORDER BY position
+'''
+UPSERT_STORY_SQL = '''
+INSERT INTO stories (id, title, category, difficulty, page_count, summary, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET
+    title = excluded.title, category = excluded.category, difficulty = excluded.difficulty,
+    page_count = excluded.page_count, summary = excluded.summary, updated_at = excluded.updated_at
+'''
+DELETE_STORY_PAGES_SQL = 'DELETE FROM story_pages WHERE story_id = ?'
+INSERT_STORY_PAGE_SQL = 'INSERT INTO story_pages (story_id, position, data) VALUES (?, ?, ?)'
+
+
+# Every statement the server issues, checked by query_plan.py. Add new ones here.
+SERVER_STATEMENTS = {
+    'login_lookup': LOGIN_LOOKUP_SQL,
+    'insert_user': INSERT_USER_SQL,
+    'upsert_google_user': UPSERT_GOOGLE_USER_SQL,
+    'coalesced_last_login': COALESCED_LAST_LOGIN_SQL,
+    'reset_onboarding': RESET_ONBOARDING_SQL,
+    'user_profile': USER_PROFILE_SQL,
+    'upsert_preferences': UPSERT_PREFERENCES_SQL,
+    'complete_onboarding': COMPLETE_ONBOARDING_SQL,
+    'profile_version': PROFILE_VERSION_SQL,
+    'delete_interests': DELETE_INTERESTS_SQL,
+    'insert_interest': INSERT_INTEREST_SQL,
+    'users_by_interest': USERS_BY_INTEREST_SQL,
+    'session_get': SESSION_GET_SQL,
+    'session_set': SESSION_SET_SQL,
+    'session_delete': SESSION_DELETE_SQL,
+    'session_purge': SESSION_PURGE_SQL,
+    'story_list': STORY_LIST_SQL,
+    'story_list_by_category': STORY_LIST_BY_CATEGORY_SQL,
+    'story_summary': STORY_SUMMARY_SQL,
+    'story_pages': STORY_PAGES_SQL,
+    'upsert_story': UPSERT_STORY_SQL,
+    'delete_story_pages': DELETE_STORY_PAGES_SQL,
+    'insert_story_page': INSERT_STORY_PAGE_SQL,
+}
+
+
+def _flag(value, default):
+    """Convert a SQLite BOOLEAN column to a bool, using default for NULL"""
+    return default if value is None else bool(value)
+
+
+def user_profile_from_row(row):
+    """Build the {'status', 'user', 'userPreferences'} payload from a USER_PROFILE_SQL row"""
+    (user_id, email, name, picture, is_new_user, onboarding_completed,
+     prefs_user_id, interests_json, age, skill_level, character, interest_list) = row
+
+    response_data = {
+        'status': 'success',
+        'user': {
+            'id': user_id,
+            'email': email,
+            'name': name,
+            'picture': picture,
+            'isNewUser': _flag(is_new_user, True),
+            'onboardingCompleted': _flag(onboarding_completed, False)
+        }
+    }
+
+    # Include preferences if available
+    if prefs_user_id is not None:
+        if interest_list is not None:
+            interests = interest_list.split(INTEREST_SEPARATOR)
+        elif interests_json and interests_json != '[]':
+            # Written before user_interests existed (or by an older worker)
+            try:
+                interests = fast_json.loads(interests_json)
+            except ValueError as e:
+                logger.warning("Error parsing preferences: %s", e)
+                return response_data
+        else:
+            interests = []
+        response_data['userPreferences'] = {
+            'interests': interests,
+            'age': age,
+            'skill_level': skill_level,
+            'character': character
+        }
+
+    return response_data
+
+
+def fetch_user_profile(conn, user_id):
+    """Load and assemble a user's profile payload, or None if the user doesn't exist"""
+    row = conn.execute(USER_PROFILE_SQL, (user_id,)).fetchone()
+    if row is None:
+        return None
+    return user_profile_from_row(row)
+
+
+def fetch_profile_version(conn, user_id):
+    """Return a user's profile_version, or None if the user doesn't exist"""
+    row = conn.execute(PROFILE_VERSION_SQL, (user_id,)).fetchone()
+    return None if row is None else row[0]
+
+
+def fetch_versioned_user_profile(conn, user_id):
+    """Return (profile_version, profile payload), or (None, None) if the user doesn't exist
+
+    The version is read first: if a write lands in between, the profile is
+    newer than its version and the next version check just reloads it.
+    """
+    version = fetch_profile_version(conn, user_id)
+    if version is None:
+        return None, None
+    return version, fetch_user_profile(conn, user_id)
+
+
+def save_interests(conn, user_id, interests):
+    """Replace a user's interests (a list of strings) in user_interests (the caller commits)"""
+    conn.execute(DELETE_INTERESTS_SQL, (user_id,))
+    # The separator can't appear inside an interest or it would split it on read
+    conn.executemany(INSERT_INTEREST_SQL, [
+        (user_id, position, interest.replace(INTEREST_SEPARATOR, ''))
+        for position, interest in enumerate(interests)
+    ])
+
+
+def users_with_interest(conn, interest, after='', limit=1000):
+    """Return up to `limit` ids of users with an interest, ordered, starting after `after`"""
+    return [row[0] for row in conn.execute(USERS_BY_INTEREST_SQL, (interest, after, limit)).fetchall()]
+
+
+# Page types that ask the reader a question (StoryReader scores these)
+QUESTION_PAGE_TYPES = ('fillBlank', 'comprehension')
+
+
+def story_summary(story):
+    """The catalog entry for a story: everything but its pages"""
+    pages = story.get('pages', [])
+    return {
+        'id': story['id'],
+        'title': story['title'],
+        'category': story['category'],
+        'difficulty': story['difficulty'],
+        'imageUrl': story.get('imageUrl', ''),
+        'color': story.get('color'),
+        'pageCount': len(pages),
+        'questionCount': sum(1 for page in pages if page.get('type') in QUESTION_PAGE_TYPES),
+    }
+
+
+def save_story(conn, story, updated_at=None):
+    """Insert or replace a story and its pages, serializing each once (the caller commits)"""
+    summary = story_summary(story)
+    conn.execute(UPSERT_STORY_SQL, (
+        summary['id'], summary['title'], summary['category'], summary['difficulty'], summary['pageCount'],
+        fast_json.dumps(summary), time.time() if updated_at is None else updated_at
+    ))
+    conn.execute(DELETE_STORY_PAGES_SQL, (summary['id'],))
+    conn.executemany(INSERT_STORY_PAGE_SQL, [
+        (summary['id'], position, fast_json.dumps(page))
+        for position, page in enumerate(story.get('pages', []))
+    ])
+    return summary
+
+
+def story_list_rows(conn, after=0, limit=20, category=None):
+    """Return up to `limit` (id, serialized summary) rows with id > after, in id order"""
+    if category is None:
+        return conn.execute(STORY_LIST_SQL, (after, limit)).fetchall()
+    return conn.execute(STORY_LIST_BY_CATEGORY_SQL, (category, after, limit)).fetchall()
+
+
+def fetch_story_pages(conn, story_id, start=0, count=None):
+    """Return (serialized summary, page count, [serialized pages from start]) or None"""
+    row = conn.execute(STORY_SUMMARY_SQL, (story_id,)).fetchone()
+    if row is None:
+        return None
+    summary, page_count = row
+    end = page_count if count is None else min(page_count, start + count)
+    pages = [page for (page,) in conn.execute(STORY_PAGES_SQL, (story_id, start, end)).fetchall()]
+    return summary, page_count, pages
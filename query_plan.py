@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Query-plan regression check for the SQL statements server.py issues
+
+Runs EXPLAIN QUERY PLAN for every statement in queries.SERVER_STATEMENTS and
+reports any that would scan a whole table instead of seeking an index.
+
+Usage: python query_plan.py [--db users.db]
+(without --db the check runs against a freshly migrated in-memory database)
+"""
+import argparse
+import sqlite3
+import sys
+
+from migrations import migrate
+from queries import SERVER_STATEMENTS
+
+
+def explain(conn, sql):
+    """Return the EXPLAIN QUERY PLAN detail lines for a statement"""
+    params = (None,) * sql.count('?')
+    return [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()]
+
+
+def is_full_scan(detail):
+    """True if a plan step reads a table without using an index"""
+    # Any SCAN step (even "SCAN users USING COVERING INDEX ...") walks a whole table or index.
+    # "SCAN (subquery-N)" only reads back the rows a subquery already produced.
+    return detail.startswith('SCAN ') and detail != 'SCAN CONSTANT ROW' and not detail.startswith('SCAN (subquery-')
+
+
+def check_query_plans(conn, statements=None):
+    """Return {name: plan} for every statement whose plan contains a full scan"""
+    if statements is None:
+        statements = SERVER_STATEMENTS
+    problems = {}
+    for name, sql in statements.items():
+        plan = explain(conn, sql)
+        if any(is_full_scan(detail) for detail in plan):
+            problems[name] = plan
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that every server query uses an index')
+    parser.add_argument('--db', help='Database file to check (default: a fresh in-memory schema)')
+    parser.add_argument('--verbose', action='store_true', help='Print the plan of every statement')
+    args = parser.parse_args()
+
+    if args.db:
+        conn = sqlite3.connect(args.db)
+    else:
+        conn = sqlite3.connect(':memory:')
+        migrate(conn, progress=None)
+
+    if args.verbose:
+        for name, sql in SERVER_STATEMENTS.items():
+            print(f"{name}:")
+            for detail in explain(conn, sql) or ['(no table access)']:
+                print(f"  {detail}")
+
+    problems = check_query_plans(conn)
+    conn.close()
+
+    if problems:
+        for name, plan in problems.items():
+            print(f"FULL SCAN in {name}: {'; '.join(plan)}")
+        sys.exit(1)
+    print(f"OK: all {len(SERVER_STATEMENTS)} statements use indexes")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,97 +1,265 @@
 #!/usr/bin/env python3
 from flask import Flask, request, jsonify, session
 from flask_cors import CORS
+import atexit
 import os
-import sqlite3
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
-import json
 import secrets
+import threading
 import uuid
 import datetime
 
+from db import ConnectionPool, DEFAULT_DB_PATH
+from token_verifier import HTTPCertSource, StaticCertSource, TokenVerifier
+from lru_cache import CachedResponse
+from user_cache import UserCache, profile_etag
+from story_catalog import CatalogQueryError, StoryCatalog, parse_list_args, parse_page_args
+import fast_json
+import queries
+from queries import fetch_profile_version, fetch_versioned_user_profile
+from migrations import migrate
+from write_behind import LastLoginWriter
+from metrics import (MetricsMiddleware, RequestMetrics, ROUTE_ENVIRON_KEY, TimedJSONProvider,
+                     make_timed_connection)
+from structured_logging import configure_logging, parse_route_levels
+from session_store import (MemorySessionStore, ServerSession, ServerSideSessionInterface,
+                           SQLiteSessionStore, TieredSessionStore)
+
 app = Flask(__name__)
+
+# Logging is buffered and written by a background thread. LOG_ROUTE_LEVELS
+# sets levels per route (e.g. "/api/auth/user=WARNING"); only 1 in
+# LOG_SAMPLE_EVERY debug lines per call site is kept.
+app.config['LOG_LEVEL'] = os.environ.get('LOG_LEVEL', 'INFO')
+app.config['LOG_FORMAT'] = os.environ.get('LOG_FORMAT', 'text')
+app.config['LOG_ROUTE_LEVELS'] = parse_route_levels(os.environ.get('LOG_ROUTE_LEVELS', ''))
+app.config['LOG_SAMPLE_EVERY'] = int(os.environ.get('LOG_SAMPLE_EVERY', 100))
+log_handler = configure_logging(
+    level=app.config['LOG_LEVEL'],
+    json_output=app.config['LOG_FORMAT'] == 'json',
+    route_levels=app.config['LOG_ROUTE_LEVELS'],
+    sample_every=app.config['LOG_SAMPLE_EVERY']
+)
+logger = app.logger
+
+# Per-route request timings, split into DB / token verification / JSON phases
+# and served from /api/metrics
+request_metrics = RequestMetrics()
+app.wsgi_app = MetricsMiddleware(app.wsgi_app, request_metrics)
+app.json = TimedJSONProvider(app, request_metrics)
+TimedConnection = make_timed_connection(request_metrics)
 # Improved CORS configuration with origin explicitly set
 CORS(app, supports_credentials=True, origins=["http://localhost:3000"], methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
-app.secret_key = secrets.token_hex(16)  # Generate a random secret key
+
+def load_secret_key():
+    """Return the session signing key
+
+    Every worker process must sign sessions with the same key, so it comes from
+    SECRET_KEY, or from the file named by SECRET_KEY_FILE (created with a random
+    key on first use). Without either, a random per-process key is generated,
+    which is only suitable for the single-process development server.
+    """
+    if os.environ.get('SECRET_KEY'):
+        return os.environ['SECRET_KEY']
+    key_file = os.environ.get('SECRET_KEY_FILE')
+    if not key_file:
+        return secrets.token_hex(16)  # Generate a random secret key
+    if not os.path.exists(key_file):
+        # Write the key to a temporary file and link it into place, so processes
+        # starting at the same time all end up reading the same, complete key
+        tmp_file = f"{key_file}.{os.getpid()}.tmp"
+        fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            f.write(secrets.token_hex(32))
+        try:
+            os.link(tmp_file, key_file)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_file)
+    with open(key_file) as f:
+        return f.read().strip()
+
+app.secret_key = load_secret_key()
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'  # Set to Lax to allow redirects with cookies
 
 # Configure longer session lifetime
 app.config['PERMANENT_SESSION_LIFETIME'] = datetime.timedelta(days=7)  # 7 days
 
+# Database location and connection pool size (override via environment)
+app.config['DATABASE'] = os.environ.get('USERS_DB_PATH', DEFAULT_DB_PATH)
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 8))
+app.config['MIGRATION_BATCH_SIZE'] = int(os.environ.get('MIGRATION_BATCH_SIZE', 10000))
+
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+def get_db_pool():
+    """Return the connection pool for the configured database, creating it on first use"""
+    global _db_pool
+    pool = _db_pool
+    if pool is None or pool.db_path != app.config['DATABASE']:
+        with _db_pool_lock:
+            pool = _db_pool
+            if pool is None or pool.db_path != app.config['DATABASE']:
+                if pool is not None:
+                    pool.close()
+                pool = ConnectionPool(app.config['DATABASE'], max_size=app.config['DB_POOL_SIZE'],
+                                      factory=TimedConnection)
+                _db_pool = pool
+    return pool
+
+# last_login bumps are buffered and written in batches off the request path.
+# LAST_LOGIN_FLUSH_MS bounds how many milliseconds of updates a crash can lose
+# (0 writes them synchronously); LAST_LOGIN_MAX_PENDING bounds how many users.
+app.config['LAST_LOGIN_FLUSH_MS'] = int(os.environ.get('LAST_LOGIN_FLUSH_MS', 500))
+app.config['LAST_LOGIN_BATCH_SIZE'] = int(os.environ.get('LAST_LOGIN_BATCH_SIZE', 500))
+app.config['LAST_LOGIN_MAX_PENDING'] = int(os.environ.get('LAST_LOGIN_MAX_PENDING', 10000))
+last_login_writer = LastLoginWriter(
+    get_db_pool,
+    flush_interval=app.config['LAST_LOGIN_FLUSH_MS'] / 1000.0,
+    max_batch=app.config['LAST_LOGIN_BATCH_SIZE'],
+    max_pending=app.config['LAST_LOGIN_MAX_PENDING']
+)
+
+def close_db_pool():
+    """Flush buffered writes and close all pooled connections (used on shutdown and by tests)"""
+    global _db_pool
+    if _db_pool is not None:
+        last_login_writer.flush()
+    with _db_pool_lock:
+        if _db_pool is not None:
+            _db_pool.close()
+            _db_pool = None
+
+# Sessions are kept server-side; the cookie only carries a signed session id.
+# SESSION_BACKEND is 'sqlite' (shared by all workers, with a short-lived
+# per-process memory tier), 'memory' (single process only) or 'cookie'
+# (Flask's default signed-cookie sessions).
+app.config['SESSION_BACKEND'] = os.environ.get('SESSION_BACKEND', 'sqlite')
+app.config['SESSION_LOCAL_TTL'] = float(os.environ.get('SESSION_LOCAL_TTL', 10))
+app.config['SESSION_CACHE_SIZE'] = int(os.environ.get('SESSION_CACHE_SIZE', 100000))
+app.config['SESSION_PURGE_INTERVAL'] = float(os.environ.get('SESSION_PURGE_INTERVAL', 60))
+app.config['SESSION_PURGE_BATCH_SIZE'] = int(os.environ.get('SESSION_PURGE_BATCH_SIZE', 1000))
+
+if app.config['SESSION_BACKEND'] == 'sqlite':
+    session_store = TieredSessionStore(
+        SQLiteSessionStore(get_db_pool),
+        MemorySessionStore(max_size=app.config['SESSION_CACHE_SIZE']),
+        local_ttl=app.config['SESSION_LOCAL_TTL']
+    )
+elif app.config['SESSION_BACKEND'] == 'memory':
+    session_store = MemorySessionStore(max_size=app.config['SESSION_CACHE_SIZE'])
+elif app.config['SESSION_BACKEND'] == 'cookie':
+    session_store = None
+else:
+    raise ValueError(f"Unknown SESSION_BACKEND: {app.config['SESSION_BACKEND']}")
+
+if session_store is not None:
+    app.session_interface = ServerSideSessionInterface(
+        session_store,
+        purge_interval=app.config['SESSION_PURGE_INTERVAL'],
+        purge_batch_size=app.config['SESSION_PURGE_BATCH_SIZE']
+    )
+
+# Cache of assembled /api/auth/user responses, keyed by user id. Each worker
+# has its own, so with USER_CACHE_VERIFY (the default) a hit is only served
+# after checking users.profile_version, which every profile write bumps -
+# otherwise a write handled by another worker would go unseen until the TTL.
+# Turn it off only when a single process serves every request.
+app.config['USER_CACHE_SIZE'] = int(os.environ.get('USER_CACHE_SIZE', 10000))
+app.config['USER_CACHE_TTL'] = float(os.environ.get('USER_CACHE_TTL', 60))
+app.config['USER_CACHE_VERIFY'] = os.environ.get('USER_CACHE_VERIFY', '1') != '0'
+user_cache = UserCache(max_size=app.config['USER_CACHE_SIZE'], ttl=app.config['USER_CACHE_TTL'])
+
+def cache_user_response(user_id, response_data, version):
+    """Serialize a /api/auth/user response once and cache it with its ETag"""
+    body = app.json.serialize(response_data)
+    entry = CachedResponse(response_data, body, version, profile_etag(user_id, version))
+    user_cache.set(user_id, entry)
+    return entry
+
+def json_body_response(body, status=200):
+    """Wrap an already serialized JSON body in a response"""
+    return app.response_class(body, status=status, mimetype='application/json')
+
+# Bodies that never change, serialized once instead of on every request
+INDEX_BODY = app.json.serialize({"status": "API is running"})
+HEALTHY_BODY = app.json.serialize({'status': 'healthy'})
+LOGGED_OUT_BODY = app.json.serialize({'status': 'success', 'message': 'Logged out successfully'})
+ONBOARDING_COMPLETED_BODY = app.json.serialize({'status': 'success', 'message': 'Onboarding completed successfully'})
+EMAIL_REQUIRED_BODY = app.json.serialize({'status': 'error', 'message': 'Email is required'})
+NOT_LOGGED_IN_BODY = app.json.serialize({'status': 'error', 'message': 'Not logged in'})
+USER_NOT_FOUND_BODY = app.json.serialize({'status': 'error', 'message': 'User not found'})
+USER_DATA_FAILED_BODY = app.json.serialize({'status': 'error', 'message': 'Failed to retrieve user data'})
+UNAUTHORIZED_BODY = app.json.serialize({'status': 'error', 'message': 'Unauthorized'})
+STORY_NOT_FOUND_BODY = app.json.serialize({'status': 'error', 'message': 'Story not found'})
+
+# Story catalog responses, assembled from pre-serialized rows and cached per
+# process for STORY_CACHE_TTL seconds. STORY_CACHE_MAX_AGE is how long browsers
+# and proxies may reuse a response before revalidating it by ETag.
+app.config['STORY_CACHE_SIZE'] = int(os.environ.get('STORY_CACHE_SIZE', 1000))
+app.config['STORY_CACHE_TTL'] = float(os.environ.get('STORY_CACHE_TTL', 300))
+app.config['STORY_CACHE_MAX_AGE'] = int(os.environ.get('STORY_CACHE_MAX_AGE', 300))
+story_catalog = StoryCatalog(get_db_pool, cache_size=app.config['STORY_CACHE_SIZE'],
+                             ttl=app.config['STORY_CACHE_TTL'])
+
+# Google signing certificates - set GOOGLE_CERTS_FILE to verify against a local
+# copy (same JSON format as the Google endpoint) instead of fetching them
+app.config['GOOGLE_CERTS_FILE'] = os.environ.get('GOOGLE_CERTS_FILE')
+
+_token_verifier = None
+
+def get_token_verifier():
+    """Return the shared ID-token verifier, creating it on first use"""
+    global _token_verifier
+    if _token_verifier is None:
+        certs_file = app.config.get('GOOGLE_CERTS_FILE')
+        if certs_file:
+            cert_source = StaticCertSource.from_file(certs_file)
+        else:
+            cert_source = HTTPCertSource()
+        _token_verifier = TokenVerifier(cert_source)
+    return _token_verifier
+
+def set_token_verifier(verifier):
+    """Replace the shared ID-token verifier (used by tests)"""
+    global _token_verifier
+    _token_verifier = verifier
+
 # Setup and migrate database
 def init_db():
-    conn = sqlite3.connect('users.db')
-    cursor = conn.cursor()
-    
-    # First, check if users table exists
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='users'")
-    users_table_exists = cursor.fetchone() is not None
-    
-    if not users_table_exists:
-        # Create the users table with all columns if it doesn't exist
-        cursor.execute('''
-        CREATE TABLE users (
-            id TEXT PRIMARY KEY,
-            email TEXT UNIQUE,
-            name TEXT,
-            picture TEXT,
-            is_new_user BOOLEAN DEFAULT 1,
-            onboarding_completed BOOLEAN DEFAULT 0,
-            last_login TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
+    """Bring the database schema up to date (a no-op when it already is)"""
+    with get_db_pool().connection() as conn:
+        applied = migrate(conn, batch_size=app.config['MIGRATION_BATCH_SIZE'], progress=logger.info)
+    if applied:
+        logger.info("Database migrated to schema version %s.", applied[-1])
     else:
-        # Table exists, check for missing columns and add them safely
-        # SQLite doesn't allow adding columns with non-constant default values,
-        # so we need to add them without defaults and then update them
-        
-        # Check for needed columns
-        cursor.execute("PRAGMA table_info(users)")
-        existing_columns = [column[1] for column in cursor.fetchall()]
-        print(f"Existing columns: {existing_columns}")
-        
-        # Add missing columns without defaults
-        if 'is_new_user' not in existing_columns:
-            print("Adding is_new_user column...")
-            cursor.execute("ALTER TABLE users ADD COLUMN is_new_user BOOLEAN")
-            cursor.execute("UPDATE users SET is_new_user = 0")
-            
-        if 'onboarding_completed' not in existing_columns:
-            print("Adding onboarding_completed column...")
-            cursor.execute("ALTER TABLE users ADD COLUMN onboarding_completed BOOLEAN")
-            cursor.execute("UPDATE users SET onboarding_completed = 0")
-            
-        if 'created_at' not in existing_columns:
-            print("Adding created_at column...")
-            cursor.execute("ALTER TABLE users ADD COLUMN created_at TIMESTAMP")
-            cursor.execute("UPDATE users SET created_at = CURRENT_TIMESTAMP")
-            
-        # Handle NULL values in existing columns
-        cursor.execute("UPDATE users SET is_new_user = 0 WHERE is_new_user IS NULL")
-        cursor.execute("UPDATE users SET onboarding_completed = 0 WHERE onboarding_completed IS NULL")
-    
-    # Create user_preferences table if it doesn't exist
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS user_preferences (
-        user_id TEXT PRIMARY KEY,
-        interests TEXT,
-        age INTEGER,
-        skill_level TEXT,
-        character TEXT,
-        FOREIGN KEY (user_id) REFERENCES users (id)
-    )
-    ''')
-    
-    conn.commit()
-    conn.close()
-    print("Database initialization and migration completed.")
+        logger.info("Database schema is up to date.")
+
+def start_user_session(user_id):
+    """Store the logged-in user in the session under a new session id
+
+    Rotating the id on login means a session cookie an attacker planted in
+    the victim's browser beforehand is never the one that gets authenticated.
+    """
+    if isinstance(session, ServerSession):
+        session.regenerate()
+    else:
+        # Signed-cookie sessions: start from an empty session instead
+        session.clear()
+    session.permanent = True
+    session['user_id'] = user_id
+
+@app.before_request
+def record_route():
+    # Lets the metrics middleware label the request with its route template
+    if request.url_rule is not None:
+        request.environ[ROUTE_ENVIRON_KEY] = request.url_rule.rule
 
 @app.route('/')
 def index():
-    return jsonify({"status": "API is running"})
+    return json_body_response(INDEX_BODY)
 
 @app.route('/api/auth/mock-google', methods=['POST'])
 def mock_google_login():
@@ -104,126 +272,78 @@ def mock_google_login():
         is_signup = request.json.get('isNewUser', False)
         
         if not email:
-            return jsonify({
-                'status': 'error',
-                'message': 'Email is required'
-            }), 400
+            return json_body_response(EMAIL_REQUIRED_BODY, 400)
         
-        print(f"Mock Google login: email={email}, is_signup={is_signup}")
+        logger.info("Mock Google login: email=%s, is_signup=%s", email, is_signup)
         
         # Generate a mock user ID (in production this would come from Google)
         # Using the email to ensure the same user gets the same ID
         userid = str(uuid.uuid5(uuid.NAMESPACE_DNS, email))
         
         # Connect to database
-        conn = sqlite3.connect('users.db')
-        cursor = conn.cursor()
+        with get_db_pool().connection() as conn:
+            cursor = conn.cursor()
         
-        # Check if user already exists
-        cursor.execute('SELECT id, name, is_new_user, onboarding_completed FROM users WHERE email = ?', (email,))
-        existing_user = cursor.fetchone()
+            # Check if user already exists
+            cursor.execute(queries.LOGIN_LOOKUP_SQL, (email,))
+            existing_user = cursor.fetchone()
         
-        current_timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            current_timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
-        if existing_user:
-            # User exists
-            print(f"User exists: {existing_user}")
-            is_new = False
+            if existing_user:
+                # User exists
+                logger.debug("User exists: %s", existing_user, extra={'user_id': userid})
+                is_new = False
+            
+                # If this is a sign-up attempt but user exists, we still set onboarding as needed
+                if is_signup:
+                    logger.info("Sign-up attempt for existing user - marking as needing onboarding",
+                                extra={'user_id': userid})
+                    cursor.execute(queries.RESET_ONBOARDING_SQL, (current_timestamp, userid))
+                    is_new = True
+                    onboarding_completed = False
+                else:
+                    # Regular login - keep existing onboarding status; the
+                    # last_login bump is written in the background
+                    onboarding_completed = bool(existing_user[3]) if existing_user[3] is not None else False
+                    last_login_writer.record(userid, current_timestamp)
             
-            # If this is a sign-up attempt but user exists, we still set onboarding as needed
-            if is_signup:
-                print("Sign-up attempt for existing user - marking as needing onboarding")
-                cursor.execute('''
-                UPDATE users 
-                SET is_new_user = 1, onboarding_completed = 0, last_login = ?
-                WHERE id = ?
-                ''', (current_timestamp, userid))
+                name = existing_user[1]  # Get existing name
+            else:
+                # New user - generate a default name from email
+                logger.info("Creating new user for email: %s", email, extra={'user_id': userid})
                 is_new = True
                 onboarding_completed = False
-            else:
-                # Regular login - keep existing onboarding status
-                onboarding_completed = bool(existing_user[3]) if existing_user[3] is not None else False
-                cursor.execute('''
-                UPDATE users 
-                SET last_login = ?
-                WHERE id = ?
-                ''', (current_timestamp, userid))
-            
-            name = existing_user[1]  # Get existing name
-        else:
-            # New user - generate a default name from email
-            print(f"Creating new user for email: {email}")
-            is_new = True
-            onboarding_completed = False
-            name = email.split('@')[0]  # Use part before @ as default name
+                name = email.split('@')[0]  # Use part before @ as default name
             
-            # Generate a default profile picture based on first letter of email
-            first_letter = email[0].upper()
-            picture = f"https://ui-avatars.com/api/?name={first_letter}&background=random"
+                # Generate a default profile picture based on first letter of email
+                first_letter = email[0].upper()
+                picture = f"https://ui-avatars.com/api/?name={first_letter}&background=random"
             
-            # Insert the new user
-            cursor.execute('''
-            INSERT INTO users (id, email, name, picture, is_new_user, onboarding_completed, created_at, last_login) 
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (userid, email, name, picture, True, False, current_timestamp, current_timestamp))
-        
-        conn.commit()
-        
-        # Get user data from database to return
-        cursor.execute('SELECT id, email, name, picture, is_new_user, onboarding_completed FROM users WHERE id = ?', (userid,))
-        user = cursor.fetchone()
+                # Insert the new user
+                cursor.execute(queries.INSERT_USER_SQL, (userid, email, name, picture, True, False, current_timestamp, current_timestamp))
         
-        # Get user preferences if they exist
-        cursor.execute('SELECT interests, age, skill_level, character FROM user_preferences WHERE user_id = ?', (userid,))
-        preferences = cursor.fetchone()
+            conn.commit()
         
-        conn.close()
+            # Get user data (and preferences, if any) to return
+            version, response_data = fetch_versioned_user_profile(conn, userid)
         
-        if user:
-            # Make session permanent to last longer
-            session.permanent = True
+        if response_data:
+            # Log the user in on a fresh, long-lived session
+            start_user_session(userid)
+            user_data = response_data['user']
+            logger.debug("Session created for user: %s, isNewUser: %s, onboardingCompleted: %s",
+                         userid, user_data['isNewUser'], user_data['onboardingCompleted'], extra={'user_id': userid})
             
-            user_data = {
-                'id': user[0],
-                'email': user[1],
-                'name': user[2],
-                'picture': user[3],
-                'isNewUser': bool(user[4]) if user[4] is not None else True,
-                'onboardingCompleted': bool(user[5]) if user[5] is not None else False
-            }
+            # Write-through: the response is exactly what /api/auth/user returns
+            entry = cache_user_response(userid, response_data, version)
             
-            # Store user ID in session
-            session['user_id'] = userid
-            print(f"Session created for user: {userid}, isNewUser: {user_data['isNewUser']}, onboardingCompleted: {user_data['onboardingCompleted']}")
-            
-            response_data = {
-                'status': 'success',
-                'user': user_data
-            }
-            
-            # Include preferences if available
-            if preferences:
-                try:
-                    user_preferences = {
-                        'interests': json.loads(preferences[0]) if preferences[0] else [],
-                        'age': preferences[1],
-                        'skill_level': preferences[2],
-                        'character': preferences[3]
-                    }
-                    response_data['userPreferences'] = user_preferences
-                except Exception as e:
-                    print(f"Error parsing preferences: {e}")
-            
-            return jsonify(response_data)
+            return json_body_response(entry.body)
         else:
-            return jsonify({
-                'status': 'error',
-                'message': 'Failed to retrieve user data'
-            }), 500
+            return json_body_response(USER_DATA_FAILED_BODY, 500)
             
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Unhandled error in %s", request.path)
         return jsonify({
             'status': 'error',
             'message': f'Server error: {str(e)}'
@@ -240,7 +360,8 @@ def google_login():
         CLIENT_ID = request.json.get('client_id')  # You'll need to provide this from the frontend
         
         # Verify the token
-        idinfo = id_token.verify_oauth2_token(token, google_requests.Request(), CLIENT_ID)
+        with request_metrics.timed('verify'):
+            idinfo = get_token_verifier().verify_oauth2_token(token, CLIENT_ID)
         
         # Get user info
         userid = idinfo['sub']
@@ -249,40 +370,23 @@ def google_login():
         picture = idinfo.get('picture', '')
         
         # Store user info in the database
-        conn = sqlite3.connect('users.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-        INSERT OR REPLACE INTO users (id, email, name, picture, last_login) 
-        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
-        ''', (userid, email, name, picture))
-        conn.commit()
+        with get_db_pool().connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(queries.UPSERT_GOOGLE_USER_SQL, (userid, email, name, picture, userid))
+            conn.commit()
         
-        # Get user data from database to return
-        cursor.execute('SELECT id, email, name, picture FROM users WHERE id = ?', (userid,))
-        user = cursor.fetchone()
-        conn.close()
+            # Get user data from database to return
+            version, response_data = fetch_versioned_user_profile(conn, userid)
         
-        if user:
-            user_data = {
-                'id': user[0],
-                'email': user[1],
-                'name': user[2],
-                'picture': user[3]
-            }
-            
-            # Store user ID in session
-            session.permanent = True
-            session['user_id'] = userid
+        if response_data:
+            # Log the user in on a fresh, long-lived session
+            start_user_session(userid)
             
-            return jsonify({
-                'status': 'success',
-                'user': user_data
-            })
+            entry = cache_user_response(userid, response_data, version)
+            return json_body_response(entry.body)
         else:
-            return jsonify({
-                'status': 'error',
-                'message': 'Failed to retrieve user data'
-            }), 500
+            user_cache.invalidate(userid)
+            return json_body_response(USER_DATA_FAILED_BODY, 500)
             
     except ValueError as e:
         # Invalid token
@@ -300,75 +404,66 @@ def google_login():
 def logout():
     # Clear the session
     session.pop('user_id', None)
-    return jsonify({'status': 'success', 'message': 'Logged out successfully'})
+    return json_body_response(LOGGED_OUT_BODY)
 
 @app.route('/api/auth/user', methods=['GET'])
 def get_user():
     # Check if user is logged in
     user_id = session.get('user_id')
-    print(f"Checking user session: {user_id}")
+    logger.debug("Checking user session: %s", user_id)
     
     if not user_id:
-        return jsonify({
-            'status': 'error',
-            'message': 'Not logged in'
-        }), 401
+        return json_body_response(NOT_LOGGED_IN_BODY, 401)
     
-    # Get user data from database
-    conn = sqlite3.connect('users.db')
-    cursor = conn.cursor()
-    cursor.execute('SELECT id, email, name, picture, is_new_user, onboarding_completed FROM users WHERE id = ?', (user_id,))
-    user = cursor.fetchone()
+    # Serve the assembled response from the cache when we can, or just confirm
+    # the client's copy is still current
+    entry = user_cache.get(user_id)
+    version = None
+    if (entry is not None and app.config['USER_CACHE_VERIFY']) or (entry is None and request.if_none_match):
+        # Another worker may have changed the profile since it was cached, and
+        # without a cached copy the version alone answers a conditional request
+        with get_db_pool().connection() as conn:
+            version = fetch_profile_version(conn, user_id)
+        if version is None:
+            session.pop('user_id', None)  # Clear invalid session
+            return json_body_response(USER_NOT_FOUND_BODY, 404)
+        if entry is not None and entry.version != version:
+            entry = None
     
-    # Get user preferences if they exist
-    cursor.execute('SELECT interests, age, skill_level, character FROM user_preferences WHERE user_id = ?', (user_id,))
-    preferences = cursor.fetchone()
-    
-    conn.close()
+    if entry is not None:
+        etag = entry.etag
+    else:
+        etag = profile_etag(user_id, version) if version is not None else None
+        if etag is None or not request.if_none_match.contains_weak(etag):
+            entry = load_user_response(user_id)
+            if entry is None:
+                session.pop('user_id', None)  # Clear invalid session
+                return json_body_response(USER_NOT_FOUND_BODY, 404)
+            etag = entry.etag
     
-    if user:
-        response_data = {
-            'status': 'success',
-            'user': {
-                'id': user[0],
-                'email': user[1],
-                'name': user[2],
-                'picture': user[3],
-                'isNewUser': bool(user[4]) if user[4] is not None else True,
-                'onboardingCompleted': bool(user[5]) if user[5] is not None else False
-            }
-        }
-        
-        # Include preferences if available
-        if preferences:
-            try:
-                user_preferences = {
-                    'interests': json.loads(preferences[0]) if preferences[0] else [],
-                    'age': preferences[1],
-                    'skill_level': preferences[2],
-                    'character': preferences[3]
-                }
-                response_data['userPreferences'] = user_preferences
-            except Exception as e:
-                print(f"Error parsing preferences: {e}")
-        
-        return jsonify(response_data)
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
     else:
-        session.pop('user_id', None)  # Clear invalid session
-        return jsonify({
-            'status': 'error',
-            'message': 'User not found'
-        }), 404
+        response = json_body_response(entry.body)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def load_user_response(user_id):
+    """Build the /api/auth/user response for a user from the database and cache it"""
+    with get_db_pool().connection() as conn:
+        version, response_data = fetch_versioned_user_profile(conn, user_id)
+    
+    if response_data is None:
+        return None
+    return cache_user_response(user_id, response_data, version)
 
 @app.route('/api/user/complete-onboarding', methods=['POST'])
 def complete_onboarding():
     # Check if user is logged in
     user_id = session.get('user_id')
     if not user_id:
-        return jsonify({
-            'status': 'error',
-            'message': 'Not logged in'
-        }), 401
+        return json_body_response(NOT_LOGGED_IN_BODY, 401)
     
     try:
         # Get preferences data
@@ -377,43 +472,99 @@ def complete_onboarding():
         age = data.get('age')
         skill_level = data.get('skillLevel')
         character = data.get('character')
+        # Interests are stored one string per row and read back as strings
+        if not isinstance(interests, list) or not all(isinstance(interest, str) for interest in interests):
+            return jsonify({
+                'status': 'error',
+                'message': 'interests must be a list of strings'
+            }), 400
         
         # Update user preferences
-        conn = sqlite3.connect('users.db')
-        cursor = conn.cursor()
+        with get_db_pool().connection() as conn:
+            cursor = conn.cursor()
         
-        # Update user preferences
-        cursor.execute('''
-        INSERT OR REPLACE INTO user_preferences (user_id, interests, age, skill_level, character)
-        VALUES (?, ?, ?, ?, ?)
-        ''', (user_id, json.dumps(interests), age, skill_level, character))
+            # Update user preferences
+            cursor.execute(queries.UPSERT_PREFERENCES_SQL, (user_id, fast_json.dumps(interests), age, skill_level, character))
+            queries.save_interests(conn, user_id, interests)
         
-        # Mark onboarding as completed
-        cursor.execute('''
-        UPDATE users SET is_new_user = 0, onboarding_completed = 1 WHERE id = ?
-        ''', (user_id,))
+            # Mark onboarding as completed
+            cursor.execute(queries.COMPLETE_ONBOARDING_SQL, (user_id,))
         
-        conn.commit()
-        conn.close()
+            conn.commit()
         
-        return jsonify({
-            'status': 'success',
-            'message': 'Onboarding completed successfully'
-        })
+        user_cache.invalidate(user_id)
+        
+        return json_body_response(ONBOARDING_COMPLETED_BODY)
         
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Unhandled error in %s", request.path)
         return jsonify({
             'status': 'error',
             'message': f'Server error: {str(e)}'
         }), 500
 
+def catalog_response(entry):
+    """Send a cached catalog body, or a 304 when the client's copy is current"""
+    if request.if_none_match.contains_weak(entry.etag):
+        response = app.response_class(status=304)
+    else:
+        response = json_body_response(entry.body)
+    response.set_etag(entry.etag)
+    response.headers['Cache-Control'] = f"public, max-age={app.config['STORY_CACHE_MAX_AGE']}"
+    return response
+
+@app.route('/api/stories', methods=['GET'])
+def list_stories():
+    # ?cursor=<nextCursor>&limit=20&category=space&fields=id,title
+    try:
+        params = parse_list_args(request.args)
+    except CatalogQueryError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return catalog_response(story_catalog.list_stories(**params))
+
+@app.route('/api/stories/<int:story_id>', methods=['GET'])
+def get_story(story_id):
+    # ?start=0&count=3 - the story's summary plus that window of its pages
+    try:
+        params = parse_page_args(request.args)
+    except CatalogQueryError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    entry = story_catalog.story(story_id, **params)
+    if entry is None:
+        return json_body_response(STORY_NOT_FOUND_BODY, 404)
+    return catalog_response(entry)
+
 # Add a health check endpoint
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    return jsonify({'status': 'healthy'})
+    return json_body_response(HEALTHY_BODY)
+
+# Prometheus metrics for this worker process. Set METRICS_TOKEN to require
+# `Authorization: Bearer <token>` on scrapes.
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    token = app.config.get('METRICS_TOKEN')
+    if token and not secrets.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return json_body_response(UNAUTHORIZED_BODY, 401)
+
+    component_stats = {
+        'db_pool': get_db_pool().stats(),
+        'user_cache': user_cache.stats(),
+        'story_catalog': story_catalog.stats(),
+        'last_login_writer': last_login_writer.stats(),
+        'logging': log_handler.stats(),
+    }
+    if isinstance(app.session_interface, ServerSideSessionInterface):
+        component_stats['sessions'] = app.session_interface.stats()
+    if _token_verifier is not None:
+        component_stats['token_verifier'] = _token_verifier.stats()
+
+    body = request_metrics.render_prometheus(component_stats)
+    return app.response_class(body, mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
     init_db()
+    atexit.register(close_db_pool)
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Server-side sessions for server.py
+
+Instead of Flask's signed cookie holding the whole session, the cookie holds
+a short opaque session id plus a truncated HMAC of it:
+
+    <22 char random id>.<22 char signature>
+
+The signature lets us reject forged or corrupted ids without touching the
+store; the session data itself lives server-side, so logging out (or deleting
+the row) really revokes a session, even if the cookie was copied.
+
+Stores:
+- MemorySessionStore: per-process LRU, O(1) lookups
+- SQLiteSessionStore: `sessions` table in users.db, shared by every worker
+- TieredSessionStore: a short-lived memory tier in front of SQLite, so the
+  /api/auth/user polling doesn't hit the database on every request. Another
+  worker may keep serving a revoked session from its memory tier for up to
+  `local_ttl` seconds.
+
+Expired sessions are deleted in batches every `purge_interval` seconds.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import secrets
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+from queries import SESSION_DELETE_SQL, SESSION_GET_SQL, SESSION_PURGE_SQL, SESSION_SET_SQL
+
+logger = logging.getLogger(__name__)
+
+SESSION_ID_BYTES = 16
+SIGNATURE_BYTES = 16
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session dict that remembers its id and whether it was changed"""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.accessed = False
+        # Id this session had before regenerate(), deleted from the store on save
+        self.replaced_sid = None
+
+    def regenerate(self):
+        """Move the session to a fresh id, e.g. on login
+
+        Called whenever the session gains privileges, so an id an attacker
+        obtained (or planted in the victim's browser) before that point is
+        never the one that ends up authenticated.
+        """
+        if not self.new and self.replaced_sid is None:
+            self.replaced_sid = self.sid
+        self.sid = secrets.token_urlsafe(SESSION_ID_BYTES)
+        self.new = True
+        self.modified = True
+
+    def __getitem__(self, key):
+        self.accessed = True
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.accessed = True
+        return super().get(key, default)
+
+
+class MemorySessionStore:
+    """In-process LRU session store"""
+
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        # sid -> (serialized data, expires_at), least recently used first
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, sid, now):
+        """Return the serialized session data, or None if missing/expired"""
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None:
+                return None
+            data, expires_at = entry
+            if expires_at <= now:
+                self._remove(sid)
+                return None
+            self._entries.move_to_end(sid)
+            return data, expires_at
+
+    def set(self, sid, data, expires_at):
+        with self._lock:
+            if sid in self._entries:
+                self._remove(sid)
+            self._entries[sid] = (data, expires_at)
+            self._bytes += len(sid) + len(data)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, sid):
+        with self._lock:
+            if sid in self._entries:
+                self._remove(sid)
+
+    def _remove(self, sid):
+        data, _ = self._entries.pop(sid)
+        self._bytes -= len(sid) + len(data)
+
+    def purge_expired(self, now, batch_size=1000):
+        """Delete up to batch_size expired sessions, returning how many were removed"""
+        with self._lock:
+            expired = [sid for sid, (_, expires_at) in self._entries.items() if expires_at <= now][:batch_size]
+            for sid in expired:
+                self._remove(sid)
+            return len(expired)
+
+    def count(self):
+        return len(self._entries)
+
+    def memory_bytes(self):
+        """Approximate memory held by session ids and data"""
+        return self._bytes + sys.getsizeof(self._entries)
+
+
+class SQLiteSessionStore:
+    """Session store backed by the `sessions` table, shared across workers"""
+
+    def __init__(self, get_pool):
+        # Called per operation so the store follows the configured database
+        self.get_pool = get_pool
+
+    def get(self, sid, now):
+        with self.get_pool().connection() as conn:
+            row = conn.execute(SESSION_GET_SQL, (sid,)).fetchone()
+        if row is None or row[1] <= now:
+            return None
+        return row[0], row[1]
+
+    def set(self, sid, data, expires_at):
+        with self.get_pool().connection() as conn:
+            conn.execute(SESSION_SET_SQL, (sid, data, expires_at))
+            conn.commit()
+
+    def delete(self, sid):
+        with self.get_pool().connection() as conn:
+            conn.execute(SESSION_DELETE_SQL, (sid,))
+            conn.commit()
+
+    def purge_expired(self, now, batch_size=1000):
+        with self.get_pool().connection() as conn:
+            cursor = conn.execute(SESSION_PURGE_SQL, (now, batch_size))
+            conn.commit()
+            return cursor.rowcount
+
+    def count(self):
+        with self.get_pool().connection() as conn:
+            return conn.execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+
+    def memory_bytes(self):
+        return 0
+
+
+class TieredSessionStore:
+    """Memory LRU in front of a shared store"""
+
+    def __init__(self, backing, memory=None, local_ttl=10.0):
+        self.backing = backing
+        self.memory = memory or MemorySessionStore()
+        self.local_ttl = local_ttl
+
+    def get(self, sid, now):
+        entry = self.memory.get(sid, now)
+        if entry is not None:
+            return entry
+        entry = self.backing.get(sid, now)
+        if entry is not None:
+            # Keep it locally only briefly so revocations elsewhere are noticed
+            data, expires_at = entry
+            self.memory.set(sid, data, min(expires_at, now + self.local_ttl))
+        return entry
+
+    def set(self, sid, data, expires_at):
+        self.backing.set(sid, data, expires_at)
+        self.memory.set(sid, data, min(expires_at, time.time() + self.local_ttl))
+
+    def delete(self, sid):
+        self.memory.delete(sid)
+        self.backing.delete(sid)
+
+    def purge_expired(self, now, batch_size=1000):
+        self.memory.purge_expired(now, batch_size)
+        return self.backing.purge_expired(now, batch_size)
+
+    def count(self):
+        return self.backing.count()
+
+    def memory_bytes(self):
+        return self.memory.memory_bytes()
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Flask session interface keeping session data in a session store"""
+
+    def __init__(self, store, purge_interval=60.0, purge_batch_size=1000):
+        self.store = store
+        self.purge_interval = purge_interval
+        self.purge_batch_size = purge_batch_size
+        self._next_purge = 0.0
+
+        # Counters
+        self.lookups = 0
+        self.lookup_time = 0.0
+        self.max_lookup_time = 0.0
+        self.rejected_tokens = 0
+        self.purged = 0
+
+    def _sign(self, app, sid):
+        key = app.secret_key.encode('utf-8') if isinstance(app.secret_key, str) else app.secret_key
+        digest = hmac.new(key, sid.encode('ascii'), hashlib.sha256).digest()
+        return _b64(digest[:SIGNATURE_BYTES])
+
+    def make_token(self, app, sid):
+        """Return the cookie value for a session id"""
+        return f'{sid}.{self._sign(app, sid)}'
+
+    def parse_token(self, app, token):
+        """Return the session id from a cookie value, or None if the signature is wrong"""
+        sid, _, signature = token.partition('.')
+        if not sid or not signature:
+            return None
+        try:
+            expected = self._sign(app, sid)
+        except UnicodeEncodeError:
+            return None
+        if not hmac.compare_digest(signature, expected):
+            return None
+        return sid
+
+    def _lifetime(self, app, session):
+        if session.permanent:
+            return app.permanent_session_lifetime.total_seconds()
+        # Non-permanent sessions still need to expire server-side eventually
+        return 24 * 60 * 60
+
+    def open_session(self, app, request):
+        token = request.cookies.get(self.get_cookie_name(app))
+        if not token:
+            return ServerSession(sid=secrets.token_urlsafe(SESSION_ID_BYTES), new=True)
+
+        sid = self.parse_token(app, token)
+        if sid is None:
+            self.rejected_tokens += 1
+            return ServerSession(sid=secrets.token_urlsafe(SESSION_ID_BYTES), new=True)
+
+        start = time.perf_counter()
+        entry = self.store.get(sid, time.time())
+        elapsed = time.perf_counter() - start
+        self.lookups += 1
+        self.lookup_time += elapsed
+        self.max_lookup_time = max(self.max_lookup_time, elapsed)
+
+        if entry is None:
+            # Expired or revoked - start over with a fresh id
+            return ServerSession(sid=secrets.token_urlsafe(SESSION_ID_BYTES), new=True)
+
+        session = ServerSession(json.loads(entry[0]), sid=sid)
+        session.expires_at = entry[1]
+        return session
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+        now = time.time()
+
+        self._maybe_purge(now)
+
+        if session.replaced_sid is not None:
+            self.store.delete(session.replaced_sid)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        # Emptied (e.g. logout): revoke server-side and drop the cookie. The
+        # `_permanent` flag alone doesn't make a session worth keeping.
+        if not any(key != '_permanent' for key in session):
+            if session.modified:
+                if not session.new:
+                    self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=secure,
+                                       samesite=samesite, httponly=httponly)
+            return
+
+        lifetime = self._lifetime(app, session)
+        # Extend a sliding session only once half its lifetime has passed, so
+        # polling requests don't each cause a write
+        expires_at = getattr(session, 'expires_at', None)
+        refresh = session.permanent and app.config['SESSION_REFRESH_EACH_REQUEST'] and (
+            expires_at is None or expires_at - now < lifetime / 2
+        )
+        if not (session.modified or session.new or refresh):
+            return
+
+        self.store.set(session.sid, json.dumps(dict(session), separators=(',', ':')), now + lifetime)
+        response.set_cookie(
+            name,
+            self.make_token(app, session.sid),
+            expires=self.get_expiration_time(app, session),
+            httponly=httponly,
+            domain=domain,
+            path=path,
+            secure=secure,
+            samesite=samesite,
+        )
+
+    def _maybe_purge(self, now):
+        if now < self._next_purge:
+            return
+        self._next_purge = now + self.purge_interval
+        try:
+            self.purged += self.store.purge_expired(now, self.purge_batch_size)
+        except Exception as e:
+            # Housekeeping must never fail the request it piggybacks on
+            logger.warning("Error purging expired sessions (will retry): %s", e)
+
+    def stats(self):
+        """Return a snapshot of the session counters"""
+        lookups = self.lookups
+        return {
+            'sessions': self.store.count(),
+            'memory_bytes': self.store.memory_bytes(),
+            'lookups': lookups,
+            'avg_lookup_seconds': (self.lookup_time / lookups) if lookups else 0.0,
+            'max_lookup_seconds': self.max_lookup_time,
+            'rejected_tokens': self.rejected_tokens,
+            'purged': self.purged,
+        }
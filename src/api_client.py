@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Client for the story backend (the endpoints src/test_api.py exercises)
+
+One StoryAPIClient holds a keep-alive connection pool, so repeated calls skip
+the TCP+TLS handshake to Cloud Run. 429/502/503/504 responses (e.g. during a
+cold start) and connection failures are retried with jittered exponential
+backoff; a Retry-After header, when the server sends one, sets the wait
+instead (or ends the retries, if it asks for more than max_retry_after).
+POSTs start expensive model calls, so they are only retried when the
+request never reached the backend or was turned away before it ran (429,
+503) - not on read timeouts, dropped connections, 502 or 504, after which
+the backend may still be working on it. Every call is reported to the
+timing hooks.
+
+With a DiskCache (src/response_cache.py), successful responses from the
+cacheable endpoints are stored by a hash of the payload, and the same
+request is then answered from disk without calling the backend at all.
+
+    client = StoryAPIClient(base_url)
+    client.add_hook(lambda call: print(call['endpoint'], call['elapsed_ms']))
+    story = client.initialize_story({'name': 'Alex', 'age': 10, ...})
+
+Safe to share between threads; size pool_size to the number of threads.
+"""
+import email.utils
+import json
+import random
+import time
+
+import requests
+import urllib3
+
+from response_cache import cache_key
+
+DEFAULT_BASE_URL = "https://rangerz-backend-331294271019.europe-north2.run.app/"
+
+# Statuses worth retrying: rate limiting and a backend that isn't up (yet)
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+# Methods that can be repeated safely after the server may have received them
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+# Statuses retried for other methods: the request was refused, not run. A 502
+# or 504 from the gateway may mean the backend is still working on it
+NON_IDEMPOTENT_RETRY_STATUSES = frozenset({429, 503})
+
+# Endpoints whose response depends only on the payload, so are worth caching
+CACHEABLE_ENDPOINTS = frozenset({"initialize_story", "generate_image"})
+
+
+class APIError(Exception):
+    """The backend answered with a non-200 status"""
+
+    def __init__(self, status_code, text):
+        super().__init__(f"HTTP {status_code}: {text[:200]}")
+        self.status_code = status_code
+        self.text = text
+
+
+def parse_retry_after(value, now=None):
+    """Seconds to wait according to a Retry-After header (delay or HTTP date), or None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    return max(0.0, when.timestamp() - (time.time() if now is None else now))
+
+
+def request_not_sent(error):
+    """True if a requests exception means the connection was never established"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    # Refused/unresolvable: ConnectionError(MaxRetryError(reason=NewConnectionError))
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, (urllib3.exceptions.NewConnectionError, urllib3.exceptions.ConnectTimeoutError))
+
+
+class StoryAPIClient:
+    """Pooled, retrying HTTP client for the story backend"""
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, connect_timeout=5.0, read_timeout=120.0,
+                 max_retries=4, backoff_base=0.5, backoff_max=30.0, max_retry_after=120.0, pool_size=10,
+                 retry_statuses=RETRY_STATUSES, non_idempotent_retry_statuses=NON_IDEMPOTENT_RETRY_STATUSES,
+                 hooks=None, sleep=time.sleep, seed=None,
+                 cache=None, cache_endpoints=CACHEABLE_ENDPOINTS):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retry_after = max_retry_after
+        self.retry_statuses = frozenset(retry_statuses)
+        self.non_idempotent_retry_statuses = frozenset(non_idempotent_retry_statuses)
+        self.hooks = list(hooks or [])
+        self.cache = cache
+        self.cache_endpoints = frozenset(cache_endpoints)
+        self._sleep = sleep
+        self._random = random.Random(seed)
+
+        self.session = requests.Session()
+        # Retries are done here, not by urllib3, so they're jittered and timed
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def add_hook(self, hook):
+        """Call hook(call) after every request; see request() for the fields"""
+        self.hooks.append(hook)
+
+    def backoff(self, attempt, retry_after=None):
+        """Seconds to wait before retry number `attempt` (1-based)"""
+        if retry_after is not None:
+            # The server knows when it'll be ready; request() gives up instead
+            # when that is more than max_retry_after away
+            return retry_after
+        # "Full jitter": anywhere up to the exponential cap, so clients that
+        # failed together don't all come back at the same moment
+        return self._random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+    def request(self, method, endpoint, payload=None, timeout=None):
+        """Send a request, retrying connection errors and retryable statuses
+
+        Returns the final response (which may still be an error status once
+        the retries are used up, or when Retry-After asks for a longer wait
+        than max_retry_after); re-raises the last connection error. Non-
+        idempotent requests are only retried when they never reached the
+        server or got one of non_idempotent_retry_statuses (429/503 by
+        default). Hooks get a dict with endpoint, method, status, attempts,
+        elapsed_ms, retry_wait_ms, error and cached. Never answered from the
+        cache.
+        """
+        url = f"{self.base_url}/{endpoint.lstrip('/')}"
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        retry_statuses = self.retry_statuses if idempotent else self.retry_statuses & self.non_idempotent_retry_statuses
+        started = time.perf_counter()
+        waited = 0.0
+        attempt = 0
+        response = None
+        error = None
+        try:
+            while True:
+                attempt += 1
+                retry_after = None
+                try:
+                    response = self.session.request(method, url, json=payload, timeout=timeout or self.timeout)
+                    error = None
+                    if response.status_code not in retry_statuses:
+                        return response
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                    response = None
+                    error = e
+                    # The backend may have received it and still be running it
+                    if not idempotent and not request_not_sent(e):
+                        raise
+                if attempt > self.max_retries:
+                    if error is not None:
+                        raise error
+                    return response
+                if retry_after is not None and retry_after > self.max_retry_after:
+                    return response
+                delay = self.backoff(attempt, retry_after)
+                self._sleep(delay)
+                waited += delay
+        finally:
+            self._report({
+                "endpoint": endpoint,
+                "method": method,
+                "status": response.status_code if response is not None else None,
+                "attempts": attempt,
+                "elapsed_ms": (time.perf_counter() - started) * 1000,
+                "retry_wait_ms": waited * 1000,
+                "error": str(error) if error is not None else None,
+                "cached": False,
+            })
+
+    def _report(self, call):
+        for hook in self.hooks:
+            hook(call)
+
+    def post(self, endpoint, payload):
+        """POST a JSON payload and return the parsed JSON response, raising APIError on failure
+
+        Cacheable endpoints are answered from the cache when the same payload
+        was sent before.
+        """
+        key = None
+        if self.cache is not None and endpoint.strip("/") in self.cache_endpoints:
+            started = time.perf_counter()
+            key = cache_key(endpoint, payload)
+            body = self.cache.get(key)
+            if body is not None:
+                data = json.loads(body)
+                self._report({
+                    "endpoint": endpoint,
+                    "method": "POST",
+                    "status": 200,
+                    "attempts": 0,
+                    "elapsed_ms": (time.perf_counter() - started) * 1000,
+                    "retry_wait_ms": 0.0,
+                    "error": None,
+                    "cached": True,
+                })
+                return data
+
+        response = self.request("POST", endpoint, payload)
+        if response.status_code != 200:
+            raise APIError(response.status_code, response.text)
+        data = response.json()
+        if key is not None:
+            self.cache.set(key, response.content, endpoint.strip("/"))
+        return data
+
+    def check(self):
+        """GET the backend's root, returning its JSON"""
+        response = self.request("GET", "")
+        if response.status_code != 200:
+            raise APIError(response.status_code, response.text)
+        return response.json()
+
+    def generate_image(self, payload):
+        return self.post("generate_image", payload)
+
+    def initialize_story(self, payload):
+        return self.post("initialize_story", payload)
+
+    def continue_story(self, payload):
+        return self.post("continue_story", payload)
+
+    def generate_text(self, payload):
+        return self.post("generate_text", payload)
@@ -2,6 +2,8 @@ import React, { useState, useEffect, useContext } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { AuthContext } from '../../App';
 
+const CATALOG_FIELDS = 'id,title,category,difficulty,imageUrl,color';
+
 const StoriesExplorer = ({ userData }) => {
   const navigate = useNavigate();
   const { user } = useContext(AuthContext);
@@ -12,57 +14,24 @@ const StoriesExplorer = ({ userData }) => {
   const [userInterests, setUserInterests] = useState([]);
   const [searchQuery, setSearchQuery] = useState('');
 
-  // Mock data for stories - in a real app, this would come from an API
-  const mockStories = [
-    {
-      id: 1,
-      title: "Zari and The Giganto-Pop",
-      category: 'animals',
-      difficulty: 'beginner',
-      imageUrl: '',
-      color: '#8BC34A'
-    },
-    {
-      id: 2,
-      title: "Rymdresan",
-      category: 'space',
-      difficulty: 'intermediate',
-      imageUrl: '',
-      color: '#3F51B5'
-    },
-    {
-      id: 3,
-      title: "Fotbollsmatchen",
-      category: 'sports',
-      difficulty: 'beginner',
-      imageUrl: '',
-      color: '#FF5722'
-    },
-    {
-      id: 4,
-      title: "Musikskolan",
-      category: 'music',
-      difficulty: 'advanced',
-      imageUrl: '',
-      color: '#9C27B0'
-    },
-    {
-      id: 5,
-      title: "Skogsäventyret",
-      category: 'nature',
-      difficulty: 'intermediate',
-      imageUrl: '',
-      color: '#4CAF50'
-    },
-    {
-      id: 6,
-      title: "Vikingaresan",
-      category: 'history',
-      difficulty: 'advanced',
-      imageUrl: '',
-      color: '#795548'
-    }
-  ];
+  // Load the catalog, following nextCursor, with only the fields the cards use
+  const fetchStories = async () => {
+    const loaded = [];
+    let cursor = '';
+    do {
+      const response = await fetch(
+        `http://localhost:5000/api/stories?fields=${CATALOG_FIELDS}&limit=100&cursor=${cursor}`,
+        { credentials: 'include' }
+      );
+      if (!response.ok) {
+        throw new Error(`Failed to fetch stories: ${response.status}`);
+      }
+      const data = await response.json();
+      loaded.push(...data.stories);
+      cursor = data.nextCursor;
+    } while (cursor);
+    return loaded;
+  };
 
   // Load user preferences directly from API
   useEffect(() => {
@@ -106,8 +75,9 @@ const StoriesExplorer = ({ userData }) => {
     };
 
     fetchUserData();
-    // Initialize all stories
-    setStories(mockStories);
+    fetchStories()
+      .then(setStories)
+      .catch(error => console.error("Error fetching stories:", error));
   }, [userData]);
 
   // Filter stories when interests change or tab changes
@@ -116,7 +86,7 @@ const StoriesExplorer = ({ userData }) => {
     
     if (activeTab === 'forYou' && userInterests && userInterests.length > 0) {
       // Filter stories based on user interests
-      const filtered = mockStories.filter(story => 
+      const filtered = stories.filter(story => 
         userInterests.includes(story.category)
       );
       console.log("Filtered stories based on interests:", filtered);
@@ -125,13 +95,13 @@ const StoriesExplorer = ({ userData }) => {
         setFilteredStories(filtered);
       } else {
         console.log("No matching stories found, showing all");
-        setFilteredStories(mockStories);
+        setFilteredStories(stories);
       }
     } else {
       console.log("No user interests found or 'discover' tab active, showing all stories");
-      setFilteredStories(mockStories);
+      setFilteredStories(stories);
     }
-  }, [userInterests, activeTab]);
+  }, [userInterests, activeTab, stories]);
 
   // Function to handle search
   useEffect(() => {
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useCallback, useRef } from 'react';
 import { useNavigate, useParams } from 'react-router-dom';
 import ReadingComponent from './ReadingComponent';
 import FillBlankComponent from './FillBlankComponent';
@@ -6,6 +6,10 @@ import ComprehensionComponent from './ComprehensionComponent';
 import StoryComplete from './StoryComplete';
 import './StoryReader.css';
 
+const API_URL = 'http://localhost:5000';
+// Pages fetched per request
+const PAGE_WINDOW = 3;
+
 const StoryReader = ({ userData, updateUserStats }) => {
   const navigate = useNavigate();
   const { storyId } = useParams();
@@ -14,50 +18,66 @@ const StoryReader = ({ userData, updateUserStats }) => {
   const [mistakes, setMistakes] = useState(0);
   const [startTime, setStartTime] = useState(null);
   const [timeElapsed, setTimeElapsed] = useState(0);
-  const [storyData, setStoryData] = useState(null);
+  // Story summary (title, pageCount, questionCount) and its pages by position;
+  // pages are only fetched as the reader gets close to them
+  const [story, setStory] = useState(null);
+  const [pages, setPages] = useState([]);
+  const [loadError, setLoadError] = useState(null);
+  const requestedWindows = useRef(new Set());
+
+  const fetchPages = useCallback(async (start) => {
+    const requested = requestedWindows.current;
+    if (requested.has(start)) return;
+    requested.add(start);
+
+    try {
+      const response = await fetch(
+        `${API_URL}/api/stories/${storyId}?start=${start}&count=${PAGE_WINDOW}`,
+        { credentials: 'include' }
+      );
+      if (!response.ok) {
+        throw new Error(response.status === 404 ? 'Story not found' : `Failed to load story: ${response.status}`);
+      }
+      const data = await response.json();
+      // Ignore responses for a story the reader has since navigated away from
+      if (requestedWindows.current !== requested) return;
+
+      setStory(data.story);
+      setPages(prev => {
+        const next = prev.slice();
+        data.pages.forEach((page, i) => {
+          next[data.pageStart + i] = page;
+        });
+        return next;
+      });
+    } catch (error) {
+      console.error("Error loading story:", error);
+      requested.delete(start);
+      if (requestedWindows.current === requested) {
+        setLoadError(error.message);
+      }
+    }
+  }, [storyId]);
 
-  // This would normally be fetched from an API based on storyId
   useEffect(() => {
-    // Mock story data
-    const mockStory = {
-      id: 1,
-      title: "Zari and The Giganto-Pop",
-      pages: [
-        {
-          type: "intro",
-          imageUrl: "/stories/zari_cover.png",
-          title: "Zari and The Giganto-Pop"
-        },
-        {
-          type: "reading",
-          imageUrl: "/stories/candy_store.png",
-          text: "Lily is looking at the black and purple gummy hearts."
-        },
-        {
-          type: "fillBlank",
-          imageUrl: "/stories/bathroom.png",
-          text: "First, Oscar ___ water and a little shampoo.",
-          options: ["mix", "mixed"],
-          correctAnswer: "mixed"
-        },
-        {
-          type: "comprehension",
-          imageUrl: "/stories/question.png",
-          question: "What color are the gummy hearts?",
-          options: ["Red and blue", "Black and purple", "Green and yellow"],
-          correctAnswer: "Black and purple"
-        },
-        {
-          type: "reading",
-          imageUrl: "/stories/zari_happy.png",
-          text: "Zari is very happy with her new candy!"
-        }
-      ]
-    };
-
-    setStoryData(mockStory);
+    requestedWindows.current = new Set();
+    setStory(null);
+    setPages([]);
+    setLoadError(null);
+    setCurrentPage(0);
+    fetchPages(0);
     setStartTime(Date.now());
-  }, [storyId]);
+  }, [storyId, fetchPages]);
+
+  // Keep the window being read and the one after it loaded. Windows are
+  // aligned to PAGE_WINDOW so every reader asks for the same (cacheable) URLs.
+  useEffect(() => {
+    if (!story) return;
+    const windowStart = Math.floor(currentPage / PAGE_WINDOW) * PAGE_WINDOW;
+    [windowStart, windowStart + PAGE_WINDOW].forEach(start => {
+      if (start < story.pageCount) fetchPages(start);
+    });
+  }, [story, currentPage, fetchPages]);
 
   const handleNext = (isCorrect = true) => {
     if (!isCorrect) {
@@ -66,7 +86,7 @@ const StoryReader = ({ userData, updateUserStats }) => {
       setScore(prev => prev + 1);
     }
 
-    if (storyData && currentPage >= storyData.pages.length - 1) {
+    if (story && currentPage >= story.pageCount - 1) {
       // Story completed - calculate final time
       const endTime = Date.now();
       const totalTime = Math.floor((endTime - startTime) / 1000);
@@ -135,13 +155,15 @@ const StoryReader = ({ userData, updateUserStats }) => {
   };
 
   const renderCurrentPage = () => {
-    if (!storyData) return <div className="loading-container">Loading...</div>;
+    if (loadError && !story) return <div className="loading-container">{loadError}</div>;
+    if (!story) return <div className="loading-container">Loading...</div>;
+    if (story.pageCount === 0) {
+      return <div className="loading-container">This story isn't available yet.</div>;
+    }
 
     // Check if we've reached the end
-    if (currentPage >= storyData.pages.length) {
-      const totalQuestions = storyData.pages.filter(
-        page => page.type === 'fillBlank' || page.type === 'comprehension'
-      ).length;
+    if (currentPage >= story.pageCount) {
+      const totalQuestions = story.questionCount;
       
       const accuracy = totalQuestions > 0 
         ? Math.round((totalQuestions - mistakes) / totalQuestions * 100) 
@@ -157,7 +179,10 @@ const StoryReader = ({ userData, updateUserStats }) => {
       );
     }
 
-    const page = storyData.pages[currentPage];
+    const page = pages[currentPage];
+    if (!page) {
+      return <div className="loading-container">{loadError || 'Loading...'}</div>;
+    }
 
     switch (page.type) {
       case 'intro':
@@ -222,11 +247,11 @@ const StoryReader = ({ userData, updateUserStats }) => {
           ×
         </button>
         <div className="progress-bar">
-          {storyData && (
+          {story && story.pageCount > 0 && (
             <div 
               className="progress-fill" 
               style={{ 
-                width: `${(currentPage / storyData.pages.length) * 100}%` 
+                width: `${(currentPage / story.pageCount) * 100}%` 
               }}
             ></div>
           )}
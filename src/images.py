@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Saving generated images and producing resized variants for the story reader
+
+save_base64_image() writes the backend's base64 image straight to disk when
+the file extension matches the image's actual format: the base64 text is
+decoded a chunk at a time into the file, so the image is never held in
+memory a second time nor decoded and re-encoded by Pillow. Only when the
+extension asks for a different format does it fall back to converting.
+
+build_variants() turns a batch of images into downsized WebP (and AVIF, when
+the optional pillow-avif-plugin from requirements_optional.txt is installed)
+copies on a process pool, one image per task, so hundreds of illustrations
+use every core.
+"""
+import base64
+import concurrent.futures
+import io
+import os
+
+from PIL import Image
+
+try:
+    import pillow_avif  # noqa: F401 - registers the AVIF plugin with Pillow
+except ImportError:  # optional dependency
+    pass
+
+# Base64 characters decoded per chunk; a multiple of 4 so chunks decode on their own
+CHUNK_CHARS = 64 * 1024
+
+DEFAULT_SIZES = (256, 512, 1024)
+DEFAULT_FORMATS = ("webp",)
+
+# Leading bytes -> (Pillow format, file extension)
+_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", ("PNG", ".png")),
+    (b"\xff\xd8\xff", ("JPEG", ".jpg")),
+    (b"GIF87a", ("GIF", ".gif")),
+    (b"GIF89a", ("GIF", ".gif")),
+)
+
+_EXTENSION_FORMATS = {
+    ".png": "PNG",
+    ".jpg": "JPEG",
+    ".jpeg": "JPEG",
+    ".gif": "GIF",
+    ".webp": "WEBP",
+    ".avif": "AVIF",
+}
+
+# Encoder settings for the variants
+_SAVE_OPTIONS = {
+    "WEBP": {"quality": 80, "method": 4},
+    "AVIF": {"quality": 60},
+}
+
+
+def _strip_data_url(base64_string):
+    """Drop a 'data:image/png;base64,' prefix, if any"""
+    if base64_string.startswith("data:"):
+        return base64_string.partition(",")[2]
+    return base64_string
+
+
+def detect_format(base64_string):
+    """Return (Pillow format, extension) of a base64 image from its first bytes, or (None, None)"""
+    head = base64.b64decode(_strip_data_url(base64_string)[:16])
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "WEBP", ".webp"
+    for signature, result in _SIGNATURES:
+        if head.startswith(signature):
+            return result
+    return None, None
+
+
+def save_base64_image(base64_string, output_path):
+    """Save a base64 encoded image to output_path
+
+    Returns True when the bytes were written as is, False when the image had
+    to be converted to the format the extension asks for.
+    """
+    base64_string = _strip_data_url(base64_string)
+    image_format, _ = detect_format(base64_string)
+    wanted = _EXTENSION_FORMATS.get(os.path.splitext(output_path)[1].lower())
+
+    # Chunks only decode independently when the base64 isn't line-wrapped
+    wrapped = any(c in base64_string for c in "\r\n ")
+    if image_format is not None and wanted == image_format and not wrapped:
+        temp_path = output_path + ".tmp"
+        with open(temp_path, "wb") as f:
+            for start in range(0, len(base64_string), CHUNK_CHARS):
+                f.write(base64.b64decode(base64_string[start:start + CHUNK_CHARS]))
+        os.replace(temp_path, output_path)
+        return True
+
+    # Different format asked for (or line-wrapped base64): decode and convert
+    with Image.open(io.BytesIO(base64.b64decode(base64_string))) as image:
+        if wanted == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.save(output_path)
+    return False
+
+
+def supported_formats(formats):
+    """The subset of variant formats this Pillow build can write"""
+    Image.init()
+    return [fmt for fmt in formats if fmt.upper() in Image.SAVE]
+
+
+def make_variants(image_path, output_dir, sizes=DEFAULT_SIZES, formats=DEFAULT_FORMATS):
+    """Write `<name>_<size>.<format>` copies of one image, at most size px on the longer side
+
+    Sizes the image is already no larger than are skipped (never upscaled).
+    The largest variant is resized from the original and each smaller one
+    from the previous, which is cheaper than going back to the full image
+    every time. Returns the paths written.
+    """
+    name = os.path.splitext(os.path.basename(image_path))[0]
+    written = []
+    with Image.open(image_path) as image:
+        largest = max(sizes)
+        # JPEGs can be decoded at a reduced scale straight away
+        image.draft("RGB", (largest, largest))
+        current = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+
+    for size in sorted(sizes, reverse=True):
+        if max(current.size) <= size:
+            continue
+        current = current.copy()
+        current.thumbnail((size, size), Image.LANCZOS)
+        for fmt in formats:
+            path = os.path.join(output_dir, f"{name}_{size}.{fmt.lower()}")
+            current.save(path, fmt.upper(), **_SAVE_OPTIONS.get(fmt.upper(), {}))
+            written.append(path)
+    return written
+
+
+def _variants_task(task):
+    image_path, output_dir, sizes, formats = task
+    try:
+        return image_path, make_variants(image_path, output_dir, sizes, formats), None
+    except Exception as e:  # reported per image, the rest of the batch carries on
+        return image_path, [], f"{type(e).__name__}: {e}"
+
+
+def build_variants(image_paths, output_dir, sizes=DEFAULT_SIZES, formats=DEFAULT_FORMATS, workers=None):
+    """Make variants of many images on a process pool
+
+    Returns [(image_path, written paths, error or None)] in input order.
+    Formats this Pillow can't write (e.g. AVIF without a plugin) are skipped.
+    """
+    formats = supported_formats(formats)
+    os.makedirs(output_dir, exist_ok=True)
+    tasks = [(path, output_dir, tuple(sizes), tuple(formats)) for path in image_paths]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) <= 1:
+        return [_variants_task(task) for task in tasks]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_variants_task, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Content-addressed on-disk cache for story backend responses
+
+A response is stored under the SHA-256 of the canonical JSON of its endpoint
+and payload (sorted keys, no whitespace), so the same request made from any
+process or machine maps to the same file:
+
+    <directory>/ab/cd/abcd1234....json
+
+The two directory levels keep any one directory small. Each file holds one
+header line ({"created": ..., "endpoint": ...}) followed by the response body
+exactly as the backend sent it. Files are written to a temporary name and
+renamed into place, so concurrent writers and readers never see a partial
+entry.
+
+Eviction is least-recently-used by total size: a hit touches the file's
+mtime, and when the cache grows past max_bytes the oldest files are deleted
+until it's back under 90% of the limit. Entries older than `ttl` seconds
+(if set) count as misses and are removed.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+DEFAULT_CACHE_DIR = os.environ.get('API_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'rangerz_api'))
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+# Evict down to this fraction of max_bytes, so eviction doesn't run on every write
+EVICT_TO = 0.9
+
+
+def canonical_json(value):
+    """Serialize value the same way regardless of key order or formatting"""
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+
+def cache_key(endpoint, payload):
+    """SHA-256 hex digest identifying a request"""
+    request = {'endpoint': endpoint.strip('/'), 'payload': payload}
+    return hashlib.sha256(canonical_json(request).encode('utf-8')).hexdigest()
+
+
+class DiskCache:
+    """Size-bounded, optionally expiring response cache in a directory"""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, ttl=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # Computed on the first write; other processes' writes are picked up
+        # whenever eviction rescans the directory
+        self._total_bytes = None
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key[2:4], key + '.json')
+
+    def get(self, key):
+        """Return the cached body bytes for key, or None"""
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                header_line = f.readline()
+                body = f.read()
+            header = json.loads(header_line)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        if self.ttl is not None and time.time() - header.get('created', 0) > self.ttl:
+            if self._remove(path):
+                with self._lock:
+                    if self._total_bytes is not None:
+                        self._total_bytes = max(0, self._total_bytes - len(header_line) - len(body))
+            self.misses += 1
+            return None
+
+        try:
+            # Recently used, for LRU eviction
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return body
+
+    def set(self, key, body, endpoint=''):
+        """Store body bytes under key"""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        header = json.dumps({'created': time.time(), 'endpoint': endpoint}).encode('utf-8') + b'\n'
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(header)
+                f.write(body)
+            # Overwriting an entry replaces its bytes rather than adding to them
+            try:
+                replaced = os.stat(path).st_size
+            except OSError:
+                replaced = 0
+            os.replace(temp_path, path)
+        except BaseException:
+            self._remove(temp_path)
+            raise
+        self.writes += 1
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, _, size in self._entries())
+            else:
+                self._total_bytes += len(header) + len(body) - replaced
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        """(mtime, path, size) for every cache file"""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, path, stat.st_size))
+        return entries
+
+    def _evict(self):
+        """Delete least recently used files until under EVICT_TO * max_bytes (caller holds the lock)"""
+        entries = sorted(self._entries())
+        total = sum(size for _, _, size in entries)
+        target = self.max_bytes * EVICT_TO
+        for _, path, size in entries:
+            if total <= target:
+                break
+            if self._remove(path):
+                total -= size
+                self.evictions += 1
+        self._total_bytes = total
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def clear(self):
+        """Delete every entry"""
+        with self._lock:
+            for _, path, _ in self._entries():
+                self._remove(path)
+            self._total_bytes = 0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'writes': self.writes,
+            'evictions': self.evictions,
+            'bytes': self._total_bytes,
+        }
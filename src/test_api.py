@@ -1,38 +1,94 @@
 #!/usr/bin/env python3
 import argparse
+import asyncio
+import concurrent.futures
+import math
 import requests
 import json
-import base64
-from PIL import Image
-import io
 import os
+import re
+import time
 
-def save_image(base64_string, output_path):
+import images
+from api_client import DEFAULT_BASE_URL, APIError, StoryAPIClient
+from response_cache import DEFAULT_CACHE_DIR, DiskCache
+
+# Endpoints the batch command can call, all POST with a JSON payload
+BATCH_ENDPOINTS = ("initialize_story", "continue_story", "generate_text", "generate_image")
+
+def save_image(base64_string, output_path, quiet=False):
     """Save a base64 encoded image to a file"""
-    image_data = base64.b64decode(base64_string)
-    image = Image.open(io.BytesIO(image_data))
-    image.save(output_path)
-    print(f"Image saved to {output_path}")
+    as_is = images.save_base64_image(base64_string, output_path)
+    if not quiet:
+        print(f"Image saved to {output_path}" + ("" if as_is else " (converted)"))
+
+def parse_sizes(text):
+    """Parse '256,512,1024' into [256, 512, 1024]"""
+    return [int(size) for size in text.split(",") if size.strip()]
+
+def make_thumbnails(paths, output_dir, sizes, formats, workers=None):
+    """Build resized variants of images on a process pool and report the result"""
+    usable = images.supported_formats(formats)
+    for fmt in formats:
+        if fmt not in usable:
+            print(f"Skipping {fmt}: this Pillow build can't write it")
+    if not usable:
+        return []
+    started = time.perf_counter()
+    results = images.build_variants(paths, output_dir, sizes, usable, workers)
+    written = sum(len(variants) for _, variants, _ in results)
+    for path, _, error in results:
+        if error:
+            print(f"Error making variants of {path}: {error}")
+    print(f"Wrote {written} variants of {len(paths)} images to {output_dir} "
+          f"in {time.perf_counter() - started:.2f}s")
+    return results
+
+def make_client(args, pool_size=1):
+    """A StoryAPIClient configured from the command line options"""
+    cache = None
+    if not args.no_cache:
+        cache = DiskCache(args.cache_dir, max_bytes=args.cache_max_mb * 1024 * 1024, ttl=args.cache_ttl)
+    return StoryAPIClient(args.base_url, connect_timeout=args.connect_timeout, read_timeout=args.timeout,
+                          max_retries=args.retries, pool_size=pool_size, cache=cache)
+
+def call_endpoint(args, endpoint, payload):
+    """POST payload to an endpoint; print the error and return None if it fails"""
+    with make_client(args) as client:
+        try:
+            return client.post(endpoint, payload)
+        except APIError as e:
+            print(f"Error: {e.status_code}")
+            print(e.text)
+        except requests.exceptions.RequestException as e:
+            print(f"Error connecting to API: {e}")
+    return None
+
+def write_response(data, output):
+    """Save a JSON response to output, or print it"""
+    if output:
+        with open(output, 'w') as f:
+            json.dump(data, f, indent=2)
+        print(f"Response saved to {output}")
+    else:
+        print(json.dumps(data, indent=2))
 
 def generate_image(args):
     """Call the generate_image endpoint"""
-    url = f"{args.base_url}/generate_image"
     payload = {"description": args.description}
     
-    response = requests.post(url, json=payload)
-    if response.status_code == 200:
-        data = response.json()
+    data = call_endpoint(args, "generate_image", payload)
+    if data is not None:
         if args.output:
             save_image(data["image_base64"], args.output)
+            if args.thumbnails:
+                make_thumbnails([args.output], args.thumbnail_dir or os.path.dirname(args.output) or ".",
+                                parse_sizes(args.thumbnails), args.thumbnail_formats.split(","), workers=1)
         else:
             print(json.dumps(data, indent=2))
-    else:
-        print(f"Error: {response.status_code}")
-        print(response.text)
 
 def initialize_story(args):
     """Call the initialize_story endpoint"""
-    url = f"{args.base_url}/initialize_story"
     payload = {
         "name": args.name,
         "age": args.age,
@@ -41,22 +97,12 @@ def initialize_story(args):
         "model": args.model
     }
     
-    response = requests.post(url, json=payload)
-    if response.status_code == 200:
-        data = response.json()
-        if args.output:
-            with open(args.output, 'w') as f:
-                json.dump(data, f, indent=2)
-            print(f"Response saved to {args.output}")
-        else:
-            print(json.dumps(data, indent=2))
-    else:
-        print(f"Error: {response.status_code}")
-        print(response.text)
+    data = call_endpoint(args, "initialize_story", payload)
+    if data is not None:
+        write_response(data, args.output)
 
 def continue_story(args):
     """Call the continue_story endpoint"""
-    url = f"{args.base_url}/continue_story"
     payload = {
         "name": args.name,
         "age": args.age,
@@ -73,59 +119,221 @@ def continue_story(args):
         "model": args.model
     }
     
-    response = requests.post(url, json=payload)
-    if response.status_code == 200:
-        data = response.json()
-        if args.output:
-            with open(args.output, 'w') as f:
-                json.dump(data, f, indent=2)
-            print(f"Response saved to {args.output}")
-        else:
-            print(json.dumps(data, indent=2))
-    else:
-        print(f"Error: {response.status_code}")
-        print(response.text)
+    data = call_endpoint(args, "continue_story", payload)
+    if data is not None:
+        write_response(data, args.output)
 
 def generate_text(args):
     """Call the generate_text endpoint"""
-    url = f"{args.base_url}/generate_text"
     payload = {
         "prompt": args.prompt,
         "model": args.model
     }
     
-    response = requests.post(url, json=payload)
-    if response.status_code == 200:
-        data = response.json()
-        if args.output:
-            with open(args.output, 'w') as f:
-                json.dump(data, f, indent=2)
-            print(f"Response saved to {args.output}")
-        else:
-            print(json.dumps(data, indent=2))
-    else:
-        print(f"Error: {response.status_code}")
-        print(response.text)
+    data = call_endpoint(args, "generate_text", payload)
+    if data is not None:
+        write_response(data, args.output)
 
 def check_api(args):
     """Check if the API is running"""
-    url = f"{args.base_url}/"
-    
-    try:
-        response = requests.get(url)
-        if response.status_code == 200:
+    with make_client(args) as client:
+        try:
+            data = client.check()
             print("API is running!")
-            print(response.json())
-        else:
-            print(f"API returned status code: {response.status_code}")
-            print(response.text)
-    except requests.exceptions.RequestException as e:
-        print(f"Error connecting to API: {e}")
+            print(data)
+        except APIError as e:
+            print(f"API returned status code: {e.status_code}")
+            print(e.text)
+        except requests.exceptions.RequestException as e:
+            print(f"Error connecting to API: {e}")
+
+def read_batch(path):
+    """Read a batch file: one {"endpoint": ..., "payload": {...}, "id": optional} object per line"""
+    jobs = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            job = json.loads(line)
+            endpoint = job.get("endpoint", "").strip("/")
+            if endpoint not in BATCH_ENDPOINTS:
+                raise ValueError(f"Line {line_number}: unknown endpoint {job.get('endpoint')!r} "
+                                 f"(expected one of {', '.join(BATCH_ENDPOINTS)})")
+            jobs.append({"line": line_number, "id": job.get("id"), "endpoint": endpoint,
+                         "payload": job.get("payload", {})})
+    return jobs
+
+def run_job(client, job):
+    """POST one batch job and return its result record"""
+    result = {"line": job["line"], "id": job["id"], "endpoint": job["endpoint"]}
+    started = time.perf_counter()
+    try:
+        result["response"] = client.post(job["endpoint"], job["payload"])
+        result["status"] = 200
+    except APIError as e:
+        result["status"] = e.status_code
+        result["error"] = e.text
+    except (requests.exceptions.RequestException, ValueError) as e:
+        result["status"] = None
+        result["error"] = str(e)
+    result["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+def iter_results_threaded(client, jobs, concurrency):
+    """Run jobs on a bounded thread pool, yielding results in input order"""
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        yield from executor.map(lambda job: run_job(client, job), jobs)
+
+def iter_results_asyncio(client, jobs, concurrency):
+    """Run jobs from an event loop with at most `concurrency` in flight, yielding results in input order
+
+    requests is blocking, so each call runs on the loop's executor; the
+    semaphore is what bounds the number in flight.
+    """
+    async def run_all(emit):
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(concurrency)
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency)
+
+        async def run_one(job):
+            async with semaphore:
+                return await loop.run_in_executor(executor, run_job, client, job)
+
+        try:
+            tasks = [asyncio.ensure_future(run_one(job)) for job in jobs]
+            for task in tasks:
+                emit(await task)
+        finally:
+            executor.shutdown(wait=False)
+
+    results = []
+    asyncio.run(run_all(results.append))
+    return results
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def summarize_batch(results, elapsed):
+    """Throughput and per-endpoint latency percentiles for a finished batch"""
+    endpoints = {}
+    for result in results:
+        stats = endpoints.setdefault(result["endpoint"], {"latencies": [], "errors": 0})
+        stats["latencies"].append(result["latency_ms"])
+        if result.get("status") != 200 or result.get("error"):
+            stats["errors"] += 1
+
+    summary = {
+        "requests": len(results),
+        "errors": sum(stats["errors"] for stats in endpoints.values()),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(results) / elapsed, 2) if elapsed > 0 else 0.0,
+        "endpoints": {},
+    }
+    for endpoint, stats in sorted(endpoints.items()):
+        latencies = sorted(stats["latencies"])
+        summary["endpoints"][endpoint] = {
+            "requests": len(latencies),
+            "errors": stats["errors"],
+            "p50_ms": percentile(latencies, 0.50),
+            "p90_ms": percentile(latencies, 0.90),
+            "p99_ms": percentile(latencies, 0.99),
+            "max_ms": latencies[-1],
+        }
+    return summary
+
+def image_file_stem(result):
+    """A file name for a result's image: its id with anything but [A-Za-z0-9._-] replaced
+
+    Ids come from the jobs file, so they must not be able to name a path
+    outside the image directory.
+    """
+    name = re.sub(r"[^A-Za-z0-9._-]", "_", str(result["id"] or ""))
+    return name if name.strip(".") else f"line-{result['line']}"
+
+def save_batch_image(result, image_dir):
+    """Move a result's image into its own file, recording a failure in the result instead of raising
+
+    Keeps the JSONL small; the image is saved in whatever format it came in
+    so it's written without decoding. An image that can't be saved stays in
+    the JSONL, so it isn't lost.
+    """
+    response = result["response"]
+    image_base64 = response["image_base64"]
+    try:
+        extension = images.detect_format(image_base64)[1] or ".png"
+        image_path = os.path.join(image_dir, f"{image_file_stem(result)}{extension}")
+        save_image(image_base64, image_path, quiet=True)
+    except (ValueError, OSError) as e:  # bad base64, not an image, or disk trouble
+        result["error"] = f"Could not save image: {type(e).__name__}: {e}"
+        return
+    del response["image_base64"]
+    response["image_path"] = image_path
+
+def run_batch(client, jobs, output_path, concurrency=8, mode="thread", image_dir=None):
+    """Run every job concurrently and write the results to output_path as JSONL, in input order
+
+    The client's pool_size should be at least `concurrency`. Returns the
+    summary from summarize_batch.
+    """
+    if image_dir:
+        os.makedirs(image_dir, exist_ok=True)
+    runner = iter_results_asyncio if mode == "asyncio" else iter_results_threaded
+
+    results = []
+    started = time.perf_counter()
+    with open(output_path, "w") as out:
+        for result in runner(client, jobs, concurrency):
+            response = result.get("response")
+            if image_dir and isinstance(response, dict) and "image_base64" in response:
+                save_batch_image(result, image_dir)
+            out.write(json.dumps(result) + "\n")
+            results.append(result)
+    elapsed = time.perf_counter() - started
+    return summarize_batch(results, elapsed)
+
+def print_batch_summary(summary):
+    print(f"{summary['requests']} requests in {summary['elapsed_s']:.2f}s "
+          f"({summary['throughput_rps']:.2f} req/s), {summary['errors']} errors")
+    print(f"{'endpoint':<20} {'requests':>8} {'errors':>6} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for endpoint, stats in summary["endpoints"].items():
+        print(f"{endpoint:<20} {stats['requests']:>8} {stats['errors']:>6} {stats['p50_ms']:>9.1f} "
+              f"{stats['p90_ms']:>9.1f} {stats['p99_ms']:>9.1f} {stats['max_ms']:>9.1f}")
+
+def batch(args):
+    """Run a JSONL file of payloads concurrently"""
+    jobs = read_batch(args.input)
+    print(f"Running {len(jobs)} requests, {args.concurrency} in flight ({args.mode})...")
+    with make_client(args, pool_size=args.concurrency) as client:
+        summary = run_batch(client, jobs, args.output, args.concurrency, args.mode, args.image_dir)
+    print(f"Results written to {args.output}")
+    print_batch_summary(summary)
+    if args.image_dir and args.thumbnails:
+        with open(args.output) as f:
+            paths = [path for path in (json.loads(line).get("response", {}).get("image_path") for line in f) if path]
+        make_thumbnails(paths, args.thumbnail_dir or os.path.join(args.image_dir, "variants"),
+                        parse_sizes(args.thumbnails), args.thumbnail_formats.split(","), args.workers)
+
+def thumbnails(args):
+    """Make resized variants of existing images"""
+    make_thumbnails(args.images, args.output_dir, parse_sizes(args.sizes), args.formats.split(","), args.workers)
 
 def main():
     parser = argparse.ArgumentParser(description="Test the Rangerz API endpoints")
-    parser.add_argument("--base-url", default="https://rangerz-backend-331294271019.europe-north2.run.app/", 
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL, 
                         help="Base URL for the API (default: http://localhost:8080)")
+    parser.add_argument("--timeout", default=120, type=float, help="Read timeout per request in seconds")
+    parser.add_argument("--connect-timeout", default=5, type=float, help="Connect timeout in seconds")
+    parser.add_argument("--retries", default=4, type=int,
+                        help="Retries for connection errors and 429/503 responses (502/504 too for GETs)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Always call the backend, without reading or writing the response cache")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Response cache directory")
+    parser.add_argument("--cache-max-mb", default=1024, type=int, help="Response cache size limit in MB")
+    parser.add_argument("--cache-ttl", type=float, help="Seconds before a cached response expires (default: never)")
     
     subparsers = parser.add_subparsers(dest="command", help="Command to run")
     
@@ -138,6 +346,9 @@ def main():
     image_parser.add_argument("--description", required=True, 
                              help="Description for the image to generate")
     image_parser.add_argument("--output", help="Output file path for the image")
+    image_parser.add_argument("--thumbnails", help="Also write variants at these sizes, e.g. 256,512,1024")
+    image_parser.add_argument("--thumbnail-formats", default="webp", help="Comma-separated variant formats (webp, avif)")
+    image_parser.add_argument("--thumbnail-dir", help="Directory for the variants (default: next to --output)")
     image_parser.set_defaults(func=generate_image)
     
     # Initialize Story parser
@@ -194,6 +405,30 @@ def main():
     text_parser.add_argument("--output", help="Output file path for the response")
     text_parser.set_defaults(func=generate_text)
     
+    # Batch parser
+    batch_parser = subparsers.add_parser("batch", help="Run a JSONL file of requests concurrently")
+    batch_parser.add_argument("input", help='JSONL file, one {"endpoint": ..., "payload": {...}} per line')
+    batch_parser.add_argument("--output", default="batch_results.jsonl",
+                             help="JSONL file for the results, in input order")
+    batch_parser.add_argument("--concurrency", default=8, type=int, help="Maximum requests in flight")
+    batch_parser.add_argument("--mode", default="thread", choices=["thread", "asyncio"],
+                             help="Run requests on a thread pool or from an asyncio event loop")
+    batch_parser.add_argument("--image-dir", help="Save generated images here instead of inlining them in the results")
+    batch_parser.add_argument("--thumbnails", help="With --image-dir, also write variants at these sizes, e.g. 256,512,1024")
+    batch_parser.add_argument("--thumbnail-formats", default="webp", help="Comma-separated variant formats (webp, avif)")
+    batch_parser.add_argument("--thumbnail-dir", help="Directory for the variants (default: <image-dir>/variants)")
+    batch_parser.add_argument("--workers", type=int, help="Processes for the variants (default: one per core)")
+    batch_parser.set_defaults(func=batch)
+    
+    # Thumbnails parser
+    thumbs_parser = subparsers.add_parser("thumbnails", help="Make resized variants of images on every core")
+    thumbs_parser.add_argument("images", nargs="+", help="Image files")
+    thumbs_parser.add_argument("--output-dir", default="variants", help="Directory for the variants")
+    thumbs_parser.add_argument("--sizes", default="256,512,1024", help="Longest side of each variant in px")
+    thumbs_parser.add_argument("--formats", default="webp", help="Comma-separated variant formats (webp, avif)")
+    thumbs_parser.add_argument("--workers", type=int, help="Processes to use (default: one per core)")
+    thumbs_parser.set_defaults(func=thumbnails)
+    
     args = parser.parse_args()
     
     if not args.command:
@@ -63,6 +63,21 @@ if [ "$1" == "test" ]; then
     exit $exit_code
 fi
 
+# Production backend: multi-process gunicorn (see gunicorn.conf.py)
+if [ "$1" == "prod" ]; then
+    if [ ! -d "venv" ]; then
+        echo "Creating Python virtual environment..."
+        python3 -m venv venv
+    fi
+    source venv/bin/activate
+    pip install -r requirements_backend.txt
+    
+    # Don't run the dev cleanup trap; gunicorn handles its own signals
+    trap - SIGINT SIGTERM EXIT
+    echo "Starting production backend..."
+    exec gunicorn -c gunicorn.conf.py wsgi:app
+fi
+
 # Regular app startup
 # Check if port 5000 is already in use
 PORT_PID=$(lsof -ti:5000 2>/dev/null)
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Story catalog served by /api/stories and /api/stories/<id>
+
+Stories live in the stories/story_pages tables (migration 5). Each story's
+summary and each of its pages is stored already serialized, so a response is
+assembled by joining those strings; nothing is parsed or re-encoded unless a
+client asks for a subset of the summary fields. Assembled bodies are kept in a
+bounded LRU cache with a TTL (lru_cache.LRUCache), so a story edited by
+another process shows up once its entry expires; edits made through this
+process should call invalidate().
+
+The list is paged by story id: `nextCursor` is opaque to clients and is passed
+back as `cursor` for the next page. A story is returned a window of pages at a
+time (`start`, `count`), so the reader only downloads what it's about to show.
+
+ETags are a hash of the body rather than a per-process version number, so
+every worker hands out the same ETag for the same content and a client can
+revalidate against any of them.
+
+Stories can be added or updated from a JSON file holding a list of stories
+(each with its pages, shaped like the seed stories in migration 5):
+
+    python story_catalog.py import stories.json [--db users.db]
+"""
+import argparse
+import sqlite3
+import sys
+
+import fast_json
+import queries
+from lru_cache import CachedResponse, LRUCache
+
+# Fields of a catalog entry that `fields=` may select
+LIST_FIELDS = ('id', 'title', 'category', 'difficulty', 'imageUrl', 'color', 'pageCount', 'questionCount')
+
+DEFAULT_LIST_LIMIT = 20
+MAX_LIST_LIMIT = 100
+DEFAULT_PAGE_WINDOW = 3
+MAX_PAGE_WINDOW = 20
+
+class CatalogQueryError(ValueError):
+    """A catalog request with invalid parameters"""
+
+
+def _int_arg(args, name, default, minimum, maximum=None):
+    value = args.get(name)
+    if value is None or value == '':
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise CatalogQueryError(f'{name} must be an integer') from None
+    if value < minimum or (maximum is not None and value > maximum):
+        bounds = f'between {minimum} and {maximum}' if maximum is not None else f'at least {minimum}'
+        raise CatalogQueryError(f'{name} must be {bounds}')
+    return value
+
+
+def parse_list_args(args):
+    """Turn /api/stories query arguments into StoryCatalog.list_stories() keyword arguments"""
+    fields = args.get('fields')
+    if fields:
+        fields = tuple(field.strip() for field in fields.split(',') if field.strip())
+        unknown = [field for field in fields if field not in LIST_FIELDS]
+        if unknown:
+            raise CatalogQueryError(f"Unknown fields: {', '.join(unknown)}")
+    return {
+        'after': _int_arg(args, 'cursor', 0, 0),
+        'limit': _int_arg(args, 'limit', DEFAULT_LIST_LIMIT, 1, MAX_LIST_LIMIT),
+        'category': args.get('category') or None,
+        'fields': fields or None,
+    }
+
+
+def parse_page_args(args):
+    """Turn /api/stories/<id> query arguments into StoryCatalog.story() keyword arguments"""
+    return {
+        'start': _int_arg(args, 'start', 0, 0),
+        'count': _int_arg(args, 'count', DEFAULT_PAGE_WINDOW, 1, MAX_PAGE_WINDOW),
+    }
+
+
+class StoryCatalog:
+    """Assembles and caches story catalog responses"""
+
+    def __init__(self, get_pool, cache_size=1000, ttl=300.0):
+        self.get_pool = get_pool
+        self.cache = LRUCache(max_size=cache_size, ttl=ttl)
+
+    def list_stories(self, after=0, limit=DEFAULT_LIST_LIMIT, category=None, fields=None):
+        """Return the CachedResponse for one page of catalog entries with id > after"""
+        key = ('list', after, limit, category, fields)
+        entry = self.cache.get(key)
+        if entry is not None:
+            return entry
+
+        # One extra row says whether there is a next page
+        with self.get_pool().connection() as conn:
+            rows = queries.story_list_rows(conn, after, limit + 1, category)
+        next_cursor = str(rows[limit - 1][0]) if len(rows) > limit else None
+        summaries = [summary for _, summary in rows[:limit]]
+        if fields is not None:
+            summaries = [fast_json.dumps({field: data[field] for field in fields})
+                         for data in map(fast_json.loads, summaries)]
+
+        body = (f'{{"status":"success","stories":[{",".join(summaries)}],'
+                f'"nextCursor":{fast_json.dumps(next_cursor)}}}\n')
+        entry = CachedResponse(None, body.encode('utf-8'))
+        self.cache.set(key, entry)
+        return entry
+
+    def story(self, story_id, start=0, count=DEFAULT_PAGE_WINDOW):
+        """Return the CachedResponse for a story's summary and pages [start, start + count), or None"""
+        key = ('story', story_id, start, count)
+        entry = self.cache.get(key)
+        if entry is not None:
+            return entry
+
+        with self.get_pool().connection() as conn:
+            found = queries.fetch_story_pages(conn, story_id, start, count)
+        if found is None:
+            return None
+        summary, page_count, pages = found
+        next_page = start + len(pages) if start + len(pages) < page_count else None
+
+        body = (f'{{"status":"success","story":{summary},"pageStart":{start},'
+                f'"pages":[{",".join(pages)}],"nextPage":{fast_json.dumps(next_page)}}}\n')
+        entry = CachedResponse(None, body.encode('utf-8'))
+        self.cache.set(key, entry)
+        return entry
+
+    def invalidate(self):
+        """Forget every assembled response after stories changed"""
+        self.cache.clear()
+
+    def stats(self):
+        return self.cache.stats()
+
+
+def import_stories(conn, stories):
+    """Insert or update stories (dicts with their pages) in one transaction"""
+    try:
+        for story in stories:
+            queries.save_story(conn, story)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return len(stories)
+
+
+def main():
+    from db import DEFAULT_DB_PATH
+    from migrations import migrate
+
+    parser = argparse.ArgumentParser(description='Manage the story catalog')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    import_parser = subparsers.add_parser('import', help='Add or update stories from a JSON file')
+    import_parser.add_argument('input', help='JSON file with a list of stories')
+    import_parser.add_argument('--db', default=DEFAULT_DB_PATH, help='Database file (default: users.db)')
+    args = parser.parse_args()
+
+    with open(args.input, encoding='utf-8') as f:
+        stories = fast_json.loads(f.read())
+    if not isinstance(stories, list):
+        print('Error: the file must contain a list of stories', file=sys.stderr)
+        return 1
+
+    conn = sqlite3.connect(args.db)
+    try:
+        migrate(conn)
+        count = import_stories(conn, stories)
+    except (KeyError, sqlite3.Error) as e:
+        print(f'Error: {type(e).__name__}: {e}', file=sys.stderr)
+        return 1
+    finally:
+        conn.close()
+    print(f'Imported {count} stories into {args.db}')
+    print('Running servers pick the changes up once their cached responses expire')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
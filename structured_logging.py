@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Buffered, structured logging for server.py
+
+Request threads never write to stdout themselves: records go onto a bounded
+in-memory queue and a background listener thread formats and writes them.
+When the queue is full, records are dropped (and counted) rather than making
+a request wait on log I/O.
+
+- JSON output (one object per line, extra= fields included) or plain text
+- Per-route levels, e.g. LOG_ROUTE_LEVELS="/api/auth/user=WARNING", so a
+  chatty route can be quietened (or one route debugged) on its own
+- DEBUG records are sampled: only 1 in `sample_every` per call site is kept
+"""
+import atexit
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+
+from flask import has_request_context, request
+
+# Attributes every LogRecord has; anything else was passed via extra=
+_STANDARD_ATTRS = set(logging.LogRecord('', 0, '', 0, '', (), None).__dict__) | {'message', 'asctime', 'route'}
+
+
+def parse_route_levels(text):
+    """Parse '/api/auth/user=WARNING,/api/auth/google=DEBUG' into {route: level number}"""
+    levels = {}
+    for part in (text or '').split(','):
+        route, _, level = part.strip().partition('=')
+        if not route:
+            continue
+        number = logging.getLevelName(level.strip().upper())
+        if not isinstance(number, int):
+            raise ValueError(f"Unknown log level for {route}: {level}")
+        levels[route] = number
+    return levels
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as a single-line JSON object"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc)
+                    .isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        route = getattr(record, 'route', None)
+        if route:
+            entry['route'] = route
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RequestFilter(logging.Filter):
+    """Tags records with the request's route, applies per-route levels and samples DEBUG records"""
+
+    def __init__(self, default_level=logging.INFO, route_levels=None, sample_every=1):
+        super().__init__()
+        self.default_level = default_level
+        self.route_levels = route_levels or {}
+        self.sample_every = max(1, sample_every)
+        # call site -> records seen; races only make sampling slightly inexact
+        self._seen = {}
+
+    def filter(self, record):
+        route = None
+        if has_request_context() and request.url_rule is not None:
+            route = request.url_rule.rule
+        record.route = route
+
+        if record.levelno < self.route_levels.get(route, self.default_level):
+            return False
+
+        if record.levelno <= logging.DEBUG and self.sample_every > 1:
+            key = (record.pathname, record.lineno)
+            seen = self._seen.get(key, 0)
+            self._seen[key] = seen + 1
+            if seen % self.sample_every:
+                return False
+        return True
+
+
+class BufferedHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks and restarts its listener after a fork"""
+
+    def __init__(self, target, queue_size=10000):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.target = target
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        pid = os.getpid()
+        if self._listener is not None and self._pid == pid:
+            return
+        with self._start_lock:
+            if self._listener is not None and self._pid == pid:
+                return
+            if self._pid is not None and self._pid != pid:
+                # The parent's listener thread didn't survive the fork, nor
+                # should the parent's queued records be written twice
+                self.queue = queue.Queue(maxsize=self.queue.maxsize)
+            self._listener = logging.handlers.QueueListener(self.queue, self.target, respect_handler_level=True)
+            self._listener.start()
+            self._pid = pid
+
+    def prepare(self, record):
+        # Like QueueHandler.prepare, but keeps the message and traceback
+        # separate so the JSON formatter can emit them as separate fields
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self._ensure_started()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        """Write out everything still queued and stop the listener thread"""
+        listener = self._listener
+        if listener is not None and self._pid == os.getpid():
+            listener.stop()
+        self._listener = None
+
+    def stats(self):
+        return {
+            'queued': self.queue.qsize(),
+            'dropped': self.dropped,
+        }
+
+
+def configure_logging(level='INFO', json_output=True, route_levels=None, sample_every=1,
+                      queue_size=10000, stream=None, logger=None):
+    """Route `logger` (default: the root logger) through a BufferedHandler and return the handler"""
+    target = logging.StreamHandler(stream or sys.stdout)
+    if json_output:
+        target.setFormatter(JsonFormatter())
+    else:
+        target.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s [%(route)s] %(message)s'))
+
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+    handler = BufferedHandler(target, queue_size=queue_size)
+    handler.addFilter(RequestFilter(level, route_levels, sample_every))
+
+    logger = logger or logging.getLogger()
+    # The logger must let through the most verbose level any route asks for,
+    # the filter then applies the right level per route
+    logger.setLevel(min([level, *(route_levels or {}).values()]))
+    logger.addHandler(handler)
+    atexit.register(handler.stop)
+    return handler
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+import base64
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from flask import Flask, jsonify, request
+from PIL import Image
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'src'))
+
+import test_api
+from conftest import BackendTestCase
+from api_client import StoryAPIClient
+from test_api import percentile, read_batch, run_batch
+
+DELAY = 0.05
+
+
+def make_backend():
+    """A stand-in for the story backend that answers after DELAY seconds"""
+    backend = Flask(__name__)
+    backend.in_flight = 0
+    backend.max_in_flight = 0
+    lock = threading.Lock()
+
+    def slow():
+        with lock:
+            backend.in_flight += 1
+            backend.max_in_flight = max(backend.max_in_flight, backend.in_flight)
+        # Finish out of order so results have to be put back in input order
+        time.sleep(DELAY * random.random() * 2)
+        with lock:
+            backend.in_flight -= 1
+
+    @backend.route('/initialize_story', methods=['POST'])
+    @backend.route('/continue_story', methods=['POST'])
+    @backend.route('/generate_text', methods=['POST'])
+    def story():
+        slow()
+        payload = request.get_json()
+        if payload.get('fail'):
+            return jsonify({'error': 'model overloaded'}), 503
+        return jsonify({'echo': payload})
+
+    @backend.route('/generate_image', methods=['POST'])
+    def image():
+        slow()
+        broken = request.get_json().get('broken')
+        if broken is not None:
+            return jsonify({'image_base64': broken})
+        buffer = io.BytesIO()
+        Image.new('RGB', (4, 4), 'red').save(buffer, format='PNG')
+        return jsonify({'image_base64': base64.b64encode(buffer.getvalue()).decode('ascii')})
+
+    return backend
+
+
+class TestBatch(BackendTestCase):
+    """The batch subcommand against a local backend on a free port"""
+
+    @classmethod
+    def make_backend(cls):
+        return make_backend()
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.backend.max_in_flight = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def path(self, name):
+        return os.path.join(self.temp_dir, name)
+
+    def write_jobs(self, count):
+        endpoints = ['initialize_story', 'continue_story', '/generate_text']
+        with open(self.path('jobs.jsonl'), 'w') as f:
+            for i in range(count):
+                f.write(json.dumps({'endpoint': endpoints[i % 3], 'payload': {'n': i}}) + '\n')
+        return read_batch(self.path('jobs.jsonl'))
+
+    def read_results(self):
+        with open(self.path('results.jsonl')) as f:
+            return [json.loads(line) for line in f]
+
+    def check_run(self, mode):
+        jobs = self.write_jobs(24)
+        started = time.perf_counter()
+        with StoryAPIClient(self.url, pool_size=6) as client:
+            summary = run_batch(client, jobs, self.path('results.jsonl'), concurrency=6, mode=mode)
+        elapsed = time.perf_counter() - started
+
+        results = self.read_results()
+        self.assertEqual([result['response']['echo']['n'] for result in results], list(range(24)))
+        self.assertEqual(summary['requests'], 24)
+        self.assertEqual(summary['errors'], 0)
+        self.assertEqual(set(summary['endpoints']), {'initialize_story', 'continue_story', 'generate_text'})
+        self.assertLessEqual(self.backend.max_in_flight, 6)
+        self.assertGreater(self.backend.max_in_flight, 1)
+        # 24 requests of up to 2 * DELAY each would take ~1.2s one at a time
+        self.assertLess(elapsed, 24 * DELAY)
+
+    def test_thread_mode(self):
+        """Requests run concurrently on the thread pool, results come back in input order"""
+        self.check_run('thread')
+
+    def test_asyncio_mode(self):
+        """The event loop keeps at most `concurrency` requests in flight"""
+        self.check_run('asyncio')
+
+    def test_errors_and_images(self):
+        """Failed requests are recorded and images are saved to files"""
+        with open(self.path('jobs.jsonl'), 'w') as f:
+            f.write(json.dumps({'endpoint': 'generate_text', 'payload': {'fail': True}}) + '\n')
+            f.write(json.dumps({'endpoint': 'generate_image', 'id': 'cover', 'payload': {'description': 'a fox'}}) + '\n')
+        with StoryAPIClient(self.url, max_retries=0) as client:
+            summary = run_batch(client, read_batch(self.path('jobs.jsonl')), self.path('results.jsonl'),
+                                image_dir=self.path('images'))
+
+        failed, image = self.read_results()
+        self.assertEqual(failed['status'], 503)
+        self.assertIn('overloaded', failed['error'])
+        self.assertEqual(image['response']['image_path'], self.path('images/cover.png'))
+        self.assertTrue(os.path.exists(self.path('images/cover.png')))
+        self.assertEqual(summary['endpoints']['generate_text']['errors'], 1)
+
+    def test_undecodable_image_is_recorded(self):
+        """A bad image fails only its own job; the rest of the batch is still written"""
+        with open(self.path('jobs.jsonl'), 'w') as f:
+            for broken in ('', 'abc'):
+                f.write(json.dumps({'endpoint': 'generate_image', 'payload': {'broken': broken}}) + '\n')
+            f.write(json.dumps({'endpoint': 'generate_image', 'id': 'cover', 'payload': {}}) + '\n')
+        with StoryAPIClient(self.url, max_retries=0) as client:
+            summary = run_batch(client, read_batch(self.path('jobs.jsonl')), self.path('results.jsonl'),
+                                image_dir=self.path('images'))
+
+        empty, garbled, image = self.read_results()
+        self.assertIn('Could not save image', empty['error'])
+        self.assertIn('Could not save image', garbled['error'])
+        self.assertNotIn('image_path', garbled['response'])
+        self.assertEqual(garbled['response']['image_base64'], 'abc')
+        self.assertTrue(os.path.exists(image['response']['image_path']))
+        self.assertEqual(summary['errors'], 2)
+
+    def test_image_names_stay_in_image_dir(self):
+        """Ids from the jobs file can't name paths outside the image directory"""
+        with open(self.path('jobs.jsonl'), 'w') as f:
+            for job_id in ('../escaped', 'a/b', '..'):
+                f.write(json.dumps({'endpoint': 'generate_image', 'id': job_id, 'payload': {}}) + '\n')
+        with StoryAPIClient(self.url, max_retries=0) as client:
+            summary = run_batch(client, read_batch(self.path('jobs.jsonl')), self.path('results.jsonl'),
+                                image_dir=self.path('images'))
+
+        self.assertEqual(summary['errors'], 0)
+        self.assertEqual([result['response']['image_path'] for result in self.read_results()],
+                         [self.path('images/.._escaped.png'), self.path('images/a_b.png'),
+                          self.path('images/line-3.png')])
+        self.assertFalse(os.path.exists(self.path('escaped.png')))
+
+    def test_unknown_endpoint(self):
+        """A typo in the batch file is reported before anything is sent"""
+        with open(self.path('jobs.jsonl'), 'w') as f:
+            f.write(json.dumps({'endpoint': 'generate_story', 'payload': {}}) + '\n')
+        with self.assertRaisesRegex(ValueError, 'Line 1'):
+            read_batch(self.path('jobs.jsonl'))
+
+    def test_percentile(self):
+        self.assertEqual(percentile(list(range(1, 101)), 0.9), 90)
+        self.assertEqual(test_api.summarize_batch([], 0)['throughput_rps'], 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+import email.utils
+import http.server
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+
+import requests
+from flask import Flask, jsonify, request
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'src'))
+
+from conftest import BackendTestCase
+from api_client import APIError, StoryAPIClient, parse_retry_after
+
+
+class KeepAliveHandler(http.server.BaseHTTPRequestHandler):
+    """Minimal HTTP/1.1 server (Werkzeug's closes every connection) recording client ports"""
+    protocol_version = 'HTTP/1.1'
+    client_ports = []
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.client_ports.append(self.client_address[1])
+        body = json.dumps({'story': 'Once upon a time, Alex'}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def make_backend():
+    """A stand-in backend that fails the first `failures` story requests"""
+    backend = Flask(__name__)
+    backend.failures = 0
+    backend.failure_status = 503
+    backend.retry_after = None
+    backend.image_calls = 0
+
+    @backend.route('/')
+    def index():
+        return jsonify({'status': 'ok'})
+
+    @backend.route('/initialize_story', methods=['POST'])
+    def initialize_story():
+        if backend.failures:
+            backend.failures -= 1
+            response = jsonify({'error': 'starting up'})
+            response.status_code = backend.failure_status
+            if backend.retry_after is not None:
+                response.headers['Retry-After'] = backend.retry_after
+            return response
+        return jsonify({'story': f"Once upon a time, {request.get_json()['name']}"})
+
+    @backend.route('/generate_image', methods=['POST'])
+    def generate_image():
+        backend.image_calls += 1
+        time.sleep(0.3)
+        return jsonify({'image_base64': ''})
+
+    @backend.route('/generate_text', methods=['POST'])
+    def generate_text():
+        return jsonify({'error': 'bad prompt'}), 400
+
+    return backend
+
+
+class TestStoryAPIClient(BackendTestCase):
+    """The API client against a local backend on a free port"""
+
+    @classmethod
+    def make_backend(cls):
+        return make_backend()
+
+    def setUp(self):
+        self.backend.failures = 0
+        self.backend.failure_status = 503
+        self.backend.retry_after = None
+        self.sleeps = []
+        self.calls = []
+        self.client = StoryAPIClient(self.url, max_retries=3, sleep=self.sleeps.append,
+                                     hooks=[self.calls.append], seed=1)
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_connection_is_reused(self):
+        """Consecutive calls go over one keep-alive connection"""
+        keep_alive_server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+        threading.Thread(target=keep_alive_server.serve_forever, daemon=True).start()
+        try:
+            with StoryAPIClient(f'http://127.0.0.1:{keep_alive_server.server_port}') as client:
+                for _ in range(5):
+                    self.assertIn('Alex', client.initialize_story({'name': 'Alex'})['story'])
+        finally:
+            keep_alive_server.shutdown()
+            keep_alive_server.server_close()
+        self.assertEqual(len(KeepAliveHandler.client_ports), 5)
+        self.assertEqual(len(set(KeepAliveHandler.client_ports)), 1)
+
+    def test_retries_with_jittered_backoff(self):
+        """503s are retried after exponentially growing, jittered waits"""
+        self.backend.failures = 2
+        self.assertIn('story', self.client.initialize_story({'name': 'Alex'}))
+
+        self.assertEqual(len(self.sleeps), 2)
+        self.assertLessEqual(self.sleeps[0], 0.5)
+        self.assertLessEqual(self.sleeps[1], 1.0)
+        self.assertEqual(self.calls[-1]['attempts'], 3)
+        self.assertEqual(self.calls[-1]['status'], 200)
+
+    def test_retry_after_is_honored(self):
+        """The server's Retry-After replaces the computed backoff"""
+        self.backend.failures = 1
+        self.backend.retry_after = '7'
+        self.client.initialize_story({'name': 'Alex'})
+        self.assertEqual(self.sleeps, [7.0])
+        self.assertEqual(self.calls[-1]['retry_wait_ms'], 7000)
+
+    def test_long_retry_after_is_not_capped(self):
+        """A wait longer than backoff_max is still the server's to choose"""
+        self.backend.failures = 1
+        self.backend.retry_after = '45'
+        self.client.initialize_story({'name': 'Alex'})
+        self.assertEqual(self.sleeps, [45.0])
+
+    def test_too_long_retry_after_gives_up(self):
+        """A Retry-After beyond max_retry_after ends the retries instead of blocking"""
+        self.backend.failures = 1
+        self.backend.retry_after = '3600'
+        with self.assertRaises(APIError) as raised:
+            self.client.initialize_story({'name': 'Alex'})
+        self.assertEqual(raised.exception.status_code, 503)
+        self.assertEqual(self.sleeps, [])
+
+    def test_post_read_timeout_is_not_retried(self):
+        """The backend already has the request, so a retry would run the model call twice"""
+        self.backend.image_calls = 0
+        client = StoryAPIClient(self.url, read_timeout=0.05, max_retries=3, sleep=self.sleeps.append,
+                                hooks=[self.calls.append])
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            client.generate_image({'description': 'a fox'})
+        client.close()
+        self.assertEqual(self.sleeps, [])
+        self.assertEqual(self.calls[-1]['attempts'], 1)
+        time.sleep(0.3)
+        self.assertEqual(self.backend.image_calls, 1)
+
+    def test_post_gateway_timeout_is_not_retried(self):
+        """A 504 may mean the backend is still running the first request"""
+        self.backend.failures = 1
+        self.backend.failure_status = 504
+        with self.assertRaises(APIError) as raised:
+            self.client.initialize_story({'name': 'Alex'})
+        self.assertEqual(raised.exception.status_code, 504)
+        self.assertEqual(self.sleeps, [])
+        self.assertEqual(self.calls[-1]['attempts'], 1)
+
+    def test_gives_up_after_max_retries(self):
+        """Once the retries are used up the last error status is raised"""
+        self.backend.failures = 10
+        with self.assertRaises(APIError) as raised:
+            self.client.initialize_story({'name': 'Alex'})
+        self.assertEqual(raised.exception.status_code, 503)
+        self.assertEqual(len(self.sleeps), 3)
+
+    def test_client_errors_are_not_retried(self):
+        """A 400 is the caller's problem, retrying won't fix it"""
+        with self.assertRaises(APIError) as raised:
+            self.client.generate_text({'prompt': ''})
+        self.assertEqual(raised.exception.status_code, 400)
+        self.assertEqual(self.sleeps, [])
+
+    def test_connection_errors_are_retried(self):
+        """An unreachable backend is retried, then the error is raised"""
+        client = StoryAPIClient('http://127.0.0.1:1/', max_retries=2, sleep=self.sleeps.append,
+                                hooks=[self.calls.append])
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            client.check()
+        self.assertEqual(len(self.sleeps), 2)
+        self.assertEqual(self.calls[-1]['attempts'], 3)
+        self.assertIsNone(self.calls[-1]['status'])
+        self.assertIsNotNone(self.calls[-1]['error'])
+
+    def test_post_connection_refused_is_retried(self):
+        """A POST that never got a connection is safe to send again"""
+        client = StoryAPIClient('http://127.0.0.1:1/', max_retries=2, sleep=self.sleeps.append)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            client.initialize_story({'name': 'Alex'})
+        self.assertEqual(len(self.sleeps), 2)
+
+    def test_timing_hook(self):
+        """Every call is reported with its endpoint and timing"""
+        self.client.check()
+        call = self.calls[-1]
+        self.assertEqual((call['method'], call['endpoint'], call['status']), ('GET', '', 200))
+        self.assertGreater(call['elapsed_ms'], 0)
+
+    def test_parse_retry_after(self):
+        now = time.time()
+        self.assertEqual(parse_retry_after('120'), 120.0)
+        self.assertAlmostEqual(parse_retry_after(email.utils.formatdate(now + 30, usegmt=True), now), 30, delta=1)
+        self.assertIsNone(parse_retry_after('soon'))
+        self.assertIsNone(parse_retry_after(None))
+
+
+if __name__ == '__main__':
+    unittest.main()
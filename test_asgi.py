@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+import asyncio
+import json
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+
+import server
+from server import app
+from asgi import AsgiApp
+
+TEST_DB = 'test_asgi_users.db'
+
+
+def asgi_request(asgi_app, method, path, body=b'', headers=()):
+    """Send one HTTP request through an ASGI app and return (status, headers, body)"""
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode('utf-8'),
+        'query_string': b'',
+        'root_path': '',
+        'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers],
+        'client': ('127.0.0.1', 12345),
+        'server': ('localhost', 5000),
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi_app(scope, receive, send))
+    start, body_message = sent
+    response_headers = [(k.decode('latin-1'), v.decode('latin-1')) for k, v in start['headers']]
+    return start['status'], response_headers, body_message['body']
+
+
+class TestAsgiMode(unittest.TestCase):
+    """The ASGI app must answer exactly like the Flask app"""
+
+    @classmethod
+    def setUpClass(cls):
+        app.config['TESTING'] = True
+        app.config['SECRET_KEY'] = 'test_secret_key'
+        app.config['DATABASE'] = TEST_DB
+        server.init_db()
+        cls.asgi_app = AsgiApp(app, db_workers=2, verify_workers=1)
+
+    @classmethod
+    def tearDownClass(cls):
+        server.close_db_pool()
+        server.user_cache.clear()
+        for path in (TEST_DB, TEST_DB + '-wal', TEST_DB + '-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_health_is_identical(self):
+        """A simple GET returns the same status and body as Flask"""
+        flask_response = app.test_client().get('/api/health')
+        status, _, body = asgi_request(self.asgi_app, 'GET', '/api/health')
+
+        self.assertEqual(status, flask_response.status_code)
+        self.assertEqual(body, flask_response.data)
+
+    def test_login_session_and_user(self):
+        """Login sets a session cookie that the ASGI app accepts on the next request"""
+        payload = json.dumps({'email': 'asgi-kid@test.com', 'isNewUser': True}).encode('utf-8')
+        status, headers, body = asgi_request(
+            self.asgi_app, 'POST', '/api/auth/mock-google', payload,
+            headers=[('Content-Type', 'application/json')]
+        )
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)['user']['email'], 'asgi-kid@test.com')
+
+        cookie = next(v for k, v in headers if k == 'set-cookie').split(';', 1)[0]
+        status, _, body = asgi_request(self.asgi_app, 'GET', '/api/auth/user', headers=[('Cookie', cookie)])
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)['user']['email'], 'asgi-kid@test.com')
+
+    def test_unauthenticated_user_is_identical(self):
+        """Error responses match Flask too"""
+        flask_response = app.test_client().get('/api/auth/user')
+        status, _, body = asgi_request(self.asgi_app, 'GET', '/api/auth/user')
+
+        self.assertEqual(status, 401)
+        self.assertEqual(body, flask_response.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,6 +8,7 @@ import random
 import string
 from datetime import datetime
 import sqlite3
+from unittest import mock
 
 # Add the current directory to the path so we can import the server module
 sys.path.append(os.path.dirname(os.path.realpath(__file__)))
@@ -86,14 +87,10 @@ class TestAuthentication(unittest.TestCase):
         conn.commit()
         conn.close()
         
-        # Patch the database connection in server.py for testing
-        def mock_connect(*args, **kwargs):
-            return sqlite3.connect(TEST_DB)
-        
-        # Save the original connect function
-        self.original_connect = sqlite3.connect
-        # Replace with mock
-        sqlite3.connect = mock_connect
+        # Point the server's connection pool at the test database and bring
+        # its schema up to date (indexes the server's queries rely on)
+        server.app.config['DATABASE'] = TEST_DB
+        server.init_db()
         
         # Create test data
         self.new_user_email = random_email()
@@ -118,15 +115,17 @@ class TestAuthentication(unittest.TestCase):
 
     def tearDown(self):
         """Clean up after each test"""
-        # Restore the original sqlite3.connect
-        sqlite3.connect = self.original_connect
+        # Release pooled connections to the test database
+        server.close_db_pool()
+        server.user_cache.clear()
 
     @classmethod
     def tearDownClass(cls):
         """Clean up after all tests"""
-        # Remove test database
-        if os.path.exists(TEST_DB):
-            os.remove(TEST_DB)
+        # Remove test database (and the WAL files left by the connection pool)
+        for path in (TEST_DB, TEST_DB + '-wal', TEST_DB + '-shm'):
+            if os.path.exists(path):
+                os.remove(path)
 
     def test_signup_new_user(self):
         """Test signing up a new user"""
@@ -288,6 +287,129 @@ class TestAuthentication(unittest.TestCase):
         self.assertEqual(data['status'], 'success')
         self.assertTrue(data['user']['onboardingCompleted'])
         self.assertFalse(data['user']['isNewUser'])
+        self.assertEqual(data['userPreferences']['interests'], ['language', 'culture', 'travel'])
+
+    def test_complete_onboarding_rejects_non_string_interests(self):
+        """Interests that aren't strings are refused rather than stored as their repr"""
+        self.app.post(
+            '/api/auth/mock-google',
+            json={'email': self.existing_user_email, 'isNewUser': False},
+            content_type='application/json'
+        )
+        response = self.app.post(
+            '/api/user/complete-onboarding',
+            json={'interests': ['space', {'a': 1}], 'age': 10},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.data)['message'], 'interests must be a list of strings')
+
+    def test_get_user_served_from_cache(self):
+        """Test repeated user info requests are answered from the profile cache"""
+        self.app.post(
+            '/api/auth/mock-google',
+            json={
+                'email': self.existing_user_email,
+                'name': self.existing_user_name,
+                'isNewUser': False
+            },
+            content_type='application/json'
+        )
+        hits_before = server.user_cache.stats()['hits']
+        
+        first = json.loads(self.app.get('/api/auth/user').data)
+        second = json.loads(self.app.get('/api/auth/user').data)
+        
+        self.assertEqual(first, second)
+        self.assertEqual(server.user_cache.stats()['hits'], hits_before + 2)
+
+    def test_get_user_conditional(self):
+        """Test user info is answered with 304 while the client's ETag is current"""
+        self.app.post(
+            '/api/auth/mock-google',
+            json={
+                'email': self.existing_user_email,
+                'name': self.existing_user_name,
+                'isNewUser': True
+            },
+            content_type='application/json'
+        )
+        
+        response = self.app.get('/api/auth/user')
+        etag = response.headers['ETag']
+        self.assertEqual(response.status_code, 200)
+        
+        # Unchanged profile - no body is sent
+        response = self.app.get('/api/auth/user', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+        self.assertEqual(response.headers['ETag'], etag)
+        
+        # Completing onboarding changes the body and so the ETag; the full body comes back
+        self.app.post(
+            '/api/user/complete-onboarding',
+            json={'interests': ['space'], 'age': 10, 'skillLevel': 'beginner', 'character': 'owl'},
+            content_type='application/json'
+        )
+        response = self.app.get('/api/auth/user', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertTrue(json.loads(response.data)['user']['onboardingCompleted'])
+
+    def test_get_user_conditional_without_cached_copy(self):
+        """A worker without the profile cached answers a current ETag from the version alone"""
+        self.app.post(
+            '/api/auth/mock-google',
+            json={'email': self.existing_user_email, 'isNewUser': False},
+            content_type='application/json'
+        )
+        etag = self.app.get('/api/auth/user').headers['ETag']
+        server.user_cache.clear()
+        
+        with mock.patch.object(server, 'load_user_response') as load:
+            response = self.app.get('/api/auth/user', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], etag)
+        load.assert_not_called()
+
+    def test_login_rotates_session_id(self):
+        """A session cookie planted before the victim logs in is not logged in as the victim"""
+        attacker = app.test_client()
+        attacker.post('/api/auth/mock-google', json={'email': random_email()}, content_type='application/json')
+        token = next(cookie.value for cookie in attacker.cookie_jar if cookie.name == 'session')
+        
+        self.app.set_cookie('localhost', 'session', token)
+        response = self.app.post(
+            '/api/auth/mock-google',
+            json={'email': self.existing_user_email, 'isNewUser': False},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        
+        response = attacker.get('/api/auth/user')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(json.loads(self.app.get('/api/auth/user').data)['user']['email'], self.existing_user_email)
+
+    def test_get_user_sees_other_workers_writes(self):
+        """A cached profile changed by another worker process is not served stale"""
+        self.app.post(
+            '/api/auth/mock-google',
+            json={'email': self.existing_user_email, 'isNewUser': False},
+            content_type='application/json'
+        )
+        response = self.app.get('/api/auth/user')
+        etag = response.headers['ETag']
+        self.assertFalse(json.loads(response.data)['user']['onboardingCompleted'])
+        
+        # Another worker completes onboarding; this worker's cache still holds the old profile
+        conn = sqlite3.connect(TEST_DB)
+        conn.execute(server.queries.COMPLETE_ONBOARDING_SQL, (self.existing_user_id,))
+        conn.commit()
+        conn.close()
+        
+        response = self.app.get('/api/auth/user', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(json.loads(response.data)['user']['onboardingCompleted'])
 
 
 if __name__ == '__main__':
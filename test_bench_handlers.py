@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'benchmarks'))
+
+import server
+from server import app
+import bench_handlers
+from bench_handlers import compare_results, find_baseline, results_path, run
+
+
+class TestHandlerBenchmarks(unittest.TestCase):
+    """Test suite for the handler benchmark suite"""
+
+    def test_compare_flags_slowdowns_over_threshold(self):
+        """Only benchmarks slower than the threshold count as regressions"""
+        baseline = {'login': {'best_us': 100.0}, 'get_user': {'best_us': 50.0}}
+        current = {'login': {'best_us': 115.0}, 'get_user': {'best_us': 54.0}, 'new': {'best_us': 1.0}}
+
+        regressions = compare_results(current, baseline, threshold=0.10)
+        self.assertEqual([name for name, *_ in regressions], ['login'])
+        self.assertAlmostEqual(regressions[0][3], 0.15)
+
+    def test_baseline_needs_clean_results_with_the_same_config(self):
+        """Dirty-tree runs and runs with other options are passed over"""
+        config = {'number': 200, 'repeat': 5, 'rows': 1000000, 'interests': 1000}
+        with tempfile.TemporaryDirectory() as results_dir, \
+                mock.patch.object(bench_handlers, 'RESULTS_DIR', results_dir), \
+                mock.patch.object(bench_handlers, 'git', return_value='c3\nc2\nc1'):
+            for commit, dirty, run_config in (('c3', True, config), ('c2', False, dict(config, rows=10000)),
+                                              ('c1', False, config)):
+                with open(results_path(commit, dirty), 'w') as f:
+                    json.dump({'commit': commit, 'dirty': dirty, 'config': run_config, 'benchmarks': {}}, f)
+
+            self.assertTrue(results_path('c3', True).endswith('c3-dirty.json'))
+            self.assertEqual(find_baseline('c4', config), results_path('c1'))
+            self.assertIsNone(find_baseline('c4', dict(config, repeat=2)))
+
+    def test_run_covers_every_handler(self):
+        """A tiny run produces a timing for every benchmark"""
+        database = app.config['DATABASE']
+        try:
+            with tempfile.TemporaryDirectory() as tmpdir:
+                results = run(tmpdir, number=2, repeat=1, rows=100, interest_count=10)
+        finally:
+            server.close_db_pool()
+            server.user_cache.clear()
+            app.config['DATABASE'] = database
+
+        self.assertEqual(set(results), {
+            'login_new_user', 'login_existing_user', 'get_user_without_prefs', 'get_user_with_prefs',
+            'get_user_cached', 'complete_onboarding_large', 'init_db_empty', 'init_db_large',
+        })
+        for result in results.values():
+            self.assertGreater(result['best_us'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+import gzip
+import io
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+
+import check_user_data
+from check_user_data import (checkpoint_path, export_users, import_users, parallel_dump, snapshot_connections,
+                             stream_dump, verify_database)
+from queries import USER_PROFILE_SQL, user_profile_from_row
+
+
+def make_records(count, with_preferences=True):
+    records = []
+    for i in range(count):
+        record = {'email': f'user{i}@example.com', 'name': f'User {i}'}
+        if with_preferences and i % 2 == 0:
+            record['preferences'] = {
+                'interests': ['space', f'topic-{i}'],
+                'age': 7 + i % 5,
+                'skill_level': 'beginner',
+                'character': 'owl',
+            }
+        records.append(record)
+    return records
+
+
+def write_jsonl(path, records):
+    with open(path, 'w') as f:
+        for record in records:
+            f.write(json.dumps(record) + '\n')
+
+
+class TestImportExport(unittest.TestCase):
+    """Test suite for the bulk import/export subcommands"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.conn = sqlite3.connect(os.path.join(self.temp_dir, 'users.db'))
+
+    def tearDown(self):
+        self.conn.close()
+        shutil.rmtree(self.temp_dir)
+
+    def path(self, name):
+        return os.path.join(self.temp_dir, name)
+
+    def profile(self, email):
+        user_id = self.conn.execute('SELECT id FROM users WHERE email = ?', (email,)).fetchone()[0]
+        return user_profile_from_row(self.conn.execute(USER_PROFILE_SQL, (user_id,)).fetchone())
+
+    def test_import_jsonl(self):
+        """Users, preferences and user_interests are written in batches"""
+        write_jsonl(self.path('users.jsonl'), make_records(25))
+
+        messages = []
+        imported = import_users(self.conn, self.path('users.jsonl'), batch_size=10, progress=messages.append)
+
+        self.assertEqual(imported, 25)
+        self.assertEqual(self.conn.execute('SELECT COUNT(*) FROM users').fetchone()[0], 25)
+        self.assertEqual(self.conn.execute('SELECT COUNT(*) FROM user_preferences').fetchone()[0], 13)
+        self.assertEqual(sum('records imported' in message for message in messages), 2)
+
+        profile = self.profile('user4@example.com')
+        self.assertTrue(profile['user']['onboardingCompleted'])
+        self.assertFalse(profile['user']['isNewUser'])
+        self.assertEqual(profile['userPreferences']['interests'], ['space', 'topic-4'])
+        self.assertEqual(profile['userPreferences']['age'], 11)
+
+        profile = self.profile('user1@example.com')
+        self.assertTrue(profile['user']['isNewUser'])
+        self.assertNotIn('userPreferences', profile)
+        self.assertFalse(os.path.exists(checkpoint_path(self.path('users.jsonl'))))
+
+    def test_reimport_updates_in_place(self):
+        """Importing the same users again updates them instead of failing"""
+        records = make_records(4)
+        write_jsonl(self.path('users.jsonl'), records)
+        import_users(self.conn, self.path('users.jsonl'), progress=None)
+
+        records[0]['preferences']['interests'] = ['dragons']
+        write_jsonl(self.path('users.jsonl'), records)
+        import_users(self.conn, self.path('users.jsonl'), progress=None)
+
+        self.assertEqual(self.conn.execute('SELECT COUNT(*) FROM users').fetchone()[0], 4)
+        self.assertEqual(self.profile('user0@example.com')['userPreferences']['interests'], ['dragons'])
+
+    def test_resume_after_failure(self):
+        """A failed import resumes after the last committed batch"""
+        records = make_records(25)
+        records[22] = {'name': 'No Email'}
+        write_jsonl(self.path('users.jsonl'), records)
+
+        with self.assertRaises(ValueError):
+            import_users(self.conn, self.path('users.jsonl'), batch_size=10, progress=None)
+        # Two full batches were committed, the failing third was rolled back
+        self.assertEqual(self.conn.execute('SELECT COUNT(*) FROM users').fetchone()[0], 20)
+        with open(checkpoint_path(self.path('users.jsonl'))) as f:
+            self.assertEqual(json.load(f)['records'], 20)
+
+        records[22] = {'email': 'fixed@example.com'}
+        write_jsonl(self.path('users.jsonl'), records)
+        messages = []
+        imported = import_users(self.conn, self.path('users.jsonl'), batch_size=10, progress=messages.append)
+
+        self.assertEqual(imported, 5)
+        self.assertIn('Resuming', ' '.join(messages))
+        self.assertEqual(self.conn.execute('SELECT COUNT(*) FROM users').fetchone()[0], 25)
+
+    def test_jsonl_round_trip(self):
+        """An export imports into an empty database unchanged"""
+        write_jsonl(self.path('users.jsonl'), make_records(15))
+        import_users(self.conn, self.path('users.jsonl'), progress=None)
+
+        self.assertEqual(export_users(self.conn, self.path('export.jsonl'), batch_size=4, progress=None), 15)
+
+        copy = sqlite3.connect(self.path('copy.db'))
+        try:
+            import_users(copy, self.path('export.jsonl'), progress=None)
+            export_users(copy, self.path('export2.jsonl'), progress=None)
+        finally:
+            copy.close()
+        with open(self.path('export.jsonl')) as first, open(self.path('export2.jsonl')) as second:
+            self.assertEqual(first.read(), second.read())
+
+    def test_csv_round_trip(self):
+        """CSV keeps the preference columns inline with interests as JSON"""
+        write_jsonl(self.path('users.jsonl'), make_records(6))
+        import_users(self.conn, self.path('users.jsonl'), progress=None)
+        export_users(self.conn, self.path('users.csv'), progress=None)
+
+        copy = sqlite3.connect(self.path('copy.db'))
+        try:
+            import_users(copy, self.path('users.csv'), progress=None)
+            rows = copy.execute('SELECT COUNT(*) FROM user_preferences').fetchone()[0]
+            interests = [row[0] for row in copy.execute(
+                "SELECT interest FROM user_interests i JOIN users u ON u.id = i.user_id "
+                "WHERE u.email = 'user2@example.com' ORDER BY position")]
+        finally:
+            copy.close()
+        self.assertEqual(rows, 3)
+        self.assertEqual(interests, ['space', 'topic-2'])
+
+    def test_command_line(self):
+        """The import and export subcommands are wired up"""
+        write_jsonl(self.path('users.jsonl'), make_records(3))
+        db = self.path('cli.db')
+
+        for argv in (['import', self.path('users.jsonl'), '--db', db, '--batch-size', '2'],
+                     ['export', self.path('out.jsonl'), '--db', db]):
+            with mock.patch.object(sys, 'argv', ['check_user_data.py'] + argv), redirect_stdout(io.StringIO()):
+                check_user_data.main()
+
+        with open(self.path('out.jsonl')) as f:
+            self.assertEqual([json.loads(line)['email'] for line in f],
+                             ['user0@example.com', 'user1@example.com', 'user2@example.com'])
+
+
+class TestStreamDump(unittest.TestCase):
+    """Test suite for the streaming NDJSON dump"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.conn = sqlite3.connect(os.path.join(self.temp_dir, 'users.db'))
+        write_jsonl(os.path.join(self.temp_dir, 'users.jsonl'), make_records(7))
+        import_users(self.conn, os.path.join(self.temp_dir, 'users.jsonl'), progress=None)
+
+    def tearDown(self):
+        self.conn.close()
+        shutil.rmtree(self.temp_dir)
+
+    def read_lines(self, f):
+        return [json.loads(line) for line in f]
+
+    def test_ndjson_dump(self):
+        """Every row is one line tagged with its table, JSON columns decoded"""
+        path = os.path.join(self.temp_dir, 'dump.ndjson')
+        with redirect_stdout(io.StringIO()) as console:
+            counts = stream_dump(self.conn, path, quiet=True, chunk_size=2)
+
+        self.assertEqual(counts['users'], 7)
+        self.assertEqual(counts['user_preferences'], 4)
+        self.assertNotIn('Record #', console.getvalue())
+        with open(path) as f:
+            lines = self.read_lines(f)
+        self.assertEqual(len(lines), sum(counts.values()))
+        preferences = [line['row'] for line in lines if line['table'] == 'user_preferences']
+        self.assertEqual(preferences[0]['interests'], ['space', 'topic-0'])
+
+    def test_gzip_dump(self):
+        """A .gz output is compressed"""
+        path = os.path.join(self.temp_dir, 'dump.ndjson.gz')
+        with redirect_stdout(io.StringIO()):
+            counts = stream_dump(self.conn, path, quiet=True)
+
+        with gzip.open(path, 'rt') as f:
+            self.assertEqual(len(self.read_lines(f)), sum(counts.values()))
+
+    def test_dump_to_stdout(self):
+        """Without an output file the dump goes to stdout, messages to stderr"""
+        stderr = io.StringIO()
+        with redirect_stdout(io.StringIO()) as stdout, mock.patch.object(sys, 'stderr', stderr):
+            counts = stream_dump(self.conn)
+
+        self.assertEqual(len(self.read_lines(io.StringIO(stdout.getvalue()))), sum(counts.values()))
+        self.assertIn('Record #1', stderr.getvalue())
+
+
+class TestSnapshot(unittest.TestCase):
+    """Test suite for the parallel dump and verification over one snapshot"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db = os.path.join(self.temp_dir, 'users.db')
+        self.conn = sqlite3.connect(self.db)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        write_jsonl(os.path.join(self.temp_dir, 'users.jsonl'), make_records(45))
+        import_users(self.conn, os.path.join(self.temp_dir, 'users.jsonl'), progress=None)
+
+    def tearDown(self):
+        self.conn.close()
+        shutil.rmtree(self.temp_dir)
+
+    def path(self, name):
+        return os.path.join(self.temp_dir, name)
+
+    def test_readers_share_a_snapshot(self):
+        """Writes committed after the snapshot was taken aren't seen by any reader"""
+        with snapshot_connections(self.db, 3) as readers:
+            self.conn.execute("INSERT INTO users (id, email) VALUES ('late', 'late@example.com')")
+            self.conn.commit()
+            counts = [reader.execute('SELECT COUNT(*) FROM users').fetchone()[0] for reader in readers]
+        self.assertEqual(counts, [45, 45, 45])
+
+    def test_parallel_dump_matches_stream_dump(self):
+        """Splitting tables into rowid ranges doesn't change the output"""
+        with redirect_stdout(io.StringIO()):
+            stream_dump(self.conn, self.path('serial.ndjson'), quiet=True)
+            counts = parallel_dump(self.db, self.path('parallel.ndjson'), workers=4, chunk_size=3, range_size=10)
+
+        self.assertEqual(counts['users'], 45)
+        with open(self.path('serial.ndjson')) as serial, open(self.path('parallel.ndjson')) as parallel:
+            self.assertEqual(serial.read(), parallel.read())
+
+    def test_parallel_gzip_dump(self):
+        """The compressed parts concatenate into one readable gzip file"""
+        with redirect_stdout(io.StringIO()):
+            counts = parallel_dump(self.db, self.path('dump.ndjson.gz'), workers=3, range_size=7)
+
+        with gzip.open(self.path('dump.ndjson.gz'), 'rt') as f:
+            self.assertEqual(sum(1 for _ in f), sum(counts.values()))
+
+    def test_verify(self):
+        """Counts are summed across ranges and inconsistencies are reported"""
+        report = verify_database(self.db, workers=3, integrity=True, range_size=10)
+        self.assertEqual(report['tables']['users'], 45)
+        self.assertEqual(report['users_with_preferences'], 23)
+        self.assertEqual(report['tables']['user_interests'], 46)
+        self.assertEqual(report['orphaned_preferences'], 0)
+        self.assertEqual(report['integrity_errors'], [])
+
+        self.conn.execute("INSERT INTO user_preferences (user_id, interests) VALUES ('gone', 'not json')")
+        self.conn.commit()
+        report = verify_database(self.db, workers=2, integrity=True, range_size=10)
+        self.assertEqual(report['orphaned_preferences'], 1)
+        self.assertEqual(report['invalid_interests'], 1)
+
+
+    def test_single_worker_verify_takes_no_lock(self):
+        """One reader doesn't need the write lock, so an open write transaction doesn't block it"""
+        self.conn.execute("INSERT INTO users (id, email) VALUES ('pending', 'pending@example.com')")
+        try:
+            report = verify_database(self.db, workers=1)
+            self.assertEqual(report['tables']['users'], 45)
+            with self.assertRaises(sqlite3.OperationalError):
+                with snapshot_connections(self.db, 2, lock_timeout=0.1):
+                    pass
+        finally:
+            self.conn.rollback()
+
+if __name__ == '__main__':
+    unittest.main()
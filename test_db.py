@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+
+from db import ConnectionPool
+
+
+class TestConnectionPool(unittest.TestCase):
+    """Test suite for the SQLite connection pool"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'pool.db')
+        self.pool = ConnectionPool(self.db_path, max_size=2, timeout=1.0)
+
+    def tearDown(self):
+        self.pool.close()
+        self.tmpdir.cleanup()
+
+    def test_connections_are_reused(self):
+        """A released connection is handed out again instead of reopening the file"""
+        with self.pool.connection() as conn:
+            first = conn
+        with self.pool.connection() as conn:
+            self.assertIs(conn, first)
+
+        stats = self.pool.stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['size'], 1)
+
+    def test_connections_use_wal(self):
+        """Pooled connections are configured for WAL with synchronous=NORMAL"""
+        with self.pool.connection() as conn:
+            self.assertEqual(conn.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+            # 1 == NORMAL
+            self.assertEqual(conn.execute('PRAGMA synchronous').fetchone()[0], 1)
+            # Same constraint behaviour as the per-request connections they replaced
+            self.assertEqual(conn.execute('PRAGMA foreign_keys').fetchone()[0], 0)
+
+    def test_uncommitted_work_is_rolled_back_on_release(self):
+        """A connection never goes back into the pool with an open transaction"""
+        with self.pool.connection() as conn:
+            conn.execute('CREATE TABLE t (x INTEGER)')
+            conn.commit()
+            conn.execute('INSERT INTO t VALUES (1)')
+            self.assertTrue(conn.in_transaction)
+
+        with self.pool.connection() as conn:
+            self.assertFalse(conn.in_transaction)
+            self.assertEqual(conn.execute('SELECT COUNT(*) FROM t').fetchone()[0], 0)
+
+    def test_failed_rollback_discards_connection(self):
+        """A connection whose rollback fails is closed and no longer counted"""
+        class FailingRollback(sqlite3.Connection):
+            def rollback(self):
+                raise sqlite3.OperationalError('disk I/O error')
+
+        pool = ConnectionPool(self.db_path, max_size=1, factory=FailingRollback)
+        with self.assertRaises(sqlite3.OperationalError):
+            with pool.connection() as conn:
+                conn.execute('CREATE TABLE t (x INTEGER)')
+                conn.execute('INSERT INTO t VALUES (1)')
+
+        self.assertEqual(pool.stats()['size'], 0)
+        self.assertEqual(pool.stats()['idle'], 0)
+        pool.close()
+
+    def test_exhausted_pool_waits(self):
+        """When every connection is checked out, callers wait for one to be released"""
+        first = self.pool.acquire()
+        second = self.pool.acquire()
+
+        timer = threading.Timer(0.05, self.pool.release, args=(first,))
+        timer.start()
+        third = self.pool.acquire()
+        timer.join()
+
+        self.assertIs(third, first)
+        stats = self.pool.stats()
+        self.assertEqual(stats['waits'], 1)
+        self.assertGreater(stats['wait_time_seconds'], 0)
+
+        self.pool.release(second)
+        self.pool.release(third)
+
+    def test_exhausted_pool_times_out(self):
+        """Waiting for a connection gives up after the configured timeout"""
+        pool = ConnectionPool(self.db_path, max_size=1, timeout=0.01)
+        conn = pool.acquire()
+        with self.assertRaises(RuntimeError):
+            pool.acquire()
+        pool.release(conn)
+        pool.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
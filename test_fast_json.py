@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+import datetime
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+
+from flask import Flask
+
+import fast_json
+from fast_json import FastJSONProvider
+
+PAYLOAD = {
+    'status': 'success',
+    'user': {'id': 'u1', 'name': 'Zoë', 'isNewUser': False},
+    'userPreferences': {'interests': ['space', 'animals'], 'age': None},
+}
+
+
+class TestFastJSON(unittest.TestCase):
+    """Test suite for the JSON provider"""
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.json = FastJSONProvider(self.app)
+
+    def test_stdlib_fallback_matches(self):
+        """With and without orjson the bytes on the wire are identical"""
+        fast = self.app.json.serialize(PAYLOAD)
+        with mock.patch.object(fast_json, 'orjson', None):
+            fallback = self.app.json.serialize(PAYLOAD)
+            self.assertEqual(fast_json.loads(fallback), PAYLOAD)
+        self.assertEqual(fast, fallback)
+        self.assertEqual(json.loads(fast), PAYLOAD)
+
+    def test_jsonify_uses_provider(self):
+        """jsonify() responses are compact and keep insertion order"""
+        with self.app.app_context():
+            from flask import jsonify
+            body = jsonify(PAYLOAD).get_data()
+        self.assertEqual(body, self.app.json.serialize(PAYLOAD))
+        self.assertTrue(body.startswith(b'{"status":"success","user":'))
+
+    def test_dates_serialized_like_flask(self):
+        """Dates still go through Flask's default() (HTTP date format)"""
+        moment = datetime.datetime(2024, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc)
+        body = self.app.json.serialize({'at': moment})
+        self.assertEqual(json.loads(body), {'at': 'Tue, 02 Jan 2024 03:04:05 GMT'})
+
+
+if __name__ == '__main__':
+    unittest.main()
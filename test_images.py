@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+import base64
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from PIL import Image
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'src'))
+
+import images
+from images import build_variants, detect_format, make_variants, save_base64_image
+
+
+def encoded_image(image_format, size=(64, 48), mode='RGB'):
+    buffer = io.BytesIO()
+    Image.new(mode, size, 'red').save(buffer, format=image_format)
+    return buffer.getvalue(), base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+class TestSaveImage(unittest.TestCase):
+    """Test suite for saving base64 images"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def path(self, name):
+        return os.path.join(self.temp_dir, name)
+
+    def test_detect_format(self):
+        for image_format, extension in (('PNG', '.png'), ('JPEG', '.jpg'), ('WEBP', '.webp'), ('GIF', '.gif')):
+            self.assertEqual(detect_format(encoded_image(image_format)[1]), (image_format, extension))
+        self.assertEqual(detect_format(base64.b64encode(b'not an image').decode()), (None, None))
+
+    def test_matching_format_is_written_as_is(self):
+        """The decoded bytes go straight to disk, chunk by chunk, without Pillow"""
+        raw, encoded = encoded_image('PNG', size=(300, 300))
+        with mock.patch.object(images, 'CHUNK_CHARS', 64), mock.patch.object(images.Image, 'open') as pil_open:
+            self.assertTrue(save_base64_image(encoded, self.path('out.png')))
+        pil_open.assert_not_called()
+        with open(self.path('out.png'), 'rb') as f:
+            self.assertEqual(f.read(), raw)
+
+    def test_data_url(self):
+        raw, encoded = encoded_image('JPEG')
+        self.assertTrue(save_base64_image('data:image/jpeg;base64,' + encoded, self.path('out.jpeg')))
+        with open(self.path('out.jpeg'), 'rb') as f:
+            self.assertEqual(f.read(), raw)
+
+    def test_other_format_is_converted(self):
+        """Asking for a different format still works, through Pillow"""
+        _, encoded = encoded_image('PNG', mode='RGBA')
+        self.assertFalse(save_base64_image(encoded, self.path('out.jpg')))
+        with Image.open(self.path('out.jpg')) as image:
+            self.assertEqual(image.format, 'JPEG')
+
+    def test_wrapped_base64(self):
+        """Line-wrapped base64 can't be decoded in chunks and takes the slow path"""
+        raw, _ = encoded_image('PNG')
+        wrapped = base64.encodebytes(raw).decode('ascii')
+        self.assertFalse(save_base64_image(wrapped, self.path('out.png')))
+        with Image.open(self.path('out.png')) as image:
+            self.assertEqual(image.size, (64, 48))
+
+
+class TestVariants(unittest.TestCase):
+    """Test suite for the resized variant pipeline"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.sources = []
+        for i, size in enumerate(((1200, 800), (600, 900))):
+            path = os.path.join(self.temp_dir, f'page{i}.png')
+            Image.new('RGB', size, 'blue').save(path)
+            self.sources.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_sizes_without_upscaling(self):
+        out = os.path.join(self.temp_dir, 'variants')
+        os.makedirs(out)
+        written = make_variants(self.sources[1], out, sizes=(256, 512, 1024), formats=('webp',))
+
+        self.assertEqual([os.path.basename(path) for path in written], ['page1_512.webp', 'page1_256.webp'])
+        with Image.open(written[0]) as image:
+            self.assertEqual(image.format, 'WEBP')
+            self.assertEqual(image.size, (341, 512))
+
+    def test_process_pool(self):
+        """Every image is processed, results in input order, unsupported formats skipped"""
+        out = os.path.join(self.temp_dir, 'variants')
+        broken = os.path.join(self.temp_dir, 'broken.png')
+        with open(broken, 'wb') as f:
+            f.write(b'not a png')
+
+        results = build_variants(self.sources + [broken], out, sizes=(256, 512), formats=('webp', 'nosuchformat'),
+                                 workers=2)
+
+        self.assertEqual([path for path, _, _ in results], self.sources + [broken])
+        self.assertEqual([len(written) for _, written, _ in results], [2, 2, 0])
+        self.assertIsNone(results[0][2])
+        self.assertIsNotNone(results[2][2])
+        with Image.open(os.path.join(out, 'page0_512.webp')) as image:
+            self.assertEqual(image.size, (512, 341))
+
+
+if __name__ == '__main__':
+    unittest.main()
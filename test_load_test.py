@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+import os
+import sys
+import threading
+import unittest
+
+from werkzeug.serving import make_server
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'benchmarks'))
+
+import server
+from server import app
+from load_test import percentile, run_load_test
+
+TEST_DB = 'test_load_users.db'
+
+
+class TestLoadTest(unittest.TestCase):
+    """The load generator against a real HTTP server on a free port"""
+
+    @classmethod
+    def setUpClass(cls):
+        app.config['TESTING'] = True
+        app.config['DATABASE'] = TEST_DB
+        server.init_db()
+        cls.http_server = make_server('127.0.0.1', 0, app, threaded=True)
+        cls.thread = threading.Thread(target=cls.http_server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.url = f'http://127.0.0.1:{cls.http_server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.http_server.shutdown()
+        server.close_db_pool()
+        server.user_cache.clear()
+        for path in (TEST_DB, TEST_DB + '-wal', TEST_DB + '-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_percentile(self):
+        """Nearest-rank percentiles"""
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.50), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile(values, 0.999), 100)
+        self.assertEqual(percentile([], 0.5), 0.0)
+
+    def test_mixed_traffic_report(self):
+        """Every route in the mix is exercised and reported without errors"""
+        report = run_load_test(self.url, concurrency=4, duration=30, max_requests=200, seed=1,
+                               mix={'signup': 1, 'login': 1, 'get_user': 4, 'onboarding': 1})
+
+        self.assertEqual(set(report['routes']), {'signup', 'login', 'get_user', 'onboarding'})
+        for route, stats in report['routes'].items():
+            self.assertEqual(stats['errors'], 0, route)
+            self.assertEqual(set(stats['statuses']), {'200'}, route)
+            self.assertLessEqual(stats['p50_ms'], stats['p99_ms'])
+        self.assertGreaterEqual(report['requests'], 200)
+        self.assertGreater(report['throughput_rps'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
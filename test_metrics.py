@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+import os
+import sys
+import threading
+import unittest
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+
+import server
+from server import app
+from metrics import RequestMetrics
+
+TEST_DB = 'test_metrics_users.db'
+
+
+class TestRequestMetrics(unittest.TestCase):
+    """Test suite for the per-thread request histograms"""
+
+    def test_phases_are_attributed_to_the_request(self):
+        """Phase times add up per request and land in the route's histogram"""
+        metrics = RequestMetrics(buckets=(0.1, 1.0))
+        metrics.start_request()
+        metrics.add_time('db_query', 0.05)
+        metrics.add_time('db_query', 0.1)
+        metrics.finish_request('/api/auth/user', 'GET', '200')
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot.requests, {('/api/auth/user', 'GET', '200'): 1})
+        # 0.15s of queries falls in the le=1.0 bucket
+        self.assertEqual(snapshot.phases[('/api/auth/user', 'db_query')][:3], [0, 1, 0])
+
+    def test_time_outside_requests_is_ignored(self):
+        """Background work (e.g. the last_login writer) isn't charged to any request"""
+        metrics = RequestMetrics()
+        metrics.add_time('db_commit', 1.0)
+        self.assertEqual(metrics.snapshot().phases, {})
+
+    def test_threads_are_merged(self):
+        """Requests recorded by exited threads are still reported"""
+        metrics = RequestMetrics(max_threads=2)
+
+        def handle():
+            metrics.start_request()
+            metrics.finish_request('/api/health', 'GET', '200')
+
+        for _ in range(5):
+            thread = threading.Thread(target=handle)
+            thread.start()
+            thread.join()
+
+        self.assertEqual(metrics.snapshot().requests, {('/api/health', 'GET', '200'): 5})
+        self.assertLessEqual(len(metrics._threads), 3)
+
+
+class TestMetricsEndpoint(unittest.TestCase):
+    """Test suite for /api/metrics"""
+
+    @classmethod
+    def setUpClass(cls):
+        app.config['TESTING'] = True
+        app.config['DATABASE'] = TEST_DB
+        server.init_db()
+
+    @classmethod
+    def tearDownClass(cls):
+        app.config['METRICS_TOKEN'] = None
+        server.close_db_pool()
+        server.user_cache.clear()
+        for path in (TEST_DB, TEST_DB + '-wal', TEST_DB + '-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_login_phases_are_exported(self):
+        """A login shows up with its DB and JSON phases in Prometheus format"""
+        client = app.test_client()
+        response = client.post('/api/auth/mock-google', json={'email': 'metrics@test.com', 'isNewUser': True})
+        self.assertEqual(response.status_code, 200)
+
+        response = client.get('/api/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        body = response.get_data(as_text=True)
+        self.assertIn('http_requests_total{route="/api/auth/mock-google",method="POST",status="200"}', body)
+        for phase in ('db_query', 'db_commit', 'json'):
+            self.assertIn(f'http_request_phase_seconds_count{{route="/api/auth/mock-google",phase="{phase}"}}', body)
+        self.assertIn('db_pool_hits ', body)
+        self.assertIn('user_cache_hit_ratio ', body)
+
+    def test_metrics_token(self):
+        """With METRICS_TOKEN set, scrapes must present it"""
+        app.config['METRICS_TOKEN'] = 'scrape-secret'
+        try:
+            client = app.test_client()
+            self.assertEqual(client.get('/api/metrics').status_code, 401)
+            response = client.get('/api/metrics', headers={'Authorization': 'Bearer scrape-secret'})
+            self.assertEqual(response.status_code, 200)
+        finally:
+            app.config['METRICS_TOKEN'] = None
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+import os
+import sqlite3
+import sys
+import unittest
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+
+from migrations import LATEST_VERSION, get_schema_version, migrate, table_columns
+
+
+class TestMigrations(unittest.TestCase):
+    """Test suite for the versioned schema migrations"""
+
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_fresh_database(self):
+        """An empty database gets the full schema and the latest version"""
+        applied = migrate(self.conn, progress=None)
+
+        self.assertEqual(applied[-1], LATEST_VERSION)
+        self.assertEqual(get_schema_version(self.conn), LATEST_VERSION)
+        self.assertIn('onboarding_completed', table_columns(self.conn, 'users'))
+        self.assertIn('interests', table_columns(self.conn, 'user_preferences'))
+
+    def test_current_schema_is_a_single_read(self):
+        """Starting against an up-to-date database doesn't touch any table"""
+        migrate(self.conn, progress=None)
+
+        statements = []
+        self.conn.set_trace_callback(statements.append)
+        self.assertEqual(migrate(self.conn, progress=None), [])
+        self.conn.set_trace_callback(None)
+
+        self.assertEqual(statements, ['PRAGMA user_version'])
+
+    def test_legacy_table_is_backfilled_in_batches(self):
+        """Columns missing from an old users table are added and backfilled"""
+        self.conn.execute('CREATE TABLE users (id TEXT PRIMARY KEY, email TEXT UNIQUE, name TEXT, picture TEXT, last_login TIMESTAMP)')
+        self.conn.executemany('INSERT INTO users (id, email) VALUES (?, ?)',
+                              [(str(i), f'user{i}@example.com') for i in range(25)])
+        self.conn.commit()
+
+        messages = []
+        migrate(self.conn, batch_size=10, progress=messages.append)
+
+        row = self.conn.execute(
+            'SELECT COUNT(*) FROM users WHERE is_new_user = 0 AND onboarding_completed = 0 AND created_at IS NOT NULL'
+        ).fetchone()
+        self.assertEqual(row[0], 25)
+        # 3 batches of 10 rows for each of the three backfills
+        self.assertEqual(len([m for m in messages if 'rows scanned' in m]), 9)
+
+    def test_interests_copied_to_user_interests(self):
+        """Interests stored as JSON are copied, in order, into user_interests"""
+        migrate(self.conn, progress=None)
+        self.conn.execute('PRAGMA user_version = 3')
+        self.conn.execute('DROP TABLE user_interests')
+        self.conn.executemany('INSERT INTO users (id, email) VALUES (?, ?)',
+                              [(str(i), f'user{i}@example.com') for i in range(3)])
+        self.conn.executemany('INSERT INTO user_preferences (user_id, interests) VALUES (?, ?)',
+                              [('0', '["space", "animals"]'), ('1', '[]'), ('2', 'not json')])
+        self.conn.commit()
+
+        self.assertEqual(migrate(self.conn, batch_size=2, progress=None), [4, 5, 6])
+        rows = self.conn.execute('SELECT user_id, position, interest FROM user_interests ORDER BY user_id, position').fetchall()
+        self.assertEqual(rows, [('0', 0, 'space'), ('0', 1, 'animals')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+import os
+import sqlite3
+import sys
+import unittest
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+
+from migrations import migrate
+from queries import UPSERT_PREFERENCES_SQL, fetch_user_profile, save_interests, users_with_interest
+
+
+class TestInterestQueries(unittest.TestCase):
+    """Test suite for interests stored in user_interests"""
+
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        migrate(self.conn, progress=None)
+        self.conn.executemany('INSERT INTO users (id, email) VALUES (?, ?)',
+                              [(f'u{i}', f'user{i}@example.com') for i in range(5)])
+
+    def tearDown(self):
+        self.conn.close()
+
+    def save(self, user_id, interests, interests_json='[]'):
+        self.conn.execute(UPSERT_PREFERENCES_SQL, (user_id, interests_json, 8, 'beginner', 'owl'))
+        save_interests(self.conn, user_id, interests)
+
+    def test_profile_reads_interests_in_order(self):
+        """Interests come back in the order they were saved, replacing older ones"""
+        self.save('u1', ['space', 'animals'])
+        self.save('u1', ['robots', 'space', 'ocean'])
+        profile = fetch_user_profile(self.conn, 'u1')
+        self.assertEqual(profile['userPreferences']['interests'], ['robots', 'space', 'ocean'])
+
+    def test_interests_ordered_by_position_not_insertion(self):
+        """Rows written out of position order still come back by position"""
+        self.conn.execute(UPSERT_PREFERENCES_SQL, ('u2', '[]', 8, 'beginner', 'owl'))
+        self.conn.executemany('INSERT INTO user_interests (user_id, position, interest) VALUES (?, ?, ?)',
+                              [('u2', 2, 'ocean'), ('u2', 0, 'robots'), ('u2', 1, 'space')])
+        profile = fetch_user_profile(self.conn, 'u2')
+        self.assertEqual(profile['userPreferences']['interests'], ['robots', 'space', 'ocean'])
+
+    def test_profile_without_interests(self):
+        """Completed onboarding with no interests gives an empty list"""
+        self.save('u2', [])
+        self.assertEqual(fetch_user_profile(self.conn, 'u2')['userPreferences']['interests'], [])
+        self.assertNotIn('userPreferences', fetch_user_profile(self.conn, 'u3'))
+
+    def test_profile_falls_back_to_json_column(self):
+        """Rows only written to the JSON column are still read correctly"""
+        self.conn.execute(UPSERT_PREFERENCES_SQL, ('u4', '["dinosaurs"]', 8, 'beginner', 'owl'))
+        self.assertEqual(fetch_user_profile(self.conn, 'u4')['userPreferences']['interests'], ['dinosaurs'])
+
+    def test_users_with_interest_pages_through_index(self):
+        """Users with an interest are listed by id, a page at a time"""
+        for user_id in ('u0', 'u1', 'u2', 'u3'):
+            self.save(user_id, ['space'] if user_id != 'u2' else ['animals'])
+        self.assertEqual(users_with_interest(self.conn, 'space', limit=2), ['u0', 'u1'])
+        self.assertEqual(users_with_interest(self.conn, 'space', after='u1', limit=2), ['u3'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+import os
+import sqlite3
+import sys
+import unittest
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+
+from migrations import migrate
+from queries import LOGIN_LOOKUP_SQL
+from query_plan import check_query_plans, explain
+
+
+class TestQueryPlans(unittest.TestCase):
+    """Every statement the server issues must stay an index seek"""
+
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        migrate(self.conn, progress=None)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_no_full_scans(self):
+        """No server statement scans a whole table"""
+        self.assertEqual(check_query_plans(self.conn), {})
+
+    def test_login_lookup_uses_covering_index(self):
+        """The login SELECT by email never touches the table rows"""
+        plan = explain(self.conn, LOGIN_LOOKUP_SQL)
+        self.assertEqual(plan, ['SEARCH users USING COVERING INDEX idx_users_email_login (email=?)'])
+
+    def test_checker_detects_full_scan(self):
+        """An unindexed lookup is reported"""
+        problems = check_query_plans(self.conn, {'by_name': 'SELECT id FROM users WHERE name = ?'})
+        self.assertIn('by_name', problems)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from flask import Flask, jsonify, request
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'src'))
+
+from conftest import BackendTestCase
+from api_client import StoryAPIClient
+from response_cache import DiskCache, cache_key
+
+
+class TestDiskCache(unittest.TestCase):
+    """Test suite for the content-addressed response cache"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_key_is_canonical(self):
+        """Key order and formatting don't change the key, the endpoint and values do"""
+        key = cache_key('initialize_story', {'name': 'Alex', 'age': 10})
+        self.assertEqual(key, cache_key('/initialize_story', {'age': 10, 'name': 'Alex'}))
+        self.assertNotEqual(key, cache_key('generate_image', {'name': 'Alex', 'age': 10}))
+        self.assertNotEqual(key, cache_key('initialize_story', {'name': 'Alex', 'age': 11}))
+        self.assertEqual(len(key), 64)
+
+    def test_round_trip_in_sharded_directories(self):
+        cache = DiskCache(self.temp_dir)
+        key = cache_key('generate_image', {'description': 'a fox'})
+        self.assertIsNone(cache.get(key))
+
+        cache.set(key, b'{"image_base64": "AAAA"}', 'generate_image')
+
+        self.assertEqual(cache.get(key), b'{"image_base64": "AAAA"}')
+        self.assertTrue(os.path.exists(os.path.join(self.temp_dir, key[:2], key[2:4], key + '.json')))
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_ttl(self):
+        """Expired entries are misses and are removed"""
+        cache = DiskCache(self.temp_dir, ttl=60)
+        key = cache_key('initialize_story', {'name': 'Alex'})
+        cache.set(key, b'{}')
+        self.assertIsNotNone(cache.get(key))
+
+        path = cache.path(key)
+        with open(path, 'rb') as f:
+            f.readline()
+            body = f.read()
+        with open(path, 'wb') as f:
+            f.write(json.dumps({'created': time.time() - 61}).encode() + b'\n' + body)
+
+        self.assertIsNone(cache.get(key))
+        self.assertFalse(os.path.exists(path))
+
+    def test_expiry_lowers_size(self):
+        """An entry removed for being expired no longer counts towards max_bytes"""
+        cache = DiskCache(self.temp_dir, ttl=60)
+        key, other = cache_key('generate_image', {'n': 0}), cache_key('generate_image', {'n': 1})
+        cache.set(key, b'x' * 200)
+        cache.set(other, b'y')
+        size_before = cache.stats()['bytes']
+
+        with mock.patch('response_cache.time.time', return_value=time.time() + 61):
+            self.assertIsNone(cache.get(key))
+
+        self.assertLess(cache.stats()['bytes'], size_before)
+        self.assertEqual(cache.stats()['bytes'], os.path.getsize(cache.path(other)))
+
+    def test_overwrite_does_not_grow_size(self):
+        """Writing a key again counts its bytes once, so eviction isn't triggered early"""
+        cache = DiskCache(self.temp_dir, max_bytes=1000)
+        key, other = cache_key('generate_image', {'n': 0}), cache_key('generate_image', {'n': 1})
+        cache.set(other, b'y')
+        for _ in range(20):
+            cache.set(key, b'x' * 200)
+        on_disk = os.path.getsize(cache.path(key)) + os.path.getsize(cache.path(other))
+        self.assertEqual(cache.stats()['bytes'], on_disk)
+        self.assertEqual(cache.stats()['evictions'], 0)
+
+    def test_lru_eviction(self):
+        """Past max_bytes the least recently used entries are deleted first"""
+        cache = DiskCache(self.temp_dir, max_bytes=1000)
+        body = b'x' * 200
+        keys = [cache_key('generate_image', {'n': i}) for i in range(4)]
+        for age, key in enumerate(keys):
+            cache.set(key, body)
+            # Oldest first, without sleeping between writes
+            os.utime(cache.path(key), (1000 + age, 1000 + age))
+        # Reading the oldest makes it the most recently used
+        self.assertIsNotNone(cache.get(keys[0]))
+
+        cache.set(cache_key('generate_image', {'n': 4}), body)
+
+        self.assertIsNotNone(cache.get(keys[0]))
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertGreaterEqual(cache.stats()['evictions'], 1)
+        self.assertLessEqual(cache.stats()['bytes'], 900)
+
+
+class TestClientCache(BackendTestCase):
+    """The API client answering repeated requests from the cache"""
+
+    @classmethod
+    def make_backend(cls):
+        backend = Flask(__name__)
+        backend.calls = 0
+
+        @backend.route('/initialize_story', methods=['POST'])
+        @backend.route('/continue_story', methods=['POST'])
+        def story():
+            backend.calls += 1
+            return jsonify({'story': f"Once upon a time, {request.get_json()['name']}", 'call': backend.calls})
+
+        return backend
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.backend.calls = 0
+        self.calls = []
+        self.client = StoryAPIClient(self.url, cache=DiskCache(self.temp_dir), hooks=[self.calls.append])
+
+    def tearDown(self):
+        self.client.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_repeated_request_is_a_hit(self):
+        first = self.client.initialize_story({'name': 'Alex', 'age': 10})
+        second = self.client.initialize_story({'age': 10, 'name': 'Alex'})
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.backend.calls, 1)
+        self.assertEqual([call['cached'] for call in self.calls], [False, True])
+
+    def test_other_endpoints_are_not_cached(self):
+        self.client.continue_story({'name': 'Alex'})
+        self.client.continue_story({'name': 'Alex'})
+        self.assertEqual(self.backend.calls, 2)
+
+    def test_cache_shared_between_clients(self):
+        """Another client (or process) using the same directory gets the hit"""
+        self.client.initialize_story({'name': 'Alex'})
+        with StoryAPIClient(self.url, cache=DiskCache(self.temp_dir)) as other:
+            self.assertEqual(other.initialize_story({'name': 'Alex'})['call'], 1)
+        self.assertEqual(self.backend.calls, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+
+from flask import Flask, session
+
+from db import ConnectionPool
+from migrations import migrate
+from session_store import (MemorySessionStore, ServerSideSessionInterface, SQLiteSessionStore,
+                           TieredSessionStore)
+
+
+class TestSessionStores(unittest.TestCase):
+    """Test suite for the session stores"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.pool = ConnectionPool(os.path.join(self.tmpdir.name, 'users.db'))
+        with self.pool.connection() as conn:
+            migrate(conn, progress=None)
+
+    def tearDown(self):
+        self.pool.close()
+        self.tmpdir.cleanup()
+
+    def test_memory_store_lru(self):
+        """The memory store evicts the least recently used session"""
+        store = MemorySessionStore(max_size=2)
+        store.set('a', '{}', 100)
+        store.set('b', '{}', 100)
+        store.get('a', 0)
+        store.set('c', '{}', 100)
+        self.assertIsNotNone(store.get('a', 0))
+        self.assertIsNone(store.get('b', 0))
+        self.assertEqual(store.count(), 2)
+
+    def test_sqlite_store_expiry_in_batches(self):
+        """Expired sessions are invisible and purged a batch at a time"""
+        store = SQLiteSessionStore(lambda: self.pool)
+        for i in range(5):
+            store.set(f'old{i}', '{}', 10)
+        store.set('live', '{"user_id": "1"}', 1000)
+
+        self.assertIsNone(store.get('old0', 50))
+        self.assertEqual(store.get('live', 50), ('{"user_id": "1"}', 1000))
+        self.assertEqual(store.purge_expired(50, batch_size=3), 3)
+        self.assertEqual(store.purge_expired(50, batch_size=3), 2)
+        self.assertEqual(store.count(), 1)
+
+    def test_tiered_store_shares_sessions(self):
+        """Two workers' tiered stores see each other's sessions and revocations"""
+        backing = SQLiteSessionStore(lambda: self.pool)
+        worker1 = TieredSessionStore(backing, local_ttl=0)
+        worker2 = TieredSessionStore(backing, local_ttl=0)
+        now = time.time()
+
+        worker1.set('sid', '{"user_id": "1"}', now + 60)
+        self.assertEqual(worker2.get('sid', now)[0], '{"user_id": "1"}')
+
+        worker1.delete('sid')
+        self.assertIsNone(worker2.get('sid', time.time()))
+
+
+class TestServerSideSessionInterface(unittest.TestCase):
+    """Test suite for the Flask session interface"""
+
+    def setUp(self):
+        self.store = MemorySessionStore()
+        self.interface = ServerSideSessionInterface(self.store)
+        app = Flask(__name__)
+        app.secret_key = 'test-secret'
+        app.session_interface = self.interface
+
+        @app.route('/login')
+        def login():
+            session.regenerate()
+            session.permanent = True
+            session['user_id'] = 'user-1'
+            return 'ok'
+
+        @app.route('/whoami')
+        def whoami():
+            return session.get('user_id') or 'anonymous'
+
+        @app.route('/logout')
+        def logout():
+            session.pop('user_id', None)
+            return 'ok'
+
+        self.app = app
+        self.client = app.test_client()
+
+    def session_cookie(self):
+        for cookie in self.client.cookie_jar:
+            if cookie.name == 'session':
+                return cookie.value
+        return None
+
+    def test_cookie_holds_only_a_signed_id(self):
+        """The cookie is a short signed id and the data stays server-side"""
+        self.client.get('/login')
+        token = self.session_cookie()
+        self.assertLessEqual(len(token), 45)
+        self.assertNotIn('user-1', token)
+        self.assertEqual(self.store.count(), 1)
+        self.assertEqual(self.client.get('/whoami').data, b'user-1')
+
+    def test_forged_token_is_rejected(self):
+        """A token with a bad signature never reaches the store"""
+        self.client.get('/login')
+        sid = self.session_cookie().split('.')[0]
+        self.client.set_cookie('localhost', 'session', f'{sid}.forged')
+        self.assertEqual(self.client.get('/whoami').data, b'anonymous')
+        self.assertEqual(self.interface.stats()['rejected_tokens'], 1)
+
+    def test_logout_revokes_session(self):
+        """Logging out deletes the session, so a copied cookie stops working"""
+        self.client.get('/login')
+        token = self.session_cookie()
+        self.client.get('/logout')
+        self.assertEqual(self.store.count(), 0)
+
+        self.client.set_cookie('localhost', 'session', token)
+        self.assertEqual(self.client.get('/whoami').data, b'anonymous')
+
+    def test_login_rotates_session_id(self):
+        """A session id planted before login is dropped, not authenticated"""
+        self.client.get('/login')
+        planted = self.session_cookie()
+        self.client.get('/logout')
+        # Attacker's anonymous session, with some data so it is stored
+        self.store.set(self.interface.parse_token(self.app, planted), '{"theme":"dark"}', time.time() + 60)
+
+        self.client.set_cookie('localhost', 'session', planted)
+        self.client.get('/login')
+
+        self.assertNotEqual(self.session_cookie(), planted)
+        self.assertEqual(self.store.count(), 1)
+        attacker = self.app.test_client()
+        attacker.set_cookie('localhost', 'session', planted)
+        self.assertEqual(attacker.get('/whoami').data, b'anonymous')
+        self.assertEqual(self.client.get('/whoami').data, b'user-1')
+
+    def test_reads_do_not_write(self):
+        """Polling an unchanged session doesn't rewrite it or reset the cookie"""
+        self.client.get('/login')
+        response = self.client.get('/whoami')
+        self.assertNotIn('Set-Cookie', response.headers)
+        stats = self.interface.stats()
+        self.assertEqual(stats['sessions'], 1)
+        self.assertEqual(stats['lookups'], 1)
+        self.assertGreater(stats['memory_bytes'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
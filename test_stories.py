@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+import json
+import os
+import sqlite3
+import sys
+import unittest
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+
+import server
+from server import app
+from migrations import migrate
+from queries import save_story
+
+TEST_DB = 'test_stories.db'
+
+
+def make_story(story_id, category='space', pages=7):
+    return {
+        'id': story_id,
+        'title': f'Story {story_id}',
+        'category': category,
+        'difficulty': 'beginner',
+        'color': '#000000',
+        'pages': [{'type': 'reading', 'text': f'Page {n}'} for n in range(pages - 1)]
+                 + [{'type': 'comprehension', 'question': 'Why?', 'options': ['a', 'b'], 'correctAnswer': 'a'}],
+    }
+
+
+class TestStoryCatalog(unittest.TestCase):
+    """Test suite for the /api/stories endpoints"""
+
+    @classmethod
+    def setUpClass(cls):
+        app.config['TESTING'] = True
+        app.config['DATABASE'] = TEST_DB
+        server.init_db()
+        with server.get_db_pool().connection() as conn:
+            for story_id in range(10, 35):
+                save_story(conn, make_story(story_id, category='space' if story_id % 2 else 'music'))
+            conn.commit()
+
+    @classmethod
+    def tearDownClass(cls):
+        server.close_db_pool()
+        server.story_catalog.invalidate()
+        for path in (TEST_DB, TEST_DB + '-wal', TEST_DB + '-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def setUp(self):
+        self.app = app.test_client()
+        server.story_catalog.invalidate()
+
+    def get_json(self, url):
+        response = self.app.get(url)
+        self.assertEqual(response.status_code, 200, response.data)
+        return json.loads(response.data)
+
+    def test_seeded_from_former_mock_data(self):
+        data = self.get_json('/api/stories?limit=6')
+        self.assertEqual([story['title'] for story in data['stories']],
+                         ['Zari and The Giganto-Pop', 'Rymdresan', 'Fotbollsmatchen',
+                          'Musikskolan', 'Skogsäventyret', 'Vikingaresan'])
+        self.assertEqual(data['stories'][0]['pageCount'], 5)
+        self.assertEqual(data['stories'][0]['questionCount'], 2)
+
+    def test_cursor_pagination(self):
+        """Following nextCursor visits every story once, in id order"""
+        seen = []
+        url = '/api/stories?limit=7'
+        while True:
+            data = self.get_json(url)
+            seen.extend(story['id'] for story in data['stories'])
+            if data['nextCursor'] is None:
+                break
+            url = f"/api/stories?limit=7&cursor={data['nextCursor']}"
+        self.assertEqual(seen, list(range(1, 7)) + list(range(10, 35)))
+
+    def test_category_and_fields(self):
+        data = self.get_json('/api/stories?category=music&fields=id,title&limit=100')
+        self.assertEqual(data['stories'][0], {'id': 4, 'title': 'Musikskolan'})
+        self.assertEqual([story['id'] for story in data['stories']], [4] + list(range(10, 35, 2)))
+        self.assertIsNone(data['nextCursor'])
+
+    def test_invalid_arguments(self):
+        for url in ('/api/stories?fields=id,secret', '/api/stories?limit=0', '/api/stories?limit=1000',
+                    '/api/stories?cursor=abc', '/api/stories/1?count=0', '/api/stories/1?start=-1'):
+            response = self.app.get(url)
+            self.assertEqual(response.status_code, 400, url)
+            self.assertEqual(response.json['status'], 'error')
+
+    def test_page_windows(self):
+        """A story comes a window of pages at a time, nextPage pointing at the following one"""
+        data = self.get_json('/api/stories/10?count=3')
+        self.assertEqual(data['story']['id'], 10)
+        self.assertEqual(data['story']['pageCount'], 7)
+        self.assertEqual([page['text'] for page in data['pages']], ['Page 0', 'Page 1', 'Page 2'])
+        self.assertEqual((data['pageStart'], data['nextPage']), (0, 3))
+
+        data = self.get_json('/api/stories/10?start=6&count=3')
+        self.assertEqual([page['type'] for page in data['pages']], ['comprehension'])
+        self.assertIsNone(data['nextPage'])
+
+        self.assertEqual(self.get_json('/api/stories/1?count=20')['pages'][2]['correctAnswer'], 'mixed')
+
+    def test_unknown_story(self):
+        response = self.app.get('/api/stories/999')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json['message'], 'Story not found')
+
+    def test_cache_headers_and_revalidation(self):
+        response = self.app.get('/api/stories/1')
+        etag = response.headers['ETag']
+        self.assertEqual(response.headers['Cache-Control'], f"public, max-age={app.config['STORY_CACHE_MAX_AGE']}")
+
+        response = self.app.get('/api/stories/1', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+        # The ETag comes from the content, so a rebuilt (or another worker's) response matches
+        server.story_catalog.invalidate()
+        self.assertEqual(self.app.get('/api/stories/1', headers={'If-None-Match': etag}).status_code, 304)
+
+    def test_responses_are_cached(self):
+        before = server.story_catalog.stats()
+        self.get_json('/api/stories/1')
+        self.get_json('/api/stories/1')
+        after = server.story_catalog.stats()
+        self.assertEqual((after['hits'] - before['hits'], after['misses'] - before['misses']), (1, 1))
+
+    def test_updates_show_after_invalidation(self):
+        self.get_json('/api/stories/11')
+        with server.get_db_pool().connection() as conn:
+            story = make_story(11)
+            story['title'] = 'Renamed'
+            save_story(conn, story)
+            conn.commit()
+        self.assertEqual(self.get_json('/api/stories/11')['story']['title'], 'Story 11')
+        server.story_catalog.invalidate()
+        self.assertEqual(self.get_json('/api/stories/11')['story']['title'], 'Renamed')
+
+
+class TestStoryMigration(unittest.TestCase):
+    """The catalog migration against an existing database"""
+
+    def test_seeding_keeps_existing_stories(self):
+        conn = sqlite3.connect(':memory:')
+        migrate(conn, progress=None)
+        conn.execute("UPDATE stories SET title = 'Edited' WHERE id = 1")
+        conn.execute('PRAGMA user_version = 4')
+        migrate(conn, progress=None)
+        self.assertEqual(conn.execute('SELECT title FROM stories WHERE id = 1').fetchone()[0], 'Edited')
+        self.assertEqual(conn.execute('SELECT COUNT(*) FROM story_pages').fetchone()[0], 5)
+        conn.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+import io
+import json
+import logging
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+
+from flask import Flask
+
+from structured_logging import BufferedHandler, configure_logging, parse_route_levels
+
+
+class TestStructuredLogging(unittest.TestCase):
+    """Test suite for the buffered structured logger"""
+
+    def setUp(self):
+        self.stream = io.StringIO()
+        self.logger = logging.getLogger(f'test.{self.id()}')
+        self.logger.propagate = False
+
+    def tearDown(self):
+        for handler in list(self.logger.handlers):
+            handler.stop()
+            self.logger.removeHandler(handler)
+
+    def configure(self, **kwargs):
+        self.handler = configure_logging(stream=self.stream, logger=self.logger, **kwargs)
+
+    def lines(self):
+        self.handler.stop()
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_json_output_with_extra_fields(self):
+        """Records are written as JSON objects including extra= fields and tracebacks"""
+        self.configure()
+        self.logger.info("Creating new user for email: %s", 'kid@test.com', extra={'user_id': 'u1'})
+        try:
+            raise ValueError('bad')
+        except ValueError:
+            self.logger.exception("Unhandled error")
+
+        first, second = self.lines()
+        self.assertEqual(first['message'], 'Creating new user for email: kid@test.com')
+        self.assertEqual(first['level'], 'INFO')
+        self.assertEqual(first['user_id'], 'u1')
+        self.assertIn('ValueError: bad', second['exception'])
+
+    def test_route_levels(self):
+        """A route can be quieter or more verbose than the default level"""
+        app = Flask(__name__)
+
+        @app.route('/quiet')
+        def quiet():
+            self.logger.info("quiet info")
+            self.logger.warning("quiet warning")
+            return ''
+
+        @app.route('/verbose')
+        def verbose():
+            self.logger.debug("verbose debug")
+            return ''
+
+        self.configure(level='INFO', route_levels=parse_route_levels('/quiet=WARNING,/verbose=DEBUG'))
+        client = app.test_client()
+        client.get('/quiet')
+        client.get('/verbose')
+        self.logger.debug("debug outside any request")
+
+        lines = self.lines()
+        self.assertEqual([line['message'] for line in lines], ['quiet warning', 'verbose debug'])
+        self.assertEqual(lines[0]['route'], '/quiet')
+
+    def test_debug_sampling(self):
+        """Only 1 in sample_every debug records per call site is kept"""
+        self.configure(level='DEBUG', sample_every=10)
+        for i in range(100):
+            self.logger.debug("poll %s", i)
+        self.logger.info("always kept")
+        self.assertEqual(len(self.lines()), 11)
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        """When the listener falls behind, records are counted as dropped"""
+        handler = BufferedHandler(logging.StreamHandler(self.stream), queue_size=2)
+        handler._ensure_started()
+        handler._listener.stop()  # nothing drains the queue any more
+        self.logger.addHandler(handler)
+        for i in range(5):
+            self.logger.warning("record %s", i)
+        self.assertEqual(handler.stats()['dropped'], 3)
+        handler._listener = None
+
+
+if __name__ == '__main__':
+    unittest.main()
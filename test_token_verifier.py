@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+import json
+import os
+import sys
+import time
+import unittest
+
+import rsa
+from google.auth import crypt
+from google.auth import exceptions
+from google.auth import jwt
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+
+import server
+from server import app
+from token_verifier import StaticCertSource, TokenVerifier, parse_max_age
+
+CLIENT_ID = 'test-client-id.apps.googleusercontent.com'
+TEST_DB = 'test_token_users.db'
+
+# Generating RSA keys is slow, so share one pair across the whole module
+_public_key, _private_key = rsa.newkeys(1024)
+SIGNER = crypt.RSASigner.from_string(_private_key.save_pkcs1(), key_id='test-key')
+CERTS = {'test-key': _public_key.save_pkcs1().decode('utf-8')}
+
+
+class CountingCertSource(StaticCertSource):
+    """Static cert source that counts how often it is asked for certificates"""
+
+    def __init__(self, certs, max_age=300):
+        super().__init__(certs, max_age)
+        self.fetches = 0
+
+    def fetch(self):
+        self.fetches += 1
+        return super().fetch()
+
+
+def make_token(email='kid@example.com', sub='1234567890', issuer='https://accounts.google.com', lifetime=3600):
+    """Sign an ID token the way Google would"""
+    now = int(time.time())
+    payload = {
+        'iss': issuer,
+        'aud': CLIENT_ID,
+        'sub': sub,
+        'email': email,
+        'name': 'Test Kid',
+        'picture': 'https://example.com/kid.png',
+        'iat': now,
+        'exp': now + lifetime,
+    }
+    return jwt.encode(SIGNER, payload).decode('utf-8')
+
+
+class TestTokenVerifier(unittest.TestCase):
+    """Test suite for cached Google ID-token verification"""
+
+    def setUp(self):
+        self.source = CountingCertSource(CERTS)
+        self.verifier = TokenVerifier(self.source)
+
+    def test_verifies_valid_token(self):
+        """A correctly signed token is decoded"""
+        idinfo = self.verifier.verify_oauth2_token(make_token(), CLIENT_ID)
+        self.assertEqual(idinfo['email'], 'kid@example.com')
+        self.assertEqual(self.verifier.stats()['verifications'], 1)
+
+    def test_resubmitted_token_skips_verification(self):
+        """Verifying the same token twice only checks the signature once"""
+        token = make_token()
+        self.verifier.verify_oauth2_token(token, CLIENT_ID)
+        self.verifier.verify_oauth2_token(token, CLIENT_ID)
+
+        stats = self.verifier.stats()
+        self.assertEqual(stats['verifications'], 1)
+        self.assertEqual(stats['token_cache_hits'], 1)
+
+    def test_certs_are_cached_until_max_age(self):
+        """Certificates are fetched once and reused until they expire"""
+        now = [1000.0]
+        verifier = TokenVerifier(self.source, clock=lambda: now[0])
+
+        verifier.get_certs()
+        verifier.get_certs()
+        self.assertEqual(self.source.fetches, 1)
+
+        now[0] += 301
+        verifier.get_certs()
+        self.assertEqual(self.source.fetches, 2)
+        self.assertEqual(verifier.stats()['cert_refreshes'], 2)
+
+    def test_unknown_key_id_forces_refresh(self):
+        """A token signed with a key we haven't seen triggers a cert refresh"""
+        self.source.certs = {'old-key': CERTS['test-key']}
+        self.verifier.get_certs()
+
+        # Google rotates its keys while our copy is still fresh
+        self.source.certs = CERTS
+        idinfo = self.verifier.verify_oauth2_token(make_token(), CLIENT_ID)
+        self.assertEqual(idinfo['sub'], '1234567890')
+        self.assertEqual(self.source.fetches, 2)
+
+    def test_wrong_audience_is_rejected(self):
+        """Tokens issued for another client are rejected"""
+        with self.assertRaises(ValueError):
+            self.verifier.verify_oauth2_token(make_token(), 'someone-else')
+        self.assertEqual(self.verifier.stats()['failures'], 1)
+
+    def test_wrong_issuer_is_rejected(self):
+        """Tokens not issued by Google are rejected like verify_oauth2_token does"""
+        with self.assertRaises(exceptions.GoogleAuthError):
+            self.verifier.verify_oauth2_token(make_token(issuer='https://evil.example.com'), CLIENT_ID)
+
+    def test_parse_max_age(self):
+        """Cache lifetime honours max-age and subtracts the Age header"""
+        self.assertEqual(parse_max_age({'Cache-Control': 'public, max-age=19800, must-revalidate'}), 19800)
+        self.assertEqual(parse_max_age({'Cache-Control': 'max-age=100', 'Age': '40'}), 60)
+        self.assertEqual(parse_max_age({}, default=7), 7)
+
+
+class TestGoogleLoginEndpoint(unittest.TestCase):
+    """Test suite for /api/auth/google using a local certificate source"""
+
+    def setUp(self):
+        app.config['TESTING'] = True
+        app.config['SECRET_KEY'] = 'test_secret_key'
+        app.config['DATABASE'] = TEST_DB
+        server.init_db()
+        server.set_token_verifier(TokenVerifier(StaticCertSource(CERTS)))
+        self.app = app.test_client()
+
+    def tearDown(self):
+        server.set_token_verifier(None)
+        server.close_db_pool()
+        for path in (TEST_DB, TEST_DB + '-wal', TEST_DB + '-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_google_login(self):
+        """A valid Google token logs the user in"""
+        response = self.app.post('/api/auth/google', json={'token': make_token(), 'client_id': CLIENT_ID})
+        data = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['status'], 'success')
+        self.assertEqual(data['user']['email'], 'kid@example.com')
+
+    def test_google_login_invalid_token(self):
+        """An invalid token is answered with 401"""
+        response = self.app.post('/api/auth/google', json={'token': make_token(), 'client_id': 'wrong-client'})
+        self.assertEqual(response.status_code, 401)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+
+from lru_cache import CachedResponse
+from user_cache import UserCache, profile_etag
+
+
+class TestUserCache(unittest.TestCase):
+    """Test suite for the in-process user profile cache"""
+
+    def setUp(self):
+        self.now = [0.0]
+        self.cache = UserCache(max_size=2, ttl=10, clock=lambda: self.now[0])
+
+    def test_hit_and_miss(self):
+        """Stored values are returned and lookups are counted"""
+        self.assertIsNone(self.cache.get('a'))
+        self.cache.set('a', {'status': 'success'})
+        self.assertEqual(self.cache.get('a'), {'status': 'success'})
+
+        stats = self.cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hit_ratio'], 0.5)
+
+    def test_least_recently_used_is_evicted(self):
+        """The cache never grows past max_size"""
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+    def test_entries_expire(self):
+        """Entries older than the TTL are treated as misses"""
+        self.cache.set('a', 1)
+        self.now[0] = 11
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.stats()['expirations'], 1)
+
+    def test_invalidate(self):
+        """Invalidated users are fetched again on the next lookup"""
+        self.cache.set('a', 1)
+        self.cache.invalidate('a')
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.stats()['invalidations'], 1)
+
+
+class TestCachedResponse(unittest.TestCase):
+    """ETags of cached responses"""
+
+    def test_etag_depends_only_on_body(self):
+        """A rebuilt response (or another worker's) gets the same ETag; a changed one doesn't"""
+        first = CachedResponse({'a': 1}, b'{"a":1}')
+        self.assertEqual(first.etag, CachedResponse({'a': 1}, b'{"a":1}').etag)
+        self.assertNotEqual(first.etag, CachedResponse({'a': 2}, b'{"a":2}').etag)
+
+    def test_profile_etag(self):
+        """Profile ETags depend on the user and version only, and can replace the body hash"""
+        self.assertEqual(profile_etag('u1', 3), profile_etag('u1', 3))
+        self.assertNotEqual(profile_etag('u1', 3), profile_etag('u1', 4))
+        self.assertNotEqual(profile_etag('u1', 3), profile_etag('u2', 3))
+        self.assertEqual(CachedResponse({'a': 1}, b'{"a":1}', 3, profile_etag('u1', 3)).etag, profile_etag('u1', 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+
+from db import ConnectionPool
+from migrations import migrate
+from write_behind import LastLoginWriter
+
+
+class TestLastLoginWriter(unittest.TestCase):
+    """Test suite for the batched last_login writer"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.pool = ConnectionPool(os.path.join(self.tmpdir.name, 'users.db'))
+        with self.pool.connection() as conn:
+            migrate(conn, progress=None)
+            conn.executemany('INSERT INTO users (id, email, last_login) VALUES (?, ?, ?)',
+                             [(str(i), f'user{i}@example.com', '2024-01-01 00:00:00') for i in range(5)])
+            conn.commit()
+
+    def tearDown(self):
+        self.pool.close()
+        self.tmpdir.cleanup()
+
+    def last_login(self, user_id):
+        with self.pool.connection() as conn:
+            return conn.execute('SELECT last_login FROM users WHERE id = ?', (user_id,)).fetchone()[0]
+
+    def test_updates_are_buffered_and_coalesced(self):
+        """Logins are held in memory and written together in one flush"""
+        writer = LastLoginWriter(lambda: self.pool, flush_interval=60)
+        writer.record('1', '2025-01-01 10:00:00')
+        writer.record('1', '2025-01-01 10:05:00')
+        writer.record('2', '2025-01-01 10:01:00')
+
+        self.assertEqual(self.last_login('1'), '2024-01-01 00:00:00')
+        self.assertEqual(writer.pending(), 2)
+
+        writer.stop()
+        self.assertEqual(self.last_login('1'), '2025-01-01 10:05:00')
+        self.assertEqual(self.last_login('2'), '2025-01-01 10:01:00')
+        self.assertEqual(writer.stats()['flushes'], 1)
+        self.assertEqual(writer.stats()['rows_written'], 2)
+
+    def test_background_flush(self):
+        """The flusher thread writes pending updates after the interval"""
+        writer = LastLoginWriter(lambda: self.pool, flush_interval=0.01)
+        writer.record('3', '2025-02-01 00:00:00')
+        deadline = time.time() + 2
+        while writer.pending() and time.time() < deadline:
+            time.sleep(0.01)
+        writer.stop()
+        self.assertEqual(self.last_login('3'), '2025-02-01 00:00:00')
+
+    def test_max_pending_forces_flush(self):
+        """The buffer never holds more than max_pending users"""
+        writer = LastLoginWriter(lambda: self.pool, flush_interval=60, max_pending=2)
+        writer.record('1', '2025-03-01 00:00:00')
+        writer.record('2', '2025-03-01 00:00:00')
+
+        self.assertEqual(writer.pending(), 0)
+        self.assertEqual(writer.stats()['forced_flushes'], 1)
+        self.assertEqual(self.last_login('2'), '2025-03-01 00:00:00')
+        writer.stop()
+
+    def test_never_moves_last_login_backwards(self):
+        """A late flush doesn't overwrite a newer timestamp written directly"""
+        writer = LastLoginWriter(lambda: self.pool, flush_interval=0)
+        with self.pool.connection() as conn:
+            conn.execute("UPDATE users SET last_login = '2030-01-01 00:00:00' WHERE id = '4'")
+            conn.commit()
+        writer.record('4', '2025-01-01 00:00:00')
+        self.assertEqual(self.last_login('4'), '2030-01-01 00:00:00')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+
+import server
+
+
+class TestSecretKey(unittest.TestCase):
+    """Every worker process must sign sessions with the same key"""
+
+    def test_secret_key_from_environment(self):
+        """SECRET_KEY wins over everything else"""
+        with mock.patch.dict(os.environ, {'SECRET_KEY': 'from-env'}):
+            self.assertEqual(server.load_secret_key(), 'from-env')
+
+    def test_secret_key_file_is_created_once(self):
+        """SECRET_KEY_FILE is created on first use and reused afterwards"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            key_file = os.path.join(tmpdir, 'secret_key')
+            with mock.patch.dict(os.environ, {'SECRET_KEY_FILE': key_file}):
+                os.environ.pop('SECRET_KEY', None)
+                first = server.load_secret_key()
+                second = server.load_secret_key()
+
+            self.assertEqual(first, second)
+            self.assertEqual(len(first), 64)
+            self.assertEqual(os.stat(key_file).st_mode & 0o777, 0o600)
+            self.assertEqual(os.listdir(tmpdir), ['secret_key'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Google ID-token verification with cached signing certificates
+
+Replaces calling id_token.verify_oauth2_token() with a fresh
+google_requests.Request() per login. Google's certificates are kept in memory
+for as long as their Cache-Control max-age allows, fetched over one pooled
+HTTP session, and tokens that were already verified are remembered until
+their `exp` so a re-submitted token skips the signature check entirely.
+"""
+import base64
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from google.auth import exceptions
+from google.auth import jwt
+
+GOOGLE_CERTS_URL = 'https://www.googleapis.com/oauth2/v1/certs'
+GOOGLE_ISSUERS = ['accounts.google.com', 'https://accounts.google.com']
+
+# Used when the certs response carries no usable Cache-Control header
+DEFAULT_CERTS_MAX_AGE = 300
+
+_MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+
+def parse_max_age(headers, default=DEFAULT_CERTS_MAX_AGE):
+    """Work out how long a response may be cached from its Cache-Control/Age headers"""
+    cache_control = headers.get('Cache-Control', '')
+    match = _MAX_AGE_RE.search(cache_control)
+    if not match:
+        return default
+    max_age = int(match.group(1))
+    try:
+        max_age -= int(headers.get('Age', 0))
+    except ValueError:
+        pass
+    return max(max_age, 0)
+
+
+class HTTPCertSource:
+    """Fetches Google's signing certificates over a reusable HTTP session"""
+
+    def __init__(self, url=GOOGLE_CERTS_URL, session=None, timeout=5.0):
+        self.url = url
+        self.timeout = timeout
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=4)
+            session.mount('https://', adapter)
+        self.session = session
+
+    def fetch(self):
+        """Return (certs, max_age) where certs maps key id to PEM certificate"""
+        response = self.session.get(self.url, timeout=self.timeout)
+        if response.status_code != 200:
+            raise exceptions.TransportError(f'Could not fetch certificates at {self.url}')
+        return response.json(), parse_max_age(response.headers)
+
+
+class StaticCertSource:
+    """Local stand-in for Google's certs endpoint, for offline use and tests
+
+    `certs` uses the same format as the Google endpoint: a mapping of key id to
+    a PEM encoded certificate or public key.
+    """
+
+    def __init__(self, certs, max_age=DEFAULT_CERTS_MAX_AGE):
+        self.certs = dict(certs)
+        self.max_age = max_age
+
+    @classmethod
+    def from_file(cls, path, max_age=DEFAULT_CERTS_MAX_AGE):
+        """Load certificates from a JSON file in the Google certs format"""
+        with open(path) as f:
+            return cls(json.load(f), max_age=max_age)
+
+    def fetch(self):
+        return dict(self.certs), self.max_age
+
+
+def _token_key_id(token):
+    """Return the `kid` from a JWT header without verifying anything"""
+    if isinstance(token, bytes):
+        token = token.decode('utf-8')
+    try:
+        header = token.split('.', 1)[0]
+        header += '=' * (-len(header) % 4)
+        return json.loads(base64.urlsafe_b64decode(header)).get('kid')
+    except (ValueError, AttributeError):
+        return None
+
+
+class TokenVerifier:
+    """Verifies Google ID tokens against cached certificates"""
+
+    def __init__(self, cert_source=None, max_cached_tokens=10000, clock=time.time):
+        self.cert_source = cert_source or HTTPCertSource()
+        self.max_cached_tokens = max_cached_tokens
+        self.clock = clock
+
+        self._certs = None
+        self._certs_expire_at = 0
+        self._certs_lock = threading.Lock()
+
+        # (token, audience) -> (idinfo, exp), oldest first
+        self._verified = OrderedDict()
+        self._verified_lock = threading.Lock()
+
+        # Counters
+        self.verifications = 0
+        self.token_cache_hits = 0
+        self.failures = 0
+        self.cert_refreshes = 0
+        self.verify_time = 0.0
+        self.max_verify_time = 0.0
+
+    def get_certs(self, force_refresh=False):
+        """Return the current certificates, refreshing them once they expire"""
+        if not force_refresh and self._certs is not None and self.clock() < self._certs_expire_at:
+            return self._certs
+
+        with self._certs_lock:
+            # Another thread may have refreshed while we waited for the lock
+            if not force_refresh and self._certs is not None and self.clock() < self._certs_expire_at:
+                return self._certs
+            certs, max_age = self.cert_source.fetch()
+            self._certs = certs
+            self._certs_expire_at = self.clock() + max_age
+            self.cert_refreshes += 1
+            return certs
+
+    def _lookup(self, key):
+        """Return a remembered idinfo for this token if it hasn't expired yet"""
+        with self._verified_lock:
+            entry = self._verified.get(key)
+            if entry is None:
+                return None
+            idinfo, exp = entry
+            if exp <= self.clock():
+                del self._verified[key]
+                return None
+            self.token_cache_hits += 1
+            return dict(idinfo)
+
+    def _remember(self, key, idinfo):
+        exp = idinfo.get('exp')
+        if not isinstance(exp, (int, float)):
+            return
+        with self._verified_lock:
+            self._verified[key] = (dict(idinfo), exp)
+            self._verified.move_to_end(key)
+            while len(self._verified) > self.max_cached_tokens:
+                self._verified.popitem(last=False)
+
+    def _decode(self, token, audience):
+        certs = self.get_certs()
+        key_id = _token_key_id(token)
+        if key_id and key_id not in certs:
+            # Google rotated its keys before our cached copy expired
+            certs = self.get_certs(force_refresh=True)
+        return jwt.decode(token, certs=certs, audience=audience)
+
+    def verify_oauth2_token(self, token, audience=None):
+        """Drop-in replacement for google.oauth2.id_token.verify_oauth2_token
+
+        Raises ValueError if the token is invalid and GoogleAuthError if the
+        issuer is wrong, exactly like the library function.
+        """
+        key = (token, audience)
+        idinfo = self._lookup(key)
+        if idinfo is not None:
+            return idinfo
+
+        start = time.perf_counter()
+        try:
+            idinfo = self._decode(token, audience)
+            if idinfo.get('iss') not in GOOGLE_ISSUERS:
+                raise exceptions.GoogleAuthError(
+                    f"Wrong issuer. 'iss' should be one of the following: {GOOGLE_ISSUERS}"
+                )
+        except Exception:
+            self.failures += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.verifications += 1
+            self.verify_time += elapsed
+            self.max_verify_time = max(self.max_verify_time, elapsed)
+
+        self._remember(key, idinfo)
+        return idinfo
+
+    def stats(self):
+        """Return a snapshot of the verifier counters"""
+        verifications = self.verifications
+        return {
+            'verifications': verifications,
+            'token_cache_hits': self.token_cache_hits,
+            'cached_tokens': len(self._verified),
+            'failures': self.failures,
+            'cert_refreshes': self.cert_refreshes,
+            'certs_expire_in_seconds': max(self._certs_expire_at - self.clock(), 0) if self._certs else 0,
+            'avg_verify_seconds': (self.verify_time / verifications) if verifications else 0.0,
+            'max_verify_seconds': self.max_verify_time,
+        }
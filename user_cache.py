@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+In-process cache of assembled /api/auth/user responses
+
+Entries are keyed by user id, bounded in number (least recently used entries
+are evicted first) and expire after a TTL so that changes made by another
+worker process are picked up eventually. Handlers that write user data must
+call invalidate() or set() so this process never serves its own stale data;
+server.py also checks each hit's version against users.profile_version so
+writes made by other workers are seen straight away.
+
+Values are lru_cache.CachedResponse objects. Their ETag comes from the user
+id and users.profile_version (see profile_etag()), so every worker (including
+forks of one preloaded master) gives the same ETag for the same profile, a
+response rebuilt after an eviction or expiry still matches the copy a client
+already holds, and a conditional request can be answered from the version
+alone, without assembling the profile.
+"""
+import hashlib
+
+from lru_cache import LRUCache
+
+# Part of every profile ETag; bump it when the /api/auth/user body changes
+# shape, so clients don't keep revalidating a copy in the old one
+RESPONSE_FORMAT = 1
+
+def profile_etag(user_id, version):
+    """Strong ETag for a user's /api/auth/user response at a profile_version"""
+    key = f'{RESPONSE_FORMAT}:{user_id}:{version}'.encode('utf-8')
+    return hashlib.blake2b(key, digest_size=12).hexdigest()
+
+
+class UserCache(LRUCache):
+    """LRUCache of CachedResponse objects keyed by user id"""
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Write-behind queue for users.last_login
+
+A login used to pay for `UPDATE users SET last_login = ?` plus a commit (and
+its fsync) just to bump a timestamp. Logins now record the timestamp in memory
+and a background thread writes all pending timestamps in one transaction
+every `flush_interval` seconds, or sooner once `max_batch` users are waiting.
+
+Bounded loss: if the process dies, at most `flush_interval` seconds of
+last_login updates are lost, and never more than `max_pending` users - when
+that many are waiting, the login that hits the limit flushes synchronously.
+Setting flush_interval to 0 disables buffering altogether.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+
+from queries import COALESCED_LAST_LOGIN_SQL
+
+logger = logging.getLogger(__name__)
+
+
+class LastLoginWriter:
+    """Coalesces last_login updates and writes them in batches"""
+
+    def __init__(self, get_pool, flush_interval=0.5, max_batch=500, max_pending=10000):
+        # Called at flush time so the writer follows the configured database
+        self.get_pool = get_pool
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+
+        # user_id -> latest timestamp; several logins by one user collapse into one row
+        self._pending = {}
+        self._lock = threading.Lock()
+        # Serializes flushes so batches are written in order
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._pid = None
+        self._atexit_registered = False
+
+        # Counters
+        self.recorded = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.forced_flushes = 0
+        self.flush_time = 0.0
+
+    def record(self, user_id, timestamp):
+        """Remember that a user logged in at `timestamp`"""
+        if self.flush_interval <= 0:
+            self._write({user_id: timestamp})
+            return
+
+        self._ensure_started()
+        with self._lock:
+            previous = self._pending.get(user_id)
+            if previous is None or previous < timestamp:
+                self._pending[user_id] = timestamp
+            self.recorded += 1
+            pending = len(self._pending)
+
+        if pending >= self.max_pending:
+            # Don't let the buffer (and what a crash could lose) grow without bound
+            self.forced_flushes += 1
+            self.flush()
+        elif pending >= self.max_batch:
+            self._wakeup.set()
+
+    def pending(self):
+        """Number of users whose last_login hasn't been written yet"""
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """Write every pending timestamp now, in a single transaction"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return
+            try:
+                self._write(batch)
+            except Exception:
+                # Put the batch back (unless newer logins superseded it) so it's retried
+                with self._lock:
+                    for user_id, timestamp in batch.items():
+                        if self._pending.get(user_id, '') < timestamp:
+                            self._pending[user_id] = timestamp
+                raise
+
+    def _write(self, batch):
+        start = time.perf_counter()
+        # Never move last_login backwards if a newer value was written directly
+        params = [(timestamp, user_id, timestamp) for user_id, timestamp in batch.items()]
+        with self.get_pool().connection() as conn:
+            conn.executemany(COALESCED_LAST_LOGIN_SQL, params)
+            conn.commit()
+        self.flushes += 1
+        self.rows_written += len(params)
+        self.flush_time += time.perf_counter() - start
+
+    def _ensure_started(self):
+        """Start the flusher thread (again, if we're in a freshly forked worker)"""
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid:
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == pid:
+                return
+            if self._pid != pid:
+                # Timestamps buffered by the parent belong to the parent
+                self._pending = {}
+            self._pid = pid
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='last-login-writer', daemon=True)
+            self._thread.start()
+            if not self._atexit_registered:
+                atexit.register(self.stop)
+                self._atexit_registered = True
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning("Error flushing last_login updates (will retry): %s", e)
+
+    def stop(self):
+        """Stop the flusher thread and write whatever is still pending"""
+        self._stopping = True
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread() and self._pid == os.getpid():
+            thread.join(timeout=5)
+        self._thread = None
+        self.flush()
+
+    def stats(self):
+        """Return a snapshot of the writer counters"""
+        return {
+            'pending': self.pending(),
+            'recorded': self.recorded,
+            'flushes': self.flushes,
+            'rows_written': self.rows_written,
+            'forced_flushes': self.forced_flushes,
+            'flush_time_seconds': self.flush_time,
+            'flush_interval_seconds': self.flush_interval,
+            'max_pending': self.max_pending,
+        }
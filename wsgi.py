@@ -0,0 +1,12 @@
+#!/usr/bin/env python3
+"""
+WSGI entry point for production
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+gunicorn.conf.py preloads this module in the master process, runs init_db
+there exactly once, and then forks the workers.
+"""
+from server import app
+
+application = app